@@ -0,0 +1,92 @@
+"""Baseline schema, as previously created by Base.metadata.create_all
+
+Existing databases already have these tables; mark them with
+`alembic stamp 0001` instead of running this revision.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "raffle_epochs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("start_time", sa.DateTime(), nullable=False),
+        sa.Column("end_time", sa.DateTime(), nullable=False),
+        sa.Column("is_completed", sa.Boolean(), nullable=True),
+        sa.Column("winner_address", sa.String(), nullable=True),
+    )
+    op.create_index("ix_raffle_epochs_id", "raffle_epochs", ["id"])
+
+    op.create_table(
+        "raffle_entries",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("wallet_address", sa.String(), nullable=True),
+        sa.Column("transaction_hash", sa.String(), nullable=True),
+        sa.Column("ada_amount", sa.Float(), nullable=True),
+        sa.Column("epok_amount", sa.Float(), nullable=True),
+        sa.Column("tickets", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("epoch_id", sa.Integer(), sa.ForeignKey("raffle_epochs.id"), nullable=True),
+    )
+    op.create_index("ix_raffle_entries_id", "raffle_entries", ["id"])
+    op.create_index("ix_raffle_entries_wallet_address", "raffle_entries", ["wallet_address"])
+    op.create_index("ix_raffle_entries_transaction_hash", "raffle_entries", ["transaction_hash"], unique=True)
+
+    op.create_table(
+        "epoch_stats",
+        sa.Column("epoch_id", sa.Integer(), sa.ForeignKey("raffle_epochs.id"), primary_key=True),
+        sa.Column("total_ada", sa.Float(), nullable=False),
+        sa.Column("total_epok", sa.Float(), nullable=False),
+        sa.Column("total_tickets", sa.Integer(), nullable=False),
+        sa.Column("entry_count", sa.Integer(), nullable=False),
+    )
+
+    op.create_table(
+        "wallet_epoch_stats",
+        sa.Column("epoch_id", sa.Integer(), sa.ForeignKey("raffle_epochs.id"), primary_key=True),
+        sa.Column("wallet_address", sa.String(), primary_key=True),
+        sa.Column("total_ada", sa.Float(), nullable=False),
+        sa.Column("total_epok", sa.Float(), nullable=False),
+        sa.Column("total_tickets", sa.Integer(), nullable=False),
+        sa.Column("entry_count", sa.Integer(), nullable=False),
+    )
+
+    op.create_table(
+        "blockfrost_tx_cache",
+        sa.Column("tx_hash", sa.String(), primary_key=True),
+        sa.Column("tx_json", sa.Text(), nullable=False),
+        sa.Column("utxos_json", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+
+    op.create_table(
+        "indexer_checkpoints",
+        sa.Column("name", sa.String(), primary_key=True),
+        sa.Column("block_height", sa.Integer(), nullable=False),
+        sa.Column("tx_index", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("indexer_checkpoints")
+    op.drop_table("blockfrost_tx_cache")
+    op.drop_table("wallet_epoch_stats")
+    op.drop_table("epoch_stats")
+    op.drop_table("raffle_entries")
+    op.drop_table("raffle_epochs")
@@ -0,0 +1,57 @@
+"""Composite, covering and partial indexes for the hot read paths
+
+Built CONCURRENTLY on Postgres so entry ingestion keeps running while
+raffle_entries is indexed.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:01
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_raffle_entries_epoch_id_id", "raffle_entries", ["epoch_id", "id"],
+            postgresql_include=["wallet_address", "tickets", "ada_amount", "transaction_hash", "created_at"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            "ix_raffle_entries_epoch_id_wallet", "raffle_entries", ["epoch_id", "wallet_address"],
+            postgresql_include=["tickets", "ada_amount", "epok_amount"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            "ix_raffle_epochs_completed_end_time", "raffle_epochs", ["is_completed", "end_time"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            "ix_raffle_epochs_active_end_time", "raffle_epochs", ["end_time"],
+            postgresql_where=sa.text("is_completed = false"),
+            sqlite_where=sa.text("is_completed = 0"),
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table, name in (
+            ("raffle_epochs", "ix_raffle_epochs_active_end_time"),
+            ("raffle_epochs", "ix_raffle_epochs_completed_end_time"),
+            ("raffle_entries", "ix_raffle_entries_epoch_id_wallet"),
+            ("raffle_entries", "ix_raffle_entries_epoch_id_id"),
+        ):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,53 @@
+"""Record verifiable draws on raffle_epochs
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:02
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DRAW_COLUMNS = (
+    ("draw_seed", sa.String()),
+    ("draw_block_hash", sa.String()),
+    ("draw_block_height", sa.Integer()),
+    ("ticket_merkle_root", sa.String()),
+    ("total_tickets", sa.Integer()),
+    ("entry_count", sa.Integer()),
+    ("winner_transaction_hash", sa.String()),
+    ("drawn_at", sa.DateTime()),
+)
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("raffle_epochs") as batch:
+        for name, type_ in DRAW_COLUMNS:
+            batch.add_column(sa.Column(name, type_, nullable=True))
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_raffle_entries_epoch_id_tx_hash", "raffle_entries", ["epoch_id", "transaction_hash"],
+            postgresql_include=["tickets"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_raffle_entries_epoch_id_tx_hash", table_name="raffle_entries",
+            postgresql_concurrently=True, if_exists=True
+        )
+    with op.batch_alter_table("raffle_epochs") as batch:
+        for name, _ in reversed(DRAW_COLUMNS):
+            batch.drop_column(name)
@@ -0,0 +1,88 @@
+"""Epoch history and wallet lifetime rollups
+
+Creates the tables and fills them from the per-epoch aggregates of the
+epochs closed so far; from then on scheduler.close_epoch keeps them up to
+date.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:03
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STAT_COLUMNS = (
+    ("total_ada", sa.Float()),
+    ("total_epok", sa.Float()),
+    ("total_tickets", sa.Integer()),
+    ("entry_count", sa.Integer()),
+)
+
+BACKFILL = (
+    """
+    INSERT INTO epoch_history (epoch_id, start_time, end_time, winner_address, winner_transaction_hash,
+                               total_ada, total_epok, total_tickets, entry_count, wallet_count)
+    SELECT e.id, e.start_time, e.end_time, e.winner_address, e.winner_transaction_hash,
+           COALESCE(s.total_ada, 0), COALESCE(s.total_epok, 0), COALESCE(s.total_tickets, 0),
+           COALESCE(s.entry_count, 0),
+           (SELECT COUNT(*) FROM wallet_epoch_stats w WHERE w.epoch_id = e.id)
+    FROM raffle_epochs e LEFT JOIN epoch_stats s ON s.epoch_id = e.id
+    WHERE e.is_completed
+    """,
+    """
+    INSERT INTO wallet_lifetime_stats (wallet_address, total_ada, total_epok, total_tickets, entry_count,
+                                       epochs_entered, wins, last_epoch_id)
+    SELECT w.wallet_address, SUM(w.total_ada), SUM(w.total_epok), SUM(w.total_tickets), SUM(w.entry_count),
+           COUNT(*), 0, MAX(w.epoch_id)
+    FROM wallet_epoch_stats w JOIN epoch_history h ON h.epoch_id = w.epoch_id
+    GROUP BY w.wallet_address
+    """,
+    """
+    UPDATE wallet_lifetime_stats SET wins = (
+        SELECT COUNT(*) FROM epoch_history h WHERE h.winner_address = wallet_lifetime_stats.wallet_address
+    )
+    """,
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "epoch_history",
+        sa.Column("epoch_id", sa.Integer(), sa.ForeignKey("raffle_epochs.id"), primary_key=True),
+        sa.Column("start_time", sa.DateTime(), nullable=False),
+        sa.Column("end_time", sa.DateTime(), nullable=False),
+        sa.Column("winner_address", sa.String(), nullable=True),
+        sa.Column("winner_transaction_hash", sa.String(), nullable=True),
+        *(sa.Column(name, type_, nullable=False) for name, type_ in STAT_COLUMNS),
+        sa.Column("wallet_count", sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        "wallet_lifetime_stats",
+        sa.Column("wallet_address", sa.String(), primary_key=True),
+        *(sa.Column(name, type_, nullable=False) for name, type_ in STAT_COLUMNS),
+        sa.Column("epochs_entered", sa.Integer(), nullable=False),
+        sa.Column("wins", sa.Integer(), nullable=False),
+        sa.Column("last_epoch_id", sa.Integer(), nullable=True),
+    )
+    op.create_index(
+        "ix_wallet_lifetime_stats_tickets", "wallet_lifetime_stats", ["total_tickets", "wallet_address"]
+    )
+
+    for statement in BACKFILL:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_wallet_lifetime_stats_tickets", table_name="wallet_lifetime_stats")
+    op.drop_table("wallet_lifetime_stats")
+    op.drop_table("epoch_history")
@@ -0,0 +1,159 @@
+"""Compact raffle_entries, step 1 of 2: add the new columns and backfill them
+
+Adds the wallets table and the compact entry columns next to the old ones
+(wallet_id for wallet_address, 32-byte tx_hash for the hex
+transaction_hash, integer lovelace and epok_units for the float amounts),
+fills them in batches of MIGRATION_BATCH_SIZE rows, each committed on its
+own so ingestion and reads carry on throughout, and builds the new
+indexes concurrently under temporary names.
+
+Run this, deploy the code that uses the new columns, then run 0006, which
+backfills rows the old code wrote in between and drops the old columns.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:04
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "10000"))
+
+NEW_COLUMNS = (
+    ("wallet_id", sa.Integer()),
+    ("tx_hash", sa.LargeBinary(32)),
+    ("lovelace", sa.BigInteger()),
+    ("epok_units", sa.BigInteger()),
+)
+
+# Final name -> (columns, Postgres INCLUDE columns); built as "<name>_new" and
+# renamed by 0006 once the old index of that name is gone
+NEW_INDEXES = {
+    "ix_raffle_entries_epoch_id_id": (
+        ["epoch_id", "id"], ["wallet_id", "tickets", "lovelace", "tx_hash", "created_at"]
+    ),
+    "ix_raffle_entries_epoch_id_tx_hash": (["epoch_id", "tx_hash"], ["tickets", "wallet_id"]),
+    "ix_raffle_entries_epoch_id_wallet": (["epoch_id", "wallet_id"], ["tickets", "lovelace", "epok_units"]),
+}
+
+PG_INTERN_WALLETS = """
+    INSERT INTO wallets (address)
+    SELECT DISTINCT COALESCE(wallet_address, '') FROM raffle_entries
+    WHERE id > :low AND id <= :high AND wallet_id IS NULL
+    ORDER BY 1
+    ON CONFLICT (address) DO NOTHING
+"""
+PG_FILL_BATCH = """
+    UPDATE raffle_entries e
+    SET wallet_id = w.id,
+        tx_hash = decode(e.transaction_hash, 'hex'),
+        lovelace = round(COALESCE(e.ada_amount, 0) * 1000000)::bigint,
+        epok_units = round(COALESCE(e.epok_amount, 0))::bigint
+    FROM wallets w
+    WHERE w.address = COALESCE(e.wallet_address, '')
+      AND e.id > :low AND e.id <= :high AND e.wallet_id IS NULL
+"""
+
+
+def _fill_batch_portable(bind, low, high):
+    """The same conversion done in Python, for SQLite (which has no unhex() before 3.41)"""
+    rows = bind.execute(sa.text(
+        "SELECT id, wallet_address, transaction_hash, ada_amount, epok_amount FROM raffle_entries "
+        "WHERE id > :low AND id <= :high AND wallet_id IS NULL"
+    ), {"low": low, "high": high}).all()
+    if not rows:
+        return
+    addresses = sorted({row.wallet_address or "" for row in rows})
+    bind.execute(sa.text("INSERT INTO wallets (address) VALUES (:address) ON CONFLICT (address) DO NOTHING"),
+                 [{"address": address} for address in addresses])
+    wallet_ids = dict(bind.execute(
+        sa.text("SELECT address, id FROM wallets WHERE address IN :addresses")
+        .bindparams(sa.bindparam("addresses", expanding=True)),
+        {"addresses": addresses}
+    ).all())
+    bind.execute(sa.text(
+        "UPDATE raffle_entries SET wallet_id = :wallet_id, tx_hash = :tx_hash, lovelace = :lovelace, "
+        "epok_units = :epok_units WHERE id = :id"
+    ), [
+        {
+            "id": row.id,
+            "wallet_id": wallet_ids[row.wallet_address or ""],
+            "tx_hash": bytes.fromhex(row.transaction_hash),
+            "lovelace": round((row.ada_amount or 0) * 1_000_000),
+            "epok_units": round(row.epok_amount or 0),
+        }
+        for row in rows
+    ])
+
+
+def _id_ranges(bind, batch_size):
+    low, top = bind.execute(sa.text(
+        "SELECT MIN(id) - 1, MAX(id) FROM raffle_entries WHERE wallet_id IS NULL"
+    )).one()
+    while top is not None and low < top:
+        yield low, low + batch_size
+        low += batch_size
+
+
+def backfill(batch_size: int = BATCH_SIZE):
+    """Convert every entry still missing its compact columns, one id range at a time.
+
+    On Postgres each statement commits on its own, so no lock is held for
+    longer than one batch. SQLite allows a single writer anyway and runs it
+    in the migration's transaction.
+    """
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        for low, high in _id_ranges(bind, batch_size):
+            _fill_batch_portable(bind, low, high)
+        return
+    with op.get_context().autocommit_block():
+        for low, high in _id_ranges(bind, batch_size):
+            bind.execute(sa.text(PG_INTERN_WALLETS), {"low": low, "high": high})
+            bind.execute(sa.text(PG_FILL_BATCH), {"low": low, "high": high})
+
+
+def upgrade() -> None:
+    op.create_table(
+        "wallets",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("address", sa.String(), nullable=False, unique=True),
+    )
+    # Nullable and without defaults, so adding them doesn't rewrite the table
+    with op.batch_alter_table("raffle_entries") as batch:
+        for name, type_ in NEW_COLUMNS:
+            batch.add_column(sa.Column(name, type_, nullable=True))
+
+    backfill()
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_raffle_entries_tx_hash", "raffle_entries", ["tx_hash"], unique=True,
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        for name, (columns, include) in NEW_INDEXES.items():
+            op.create_index(
+                f"{name}_new", "raffle_entries", columns, postgresql_include=include,
+                postgresql_concurrently=True, if_not_exists=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in ("ix_raffle_entries_tx_hash", *(f"{name}_new" for name in NEW_INDEXES)):
+            op.drop_index(name, table_name="raffle_entries", postgresql_concurrently=True, if_exists=True)
+    with op.batch_alter_table("raffle_entries") as batch:
+        for name, _ in reversed(NEW_COLUMNS):
+            batch.drop_column(name)
+    op.drop_table("wallets")
@@ -0,0 +1,134 @@
+"""Compact raffle_entries, step 2 of 2: drop the old columns
+
+Run once the code using the compact columns is deployed everywhere.
+Backfills any entries the old code wrote after 0005, makes the compact
+columns NOT NULL and wallet_id a foreign key, swaps the indexes built by
+0005 in for the old ones and drops wallet_address, transaction_hash,
+ada_amount and epok_amount. On Postgres the constraints are added, validated
+and applied in separate transactions, so no step that scans the table
+holds a lock that blocks writes.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 00:00:05
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+from alembic.script import ScriptDirectory
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OLD_COLUMNS = (
+    ("wallet_address", sa.String()),
+    ("transaction_hash", sa.String()),
+    ("ada_amount", sa.Float()),
+    ("epok_amount", sa.Float()),
+)
+NEW_COLUMNS = ("wallet_id", "tx_hash", "lovelace", "epok_units")
+
+# Old indexes: name -> (columns, Postgres INCLUDE columns, unique)
+OLD_INDEXES = {
+    "ix_raffle_entries_wallet_address": (["wallet_address"], None, False),
+    "ix_raffle_entries_transaction_hash": (["transaction_hash"], None, True),
+    "ix_raffle_entries_epoch_id_id": (
+        ["epoch_id", "id"], ["wallet_address", "tickets", "ada_amount", "transaction_hash", "created_at"], False
+    ),
+    "ix_raffle_entries_epoch_id_tx_hash": (["epoch_id", "transaction_hash"], ["tickets"], False),
+    "ix_raffle_entries_epoch_id_wallet": (
+        ["epoch_id", "wallet_address"], ["tickets", "ada_amount", "epok_amount"], False
+    ),
+}
+WALLET_FK = "raffle_entries_wallet_id_fkey"
+
+
+def _expand_revision():
+    return ScriptDirectory.from_config(context.config).get_revision("0005").module
+
+
+def _drop_indexes(names):
+    with op.get_context().autocommit_block():
+        for name in names:
+            op.drop_index(name, table_name="raffle_entries", postgresql_concurrently=True, if_exists=True)
+
+
+def _rename_indexes(renames, definitions):
+    """Give indexes their final names (SQLite can't rename, so it rebuilds them)"""
+    if op.get_bind().dialect.name == "postgresql":
+        for old, new in renames:
+            op.execute(f"ALTER INDEX {old} RENAME TO {new}")
+        return
+    for old, new in renames:
+        op.drop_index(old, table_name="raffle_entries")
+        columns, include, unique = definitions[new]
+        op.create_index(new, "raffle_entries", columns, unique=unique)
+
+
+def upgrade() -> None:
+    expand = _expand_revision()
+    expand.backfill()
+    bind = op.get_bind()
+
+    if bind.dialect.name == "postgresql":
+        # Each statement commits on its own. Adding a NOT VALID constraint, SET
+        # NOT NULL and dropping a constraint take an exclusive lock but don't
+        # read the table (SET NOT NULL relies on the validated CHECK); the
+        # scans happen in VALIDATE, whose lock lets reads and writes through.
+        with op.get_context().autocommit_block():
+            for name in NEW_COLUMNS:
+                op.execute(f"ALTER TABLE raffle_entries ADD CONSTRAINT {name}_not_null "
+                           f"CHECK ({name} IS NOT NULL) NOT VALID")
+                op.execute(f"ALTER TABLE raffle_entries VALIDATE CONSTRAINT {name}_not_null")
+                op.execute(f"ALTER TABLE raffle_entries ALTER COLUMN {name} SET NOT NULL")
+                op.execute(f"ALTER TABLE raffle_entries DROP CONSTRAINT {name}_not_null")
+            op.execute(f"ALTER TABLE raffle_entries ADD CONSTRAINT {WALLET_FK} "
+                       "FOREIGN KEY (wallet_id) REFERENCES wallets (id) NOT VALID")
+            op.execute(f"ALTER TABLE raffle_entries VALIDATE CONSTRAINT {WALLET_FK}")
+
+    _drop_indexes(OLD_INDEXES)
+    with op.batch_alter_table("raffle_entries") as batch:
+        for name, _ in OLD_COLUMNS:
+            batch.drop_column(name)
+        if bind.dialect.name != "postgresql":
+            for name in NEW_COLUMNS:
+                batch.alter_column(name, nullable=False)
+            batch.create_foreign_key(WALLET_FK, "wallets", ["wallet_id"], ["id"])
+
+    definitions = {name: (columns, include, False) for name, (columns, include) in expand.NEW_INDEXES.items()}
+    _rename_indexes([(f"{name}_new", name) for name in definitions], definitions)
+
+
+def downgrade() -> None:
+    expand = _expand_revision()
+    bind = op.get_bind()
+    definitions = {name: (columns, include, False) for name, (columns, include) in expand.NEW_INDEXES.items()}
+    _rename_indexes([(name, f"{name}_new") for name in definitions],
+                    {f"{name}_new": definition for name, definition in definitions.items()})
+
+    with op.batch_alter_table("raffle_entries") as batch:
+        for name, type_ in OLD_COLUMNS:
+            batch.add_column(sa.Column(name, type_, nullable=True))
+    hex_hash = "encode(tx_hash, 'hex')" if bind.dialect.name == "postgresql" else "lower(hex(tx_hash))"
+    op.execute(
+        "UPDATE raffle_entries SET "
+        "wallet_address = (SELECT address FROM wallets WHERE wallets.id = raffle_entries.wallet_id), "
+        f"transaction_hash = {hex_hash}, ada_amount = lovelace / 1000000.0, epok_amount = epok_units"
+    )
+    with op.batch_alter_table("raffle_entries") as batch:
+        batch.drop_constraint(WALLET_FK, type_="foreignkey")
+        for name in NEW_COLUMNS:
+            batch.alter_column(name, nullable=True)
+
+    with op.get_context().autocommit_block():
+        for name, (columns, include, unique) in OLD_INDEXES.items():
+            op.create_index(
+                name, "raffle_entries", columns, unique=unique, postgresql_include=include,
+                postgresql_concurrently=True, if_not_exists=True
+            )
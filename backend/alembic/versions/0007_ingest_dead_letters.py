@@ -0,0 +1,34 @@
+"""Dead letters for webhook entries whose batched insert kept failing
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 00:00:06
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ingest_dead_letters",
+        sa.Column("transaction_hash", sa.String(), primary_key=True),
+        sa.Column("row_json", sa.Text(), nullable=False),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("ingest_dead_letters")
@@ -0,0 +1,94 @@
+"""Exact integer totals in the aggregates and rollups
+
+epoch_stats, wallet_epoch_stats, epoch_history and wallet_lifetime_stats
+summed ADA and EPOK as floats, which drift once enough entries are added
+up. They now hold total_lovelace and total_epok_units, recomputed from the
+raw entries rather than converted from the drifted floats: the per-epoch
+aggregates straight from raffle_entries, and the rollups from those, over
+the epochs already folded into epoch_history.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 00:00:07
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("epoch_stats", "wallet_epoch_stats", "epoch_history", "wallet_lifetime_stats")
+OLD_COLUMNS = ("total_ada", "total_epok")
+NEW_COLUMNS = ("total_lovelace", "total_epok_units")
+
+BACKFILL = (
+    """
+    UPDATE epoch_stats SET
+        total_lovelace = (SELECT COALESCE(SUM(e.lovelace), 0) FROM raffle_entries e
+                          WHERE e.epoch_id = epoch_stats.epoch_id),
+        total_epok_units = (SELECT COALESCE(SUM(e.epok_units), 0) FROM raffle_entries e
+                            WHERE e.epoch_id = epoch_stats.epoch_id)
+    """,
+    """
+    UPDATE wallet_epoch_stats SET
+        total_lovelace = (SELECT COALESCE(SUM(e.lovelace), 0) FROM raffle_entries e
+                          JOIN wallets w ON w.id = e.wallet_id
+                          WHERE e.epoch_id = wallet_epoch_stats.epoch_id
+                          AND w.address = wallet_epoch_stats.wallet_address),
+        total_epok_units = (SELECT COALESCE(SUM(e.epok_units), 0) FROM raffle_entries e
+                            JOIN wallets w ON w.id = e.wallet_id
+                            WHERE e.epoch_id = wallet_epoch_stats.epoch_id
+                            AND w.address = wallet_epoch_stats.wallet_address)
+    """,
+    """
+    UPDATE epoch_history SET
+        total_lovelace = COALESCE((SELECT s.total_lovelace FROM epoch_stats s
+                                   WHERE s.epoch_id = epoch_history.epoch_id), 0),
+        total_epok_units = COALESCE((SELECT s.total_epok_units FROM epoch_stats s
+                                     WHERE s.epoch_id = epoch_history.epoch_id), 0)
+    """,
+    """
+    UPDATE wallet_lifetime_stats SET
+        total_lovelace = (SELECT COALESCE(SUM(w.total_lovelace), 0) FROM wallet_epoch_stats w
+                          JOIN epoch_history h ON h.epoch_id = w.epoch_id
+                          WHERE w.wallet_address = wallet_lifetime_stats.wallet_address),
+        total_epok_units = (SELECT COALESCE(SUM(w.total_epok_units), 0) FROM wallet_epoch_stats w
+                            JOIN epoch_history h ON h.epoch_id = w.epoch_id
+                            WHERE w.wallet_address = wallet_lifetime_stats.wallet_address)
+    """,
+)
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch:
+            for name in NEW_COLUMNS:
+                batch.add_column(sa.Column(name, sa.BigInteger(), nullable=False, server_default="0"))
+    for statement in BACKFILL:
+        op.execute(statement)
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch:
+            for name in NEW_COLUMNS:
+                batch.alter_column(name, server_default=None)
+            for name in OLD_COLUMNS:
+                batch.drop_column(name)
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch:
+            for name in OLD_COLUMNS:
+                batch.add_column(sa.Column(name, sa.Float(), nullable=False, server_default="0"))
+        op.execute(f"UPDATE {table} SET total_ada = total_lovelace / 1000000.0, total_epok = total_epok_units")
+        with op.batch_alter_table(table) as batch:
+            for name in OLD_COLUMNS:
+                batch.alter_column(name, server_default=None)
+            for name in NEW_COLUMNS:
+                batch.drop_column(name)
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import random
+import time
+import httpx
+from .config import settings
+from .instrumentation import upstream_call
+
+logger = logging.getLogger(__name__)
+
+BLOCKFROST_BASE_URL = settings.blockfrost_base_url
+
+# Blockfrost allows 10 requests/s sustained with a burst of 500 per IP/project
+BLOCKFROST_RATE = settings.blockfrost_rate
+BLOCKFROST_BURST = settings.blockfrost_burst
+BLOCKFROST_MAX_RETRIES = settings.blockfrost_max_retries
+BLOCKFROST_TIMEOUT = settings.blockfrost_timeout
+BLOCKFROST_MAX_CONNECTIONS = settings.blockfrost_max_connections
+
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 10.0
+
+
+class BlockfrostError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Blockfrost {status_code}: {message}")
+        self.status_code = status_code
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, holding at most `capacity`"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def drain(self):
+        """Empty the bucket after the server told us to slow down"""
+        self._refill()
+        self.tokens = min(self.tokens, 0)
+
+
+class BlockfrostClient:
+    """Async Blockfrost API client sharing one pooled HTTP connection set.
+
+    All requests pass through a token bucket sized to the project's rate
+    limit; 429s and transient failures are retried with jittered
+    exponential backoff (honouring Retry-After when sent).
+    """
+
+    def __init__(self, project_id: str = None, base_url: str = BLOCKFROST_BASE_URL,
+                 rate: float = BLOCKFROST_RATE, burst: int = BLOCKFROST_BURST,
+                 max_retries: int = BLOCKFROST_MAX_RETRIES, timeout: float = BLOCKFROST_TIMEOUT,
+                 transport: httpx.AsyncBaseTransport = None):
+        self.project_id = project_id if project_id is not None else settings.blockfrost_project_id
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.transport = transport
+        self.bucket = TokenBucket(rate, burst)
+        self._http = None
+
+    @property
+    def http(self):
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"project_id": self.project_id or ""},
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=BLOCKFROST_MAX_CONNECTIONS,
+                    max_keepalive_connections=BLOCKFROST_MAX_CONNECTIONS
+                ),
+                transport=self.transport
+            )
+        return self._http
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def _backoff(self, attempt: int, retry_after: str = None):
+        delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        return delay
+
+    async def get(self, path: str, params: dict = None):
+        """GET a Blockfrost endpoint and return the decoded JSON body"""
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            try:
+                with upstream_call("blockfrost") as call:
+                    response = await self.http.get(path, params=params)
+                    call.status = response.status_code
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"Blockfrost {path} failed ({e!r}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            if response.status_code == 429 or response.status_code >= 500:
+                if response.status_code == 429:
+                    self.bucket.drain()
+                if attempt == self.max_retries:
+                    raise BlockfrostError(response.status_code, response.text)
+                delay = self._backoff(attempt, response.headers.get("retry-after"))
+                logger.warning(f"Blockfrost {path} returned {response.status_code}, retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            if response.status_code >= 400:
+                raise BlockfrostError(response.status_code, response.text)
+            return response.json()
+
+    async def transaction(self, tx_hash: str):
+        return await self.get(f"/txs/{tx_hash}")
+
+    async def transaction_utxos(self, tx_hash: str):
+        return await self.get(f"/txs/{tx_hash}/utxos")
+
+    async def transaction_with_utxos(self, tx_hash: str):
+        """Fetch a transaction and its UTxOs concurrently"""
+        return await asyncio.gather(self.transaction(tx_hash), self.transaction_utxos(tx_hash))
+
+    async def address_transactions(self, address: str, page: int = 1, count: int = 100,
+                                   order: str = "asc", from_block: str = None):
+        """One page of an address's transactions; `from_block` is "height[:index]", inclusive"""
+        params = {"page": page, "count": count, "order": order}
+        if from_block:
+            params["from"] = from_block
+        return await self.get(f"/addresses/{address}/transactions", params=params)
+
+    async def block(self, hash_or_number):
+        return await self.get(f"/blocks/{hash_or_number}")
+
+    async def blocks_next(self, hash_or_number, count: int = 1):
+        return await self.get(f"/blocks/{hash_or_number}/next", params={"count": count})
+
+    async def epoch_latest(self):
+        return await self.get("/epochs/latest")
+
+
+_client = None
+
+
+def get_client():
+    """Process-wide shared client; every handler should use this one"""
+    global _client
+    if _client is None:
+        _client = BlockfrostClient()
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -1,62 +1,46 @@
-from blockfrost import BlockFrostApi, ApiUrls
-import os
-from dotenv import load_dotenv
-from datetime import datetime
-from sqlalchemy.orm import Session
-from . import models
-
-load_dotenv()
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import ingest, tx_cache, validation
+from .blockfrost_client import BlockfrostClient, get_client
+from .epochs import CurrentEpoch
 
 class BlockfrostService:
-    def __init__(self):
-        project_id = os.getenv("BLOCKFROST_PROJECT_ID")
-        self.api = BlockFrostApi(
-            project_id=project_id,
-            base_url=ApiUrls.mainnet.value
-        )
-        self.raffle_address = os.getenv("RAFFLE_WALLET_ADDRESS")
-        self.epok_policy_id = os.getenv("EPOK_POLICY_ID")
-
-    async def process_transaction(self, tx_hash: str, db: Session, current_epoch: models.RaffleEpoch):
+    def __init__(self, client: BlockfrostClient = None, rules: validation.EntryRules = None):
+        self.client = client
+        self.rules = rules or validation.default_rules
+        self.raffle_address = self.rules.raffle_address
+
+    @property
+    def api(self):
+        return self.client or get_client()
+
+    def entry_from_utxos(self, tx_hash: str, utxos: dict, epoch_id: int):
+        """Return the raffle entry row for a transaction, or None if it doesn't qualify"""
+        evaluation = validation.evaluate(utxos, self.rules)
+        if not evaluation.valid:
+            return None
+        # One row per transaction, holding a ticket per entry bundle it paid for
+        return evaluation.entry_row(tx_hash, epoch_id)
+
+    async def process_transaction(self, tx_hash: str, db: AsyncSession, current_epoch: CurrentEpoch):
         """Process a transaction and add entries to the raffle"""
         try:
-            tx = await self.api.transaction(tx_hash)
-            utxos = await self.api.transaction_utxos(tx_hash)
-            
-            # Process outputs sent to raffle address
-            for output in utxos.outputs:
-                if output.address == self.raffle_address:
-                    ada_amount = 0
-                    epok_amount = 0
-                    
-                    for amount in output.amount:
-                        if amount.unit == "lovelace":
-                            ada_amount = amount.quantity / 1_000_000  # Convert lovelace to ADA
-                        elif amount.unit == self.epok_policy_id:
-                            epok_amount = amount.quantity
-                    
-                    # Validate EXACT amounts required
-                    if ada_amount == 5 and epok_amount == 1000:
-                        # Create entry in database
-                        entry = models.RaffleEntry(
-                            wallet_address=tx.inputs[0].address,  # Sender's address
-                            transaction_hash=tx_hash,
-                            ada_amount=ada_amount,
-                            epok_amount=epok_amount,
-                            tickets=1,  # Always 1 ticket per valid transaction
-                            epoch_id=current_epoch.id
-                        )
-                        
-                        db.add(entry)
-                        db.commit()
-                        
-                        return {
-                            "valid": True,
-                            "tickets": 1,
-                            "ada_amount": ada_amount,
-                            "epok_amount": epok_amount
-                        }
-            
-            return {"valid": False, "error": "Transaction must include EXACTLY 5 ADA and 1000 EPOK tokens"}
+            tx, utxos = await tx_cache.transaction_with_utxos(tx_hash, self.api)
+
+            entry = self.entry_from_utxos(tx_hash, utxos, current_epoch.id)
+            if entry:
+                # Create entry in database; redeliveries of the same tx are no-ops
+                await ingest.insert_entries(db, [entry])
+                await db.commit()
+
+                return {
+                    "valid": True,
+                    "tickets": entry["tickets"],
+                    "ada_amount": entry["lovelace"] / 1_000_000,
+                    "epok_amount": entry["epok_units"]
+                }
+
+            return {"valid": False, "error": f"Transaction must send {self.rules.describe()} to the raffle wallet"}
         except Exception as e:
             return {"valid": False, "error": str(e)}
+
+service = BlockfrostService()
@@ -0,0 +1,393 @@
+from array import array
+import asyncio
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+import hashlib
+import logging
+import random
+import secrets
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .config import settings
+from .blockfrost_client import BlockfrostClient, BlockfrostError, get_client
+from .merkle import MerkleBuilder, leaf_hash, path_ranges, verify_inclusion
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round-trip when streaming entries for a draw
+DRAW_BATCH_SIZE = 10_000
+
+# "verifiable" seeds the draw from the epoch's closing block; "random" uses
+# a locally generated seed (for networks without a Blockfrost project)
+DRAW_MODE = settings.draw_mode
+# Depth the closing block must have before its hash is used as the seed
+DRAW_MIN_CONFIRMATIONS = settings.draw_min_confirmations
+# Average Cardano block interval, for the first guess at the closing block's height
+BLOCK_INTERVAL_S = 20
+
+SEED_DOMAIN = b"epok-raffle-draw"
+
+
+class DrawNotReady(Exception):
+    """The draw can't be made yet (epoch still open, closing block too shallow)"""
+
+
+class TicketIndex:
+    """Cumulative ticket counts over raffle entries.
+
+    Holds one entry id and one running ticket total per entry (16 bytes per
+    entry) instead of one list slot per ticket, and maps a ticket offset
+    back to its entry with a binary search.
+    """
+
+    def __init__(self):
+        self.entry_ids = array('q')
+        self.cumulative = array('q')
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build an index from an iterable of (entry_id, tickets) pairs"""
+        index = cls()
+        for entry_id, tickets in rows:
+            index.add(entry_id, tickets)
+        return index
+
+    def __len__(self):
+        return len(self.entry_ids)
+
+    @property
+    def total(self):
+        return self.cumulative[-1] if self.cumulative else 0
+
+    def add(self, entry_id, tickets):
+        if not tickets or tickets < 0:
+            return
+        self.entry_ids.append(entry_id)
+        self.cumulative.append(self.total + tickets)
+
+    def locate(self, offset):
+        """Return the entry id holding ticket number `offset` (0-based)"""
+        if not 0 <= offset < self.total:
+            raise IndexError("ticket offset out of range")
+        return self.entry_ids[bisect_right(self.cumulative, offset)]
+
+    def pick(self, rng=None):
+        """Pick an entry id with probability proportional to its tickets"""
+        if not self.total:
+            return None
+        rng = rng or random
+        return self.locate(rng.randrange(self.total))
+
+
+def unix_time(moment: datetime) -> int:
+    return int(moment.replace(tzinfo=timezone.utc).timestamp())
+
+
+def derive_seed(epoch_id: int, block_hash: str) -> bytes:
+    """Draw seed for an epoch, bound to the hash of its closing block"""
+    return hashlib.sha256(SEED_DOMAIN + epoch_id.to_bytes(8, "big") + bytes.fromhex(block_hash)).digest()
+
+
+def winning_offset(seed: bytes, total_tickets: int) -> int:
+    """Ticket number drawn by `seed`; the 256-bit modulo bias is negligible"""
+    return int.from_bytes(hashlib.sha256(seed + b"offset").digest(), "big") % total_tickets
+
+
+def audit_rows_query(epoch_id: int):
+    """An epoch's entries in the fixed draw order: by transaction hash (bytewise, as in hex)"""
+    entry = models.RaffleEntry
+    return select(entry.id, entry.tx_hash, entry.wallet_id, entry.tickets)\
+        .where(entry.epoch_id == epoch_id)\
+        .where(entry.tickets > 0)\
+        .order_by(entry.tx_hash)
+
+
+@dataclass
+class DrawResult:
+    seed: str
+    entry_count: int
+    total_tickets: int
+    merkle_root: str
+    offset: int
+    winner_index: int
+    winner_entry_id: int
+    winner_transaction_hash: str
+    winner_address: str
+    winner_range: tuple
+    proof: list = field(default_factory=list)
+
+    def to_dict(self):
+        return {
+            "seed": self.seed,
+            "entry_count": self.entry_count,
+            "total_tickets": self.total_tickets,
+            "merkle_root": self.merkle_root,
+            "offset": self.offset,
+            "winner": {
+                "index": self.winner_index,
+                "entry_id": self.winner_entry_id,
+                "transaction_hash": self.winner_transaction_hash,
+                "wallet_address": self.winner_address,
+                "ticket_range": list(self.winner_range),
+            },
+            "proof": self.proof,
+        }
+
+
+class DrawReplay:
+    """The seeded draw, fed one entry at a time in transaction hash order.
+
+    Each entry is a Merkle leaf over its ticket range. Alongside the root,
+    the replay picks the entry holding the seeded ticket offset and
+    collects its audit path: the left siblings are the builder's stack when
+    the winner's leaf arrives, and each right sibling range gets its own
+    builder for the rest of the entries. Memory stays O(log n) whatever the
+    epoch's size, so the rows can come straight from a database stream or
+    an epoch snapshot.
+    """
+
+    def __init__(self, count: int, total: int, seed: bytes):
+        self.count = count
+        self.total = total
+        self.seed = seed
+        self.offset = winning_offset(seed, total)
+        self.tree = MerkleBuilder()
+        self.cumulative = 0
+        self.index = 0
+        self.winner = None
+        self.left_siblings = {}
+        self.right_siblings = []
+
+    def add(self, entry_id, transaction_hash, wallet_address, tickets):
+        cumulative, index = self.cumulative, self.index
+        leaf = leaf_hash(transaction_hash, cumulative, tickets)
+        if self.winner is None and cumulative + tickets > self.offset:
+            self.winner = (index, entry_id, transaction_hash, wallet_address, (cumulative, cumulative + tickets))
+            self.left_siblings = {(start, start + size): digest for start, size, digest in self.tree.stack}
+            self.right_siblings = [
+                (first, end, MerkleBuilder(first)) for first, end in path_ranges(index, self.count) if first > index
+            ]
+        else:
+            for first, end, builder in self.right_siblings:
+                if first <= index < end:
+                    builder.add(leaf)
+                    break
+        self.tree.add(leaf)
+        self.cumulative += tickets
+        self.index += 1
+
+    def result(self):
+        if self.index != self.count or self.cumulative != self.total:
+            raise DrawNotReady("entries changed while the draw was running")
+
+        winner = self.winner
+        right_roots = {(first, end): builder.root() for first, end, builder in self.right_siblings}
+        proof = [
+            (self.left_siblings.get(span) or right_roots[span]).hex()
+            for span in path_ranges(winner[0], self.count)
+        ]
+        return DrawResult(
+            seed=self.seed.hex(),
+            entry_count=self.count,
+            total_tickets=self.total,
+            merkle_root=self.tree.root().hex(),
+            offset=self.offset,
+            winner_index=winner[0],
+            winner_entry_id=winner[1],
+            winner_transaction_hash=winner[2],
+            winner_address=winner[3],
+            winner_range=winner[4],
+            proof=proof,
+        )
+
+
+async def replay_draw(db: AsyncSession, epoch_id: int, seed: bytes, batch_size: int = DRAW_BATCH_SIZE):
+    """Run the seeded draw over an epoch's entries in one streaming pass.
+
+    Returns a DrawResult, or None for an epoch without tickets.
+    """
+    entry = models.RaffleEntry
+    count, total = (await db.execute(
+        select(func.count(), func.coalesce(func.sum(entry.tickets), 0))
+        .where(entry.epoch_id == epoch_id)
+        .where(entry.tickets > 0)
+    )).one()
+    if not total:
+        return None
+
+    replay = DrawReplay(count, total, seed)
+    result = await db.stream(audit_rows_query(epoch_id).execution_options(yield_per=batch_size))
+    async for entry_id, tx_hash, wallet_id, tickets in result:
+        replay.add(entry_id, tx_hash.hex(), wallet_id, tickets)
+    draw = replay.result()
+    # Addresses aren't part of the tree, so only the winner's is looked up
+    draw.winner_address = await db.scalar(
+        select(models.Wallet.address).where(models.Wallet.id == draw.winner_address)
+    )
+    return draw
+
+
+def replay_snapshot(snapshot, seed: bytes):
+    """The same draw over an epoch snapshot, without touching the database"""
+    if not snapshot.total_tickets:
+        return None
+    replay = DrawReplay(len(snapshot), snapshot.total_tickets, seed)
+    for row in snapshot.rows():
+        replay.add(*row)
+    return replay.result()
+
+
+async def _replay(db: AsyncSession, epoch_id: int, seed: bytes, snapshot=None):
+    if snapshot is None:
+        return await replay_draw(db, epoch_id, seed)
+    # Pure CPU over the mapped file; keep the event loop serving meanwhile
+    return await asyncio.to_thread(replay_snapshot, snapshot, seed)
+
+
+async def _block_at(client: BlockfrostClient, height: int):
+    """The block at `height`, or None if the chain has none there"""
+    try:
+        return await client.block(height)
+    except BlockfrostError as e:
+        if e.status_code != 404:
+            raise
+        return None
+
+
+async def closing_block(client: BlockfrostClient, end_time: datetime):
+    """The last block minted at or before `end_time`.
+
+    Block times grow with height, so this steps back from the tip, doubling
+    the step until it passes the end time, then bisects the heights in
+    between: O(log n) Blockfrost calls for a block n heights deep. Heights
+    with no block count as before the end.
+    """
+    end = unix_time(end_time)
+    latest = await client.block("latest")
+    if latest["time"] <= end:
+        raise DrawNotReady("no block minted after the epoch end yet")
+
+    # `high` is always after the end; `low` at or before it, with `found` its block
+    high, low, found = latest["height"], None, None
+    step = max(1, (latest["time"] - end) // BLOCK_INTERVAL_S)
+    while low is None:
+        height = max(high - step, 0)
+        block = await _block_at(client, height)
+        if block is None or block["time"] <= end:
+            low, found = height, block
+        elif height == 0:
+            raise DrawNotReady("no block minted before the epoch end")
+        else:
+            high, step = height, step * 2
+    while high - low > 1:
+        middle = (low + high) // 2
+        block = await _block_at(client, middle)
+        if block is None or block["time"] <= end:
+            low, found = middle, block
+        else:
+            high = middle
+    if found is None:
+        raise DrawNotReady("no block minted before the epoch end")
+    return found
+
+
+async def seed_block(end_time: datetime, client: BlockfrostClient = None):
+    """The block to seed the draw of an epoch ending at `end_time`; None unless DRAW_MODE is verifiable.
+
+    Raises DrawNotReady until the epoch has ended and its closing block
+    has DRAW_MIN_CONFIRMATIONS confirmations. Finding the block can take
+    many Blockfrost calls, so look it up before locking the epoch.
+    """
+    if DRAW_MODE != "verifiable":
+        return None
+    if datetime.utcnow() < end_time:
+        raise DrawNotReady("epoch has not ended yet")
+    block = await closing_block(client or get_client(), end_time)
+    if block.get("confirmations", 0) < DRAW_MIN_CONFIRMATIONS:
+        raise DrawNotReady(f"closing block {block['hash']} has too few confirmations")
+    return block
+
+
+async def draw_epoch(db: AsyncSession, epoch: models.RaffleEpoch, block: dict = None, snapshot=None):
+    """Draw `epoch`'s winner and record everything needed to replay it.
+
+    In verifiable mode `block` is the epoch's seed_block(), which is only
+    checked here against the end time. With a `snapshot` of the frozen
+    epoch the entries are read from it rather than streamed from the
+    database again. Marks the epoch completed on success; the caller
+    commits. Returns the DrawResult, or None if the epoch has no tickets.
+    """
+    if DRAW_MODE == "verifiable":
+        if block is None or block["time"] > unix_time(epoch.end_time):
+            raise DrawNotReady("closing block was not looked up for this end time")
+        seed = derive_seed(epoch.id, block["hash"])
+    else:
+        block = None
+        seed = secrets.token_bytes(32)
+
+    result = await _replay(db, epoch.id, seed, snapshot)
+    if result is None:
+        return None
+
+    epoch.draw_seed = result.seed
+    epoch.draw_block_hash = block["hash"] if block else None
+    epoch.draw_block_height = block["height"] if block else None
+    epoch.ticket_merkle_root = result.merkle_root
+    epoch.total_tickets = result.total_tickets
+    epoch.entry_count = result.entry_count
+    epoch.winner_transaction_hash = result.winner_transaction_hash
+    epoch.winner_address = result.winner_address
+    epoch.drawn_at = datetime.utcnow()
+    epoch.is_completed = True
+    logger.info(f"Drew epoch {epoch.id}: {result.winner_address} (root {result.merkle_root})")
+    return result
+
+
+async def verify_draw(db: AsyncSession, epoch: models.RaffleEpoch, client: BlockfrostClient = None,
+                      check_chain: bool = False, snapshot=None):
+    """Replay a recorded draw and check it against what was stored.
+
+    Replays from the database, or from `snapshot` if given (which checks
+    the snapshot as much as the draw). Returns a report with the replayed
+    DrawResult (including the winner's inclusion proof) and one named
+    pass/fail entry per check.
+    """
+    checks = {}
+    if not epoch.draw_seed:
+        return {"epoch_id": epoch.id, "ok": False, "checks": {"draw recorded": False}, "draw": None}
+
+    if epoch.draw_block_hash:
+        checks["seed derives from closing block"] = \
+            derive_seed(epoch.id, epoch.draw_block_hash).hex() == epoch.draw_seed
+        if check_chain:
+            client = client or get_client()
+            end = unix_time(epoch.end_time)
+            block = await client.block(epoch.draw_block_hash)
+            following = await client.blocks_next(epoch.draw_block_hash, count=1)
+            checks["closing block minted before epoch end"] = block["time"] <= end
+            checks["next block minted after epoch end"] = bool(following) and following[0]["time"] > end
+
+    result = await _replay(db, epoch.id, bytes.fromhex(epoch.draw_seed), snapshot)
+    if result is None:
+        checks["epoch has tickets"] = False
+    else:
+        checks["entry count matches"] = result.entry_count == epoch.entry_count
+        checks["ticket total matches"] = result.total_tickets == epoch.total_tickets
+        checks["merkle root matches"] = result.merkle_root == epoch.ticket_merkle_root
+        checks["winner matches"] = result.winner_transaction_hash == epoch.winner_transaction_hash
+        first, end = result.winner_range
+        checks["winner proof verifies"] = verify_inclusion(
+            result.winner_index, result.entry_count,
+            leaf_hash(result.winner_transaction_hash, first, end - first),
+            [bytes.fromhex(sibling) for sibling in result.proof],
+            bytes.fromhex(epoch.ticket_merkle_root or "")
+        )
+
+    return {
+        "epoch_id": epoch.id,
+        "ok": all(checks.values()),
+        "checks": checks,
+        "draw": result.to_dict() if result else None,
+    }
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+import httpx
+from .config import settings
+from .blockfrost_client import get_client
+from .instrumentation import upstream_call
+
+logger = logging.getLogger(__name__)
+
+EPOCH_INFO_URL = settings.epoch_info_url
+# How long fetched data counts as fresh before a background revalidation
+EPOCH_INFO_TTL = settings.epoch_info_ttl
+EPOCH_INFO_TIMEOUT = settings.epoch_info_timeout
+
+# Mainnet epochs are a fixed 5 days, counted from the Shelley hard fork (epoch 208)
+EPOCH_LENGTH_S = 5 * 24 * 3600
+SHELLEY_EPOCH = 208
+SHELLEY_START = 1_596_059_091
+
+
+@dataclass(frozen=True)
+class EpochBoundaries:
+    epoch: int
+    start_time: float
+    end_time: float
+    fetched_at: float
+
+    @classmethod
+    def for_epoch(cls, epoch: int, fetched_at: float):
+        start_time = SHELLEY_START + (epoch - SHELLEY_EPOCH) * EPOCH_LENGTH_S
+        return cls(epoch, start_time, start_time + EPOCH_LENGTH_S, fetched_at)
+
+    def advanced_to(self, now: float):
+        """These boundaries moved forward along the fixed schedule to cover `now`"""
+        if now < self.end_time:
+            return self
+        epochs_passed = int((now - self.start_time) // EPOCH_LENGTH_S)
+        return EpochBoundaries.for_epoch(self.epoch + epochs_passed, self.fetched_at)
+
+    def render(self, now: float = None):
+        """Epoch info in the /api/current-epoch shape, computed for `now`"""
+        now = time.time() if now is None else now
+        remaining = max(0, int(self.end_time - now))
+        elapsed = min(max(now - self.start_time, 0), self.end_time - self.start_time)
+        return {
+            "current_epoch": self.epoch,
+            "progress": round(elapsed / (self.end_time - self.start_time) * 100, 2),
+            "time_remaining": {
+                "days": remaining // 86400,
+                "hours": remaining % 86400 // 3600,
+                "minutes": remaining % 3600 // 60,
+                "seconds": remaining % 60,
+            },
+        }
+
+
+class EpochInfoProvider:
+    """Cached Cardano epoch info for /api/current-epoch.
+
+    Only the epoch boundaries are fetched; progress and time remaining are
+    computed locally on every call. While the cached epoch is running,
+    callers are served immediately and a stale entry (older than `ttl`) is
+    revalidated in the background. All concurrent refreshes share one
+    upstream request. cardanocountdown.com is the primary source, with
+    Blockfrost's latest epoch as the fallback.
+    """
+
+    def __init__(self, url: str = EPOCH_INFO_URL, ttl: float = EPOCH_INFO_TTL, transport=None):
+        self.url = url
+        self.ttl = ttl
+        self.transport = transport
+        self._cached = None
+        self._inflight = None
+        self._http = None
+
+    @property
+    def http(self):
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(timeout=EPOCH_INFO_TIMEOUT, transport=self.transport)
+        return self._http
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def get(self):
+        """Return current epoch info, or None if no source has answered yet"""
+        cached = self._cached
+        now = time.time()
+        if cached and now < cached.end_time:
+            if now - cached.fetched_at > self.ttl:
+                self._refresh()
+            return cached.render(now)
+
+        # Nothing usable cached (first call, or the epoch just rolled over)
+        try:
+            boundaries = await asyncio.shield(self._refresh())
+        except Exception as e:
+            logger.error(f"Error fetching epoch info: {e}")
+            boundaries = None
+        if boundaries is None and cached:
+            # Keep extrapolating the fixed epoch schedule rather than failing outright
+            boundaries = cached.advanced_to(now)
+        return boundaries.render(now) if boundaries else None
+
+    def _refresh(self):
+        """Start (or join) the single in-flight upstream fetch"""
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._fetch())
+            self._inflight.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return self._inflight
+
+    async def _fetch(self):
+        try:
+            boundaries = await self._fetch_primary()
+        except Exception as e:
+            logger.warning(f"Epoch info from {self.url} failed ({e}), falling back to Blockfrost")
+            boundaries = await self._fetch_blockfrost()
+        # A source lagging behind the rollover would otherwise force a refetch per call
+        self._cached = boundaries.advanced_to(time.time())
+        return self._cached
+
+    async def _fetch_primary(self):
+        with upstream_call("epoch_info") as call:
+            response = await self.http.get(self.url)
+            call.status = response.status_code
+        response.raise_for_status()
+        return EpochBoundaries.for_epoch(int(response.json()["epoch"]), time.time())
+
+    async def _fetch_blockfrost(self):
+        data = await get_client().epoch_latest()
+        return EpochBoundaries(int(data["epoch"]), data["start_time"], data["end_time"], time.time())
+
+
+provider = EpochInfoProvider()
@@ -0,0 +1,124 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import logging
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+
+logger = logging.getLogger(__name__)
+
+EPOCH_LENGTH = timedelta(days=5)
+
+# Key for the Postgres advisory lock that serializes epoch creation ("EPOK")
+EPOCH_LOCK_KEY = 0x45504F4B
+
+
+@dataclass(frozen=True)
+class CurrentEpoch:
+    """Detached snapshot of the active epoch, safe to share across sessions"""
+    id: int
+    start_time: datetime
+    end_time: datetime
+
+    @classmethod
+    def from_model(cls, epoch: models.RaffleEpoch):
+        return cls(id=epoch.id, start_time=epoch.start_time, end_time=epoch.end_time)
+
+
+def active_epoch_query(now: datetime):
+    """The open epoch ending soonest after `now` (served by the partial active-epoch index)"""
+    return select(models.RaffleEpoch)\
+        .where(models.RaffleEpoch.end_time > now)\
+        .where(models.RaffleEpoch.is_completed == False)\
+        .order_by(models.RaffleEpoch.end_time)\
+        .limit(1)
+
+
+def undrawn_epoch_query(now: datetime):
+    """The oldest epoch that has ended without being drawn"""
+    return select(models.RaffleEpoch)\
+        .where(models.RaffleEpoch.end_time <= now)\
+        .where(models.RaffleEpoch.is_completed == False)\
+        .order_by(models.RaffleEpoch.end_time)\
+        .limit(1)
+
+
+def latest_completed_query():
+    return select(models.RaffleEpoch)\
+        .where(models.RaffleEpoch.is_completed == True)\
+        .order_by(models.RaffleEpoch.end_time.desc())\
+        .limit(1)
+
+
+class EpochResolver:
+    """Resolves the active raffle epoch, caching it until its end_time.
+
+    Each worker process keeps its own copy; the only time a request touches
+    the database for the epoch is the first lookup after the cached epoch
+    has expired (or after `invalidate`).
+    """
+
+    def __init__(self):
+        self._cached = None
+
+    def cached(self):
+        """Return the cached epoch if it is still active, without touching the DB"""
+        epoch = self._cached
+        if epoch and datetime.utcnow() < epoch.end_time:
+            return epoch
+        return None
+
+    async def current(self, db: AsyncSession):
+        """Return the active epoch, or None if none is open.
+
+        Read-only: epochs are opened by the rollover scheduler, never by
+        request handlers.
+        """
+        epoch = self.cached()
+        if epoch:
+            return epoch
+
+        epoch = await self._load(db)
+        self._cached = epoch
+        return epoch
+
+    def invalidate(self):
+        self._cached = None
+
+    async def _load(self, db: AsyncSession):
+        result = await db.execute(active_epoch_query(datetime.utcnow()))
+        epoch = result.scalars().first()
+        return CurrentEpoch.from_model(epoch) if epoch else None
+
+
+async def open_epoch(db: AsyncSession, start_time: datetime):
+    """Create the epoch starting at `start_time` unless one already runs past it.
+
+    Returns the new epoch's id, or None if another open epoch ends after
+    `start_time` already. The caller commits.
+    """
+    # Serialize creation across workers; the lock is released at commit
+    if db.bind.dialect.name == "postgresql":
+        await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": EPOCH_LOCK_KEY})
+
+    existing = await db.scalar(
+        select(models.RaffleEpoch.id)
+        .where(models.RaffleEpoch.end_time > start_time)
+        .where(models.RaffleEpoch.is_completed == False)
+        .limit(1)
+    )
+    if existing:
+        return None
+
+    epoch = models.RaffleEpoch(
+        start_time=start_time,
+        end_time=start_time + EPOCH_LENGTH,
+        is_completed=False
+    )
+    db.add(epoch)
+    await db.flush()
+    logger.info(f"Opened epoch {epoch.id}: {epoch.start_time} - {epoch.end_time}")
+    return epoch.id
+
+
+resolver = EpochResolver()
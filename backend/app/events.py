@@ -0,0 +1,197 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+from sqlalchemy import event as sa_event, func, select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import epochs
+from .config import settings
+from .database import async_engine
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CHANNEL = "raffle_events"
+# Idle connections get a comment line this often so proxies keep them open
+SSE_KEEPALIVE_S = settings.sse_keepalive_s
+# Events buffered per client before it is told to resync instead
+SSE_CLIENT_BUFFER = settings.sse_client_buffer
+SSE_RETRY_MS = 5000
+LISTEN_RECONNECT_S = 5
+
+# Postgres refuses NOTIFY payloads of 8000 bytes or more, failing the writing
+# transaction; entry lists are packed into payloads under this size
+NOTIFY_MAX_BYTES = 7500
+
+PENDING_KEY = "pending_events"
+
+
+def notify_payload(event: str, data) -> str:
+    # ASCII-only (ensure_ascii), so its length is its size in bytes
+    return json.dumps({"event": event, "data": data}, separators=(",", ":"))
+
+
+def format_event(event: str, data) -> str:
+    """One SSE frame, encoded once and shared by every subscriber"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+RESYNC_FRAME = format_event("resync", {})
+
+
+class Broadcaster:
+    """Fans raffle changes out to every open /api/events stream.
+
+    Events are published inside the writing transaction and only delivered
+    once it commits. On Postgres they travel through NOTIFY, and each worker
+    holds a single LISTEN connection, so every gunicorn worker sees every
+    change regardless of which one wrote it. Elsewhere (SQLite dev setups)
+    delivery is in-process. A client that falls too far behind has its
+    buffer replaced with a resync event telling it to refetch.
+
+    In-process consumers (e.g. the response cache) can register a callback
+    with `add_listener`; it is called with (event, data) for every
+    delivered event.
+    """
+
+    def __init__(self, engine=async_engine, client_buffer: int = SSE_CLIENT_BUFFER):
+        self.engine = engine
+        self.client_buffer = client_buffer
+        self.subscribers = set()
+        self.listeners = []
+        self._listener = None
+
+    @property
+    def uses_notify(self):
+        return self.engine.dialect.name == "postgresql"
+
+    async def start(self):
+        if self.uses_notify and (self._listener is None or self._listener.done()):
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self):
+        """Hold one LISTEN connection, reconnecting if it drops"""
+        while True:
+            lost = asyncio.Event()
+            try:
+                async with self.engine.connect() as conn:
+                    raw = await conn.get_raw_connection()
+                    driver = raw.driver_connection
+                    driver.add_termination_listener(lambda _: lost.set())
+                    await driver.add_listener(EVENTS_CHANNEL, self._on_notify)
+                    try:
+                        await lost.wait()
+                    finally:
+                        if not driver.is_closed():
+                            await driver.remove_listener(EVENTS_CHANNEL, self._on_notify)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Event listener connection failed: {e}")
+            # Anything sent while we were disconnected is gone; have clients refetch
+            self.deliver("resync", {})
+            await asyncio.sleep(LISTEN_RECONNECT_S)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        message = json.loads(payload)
+        if message["event"] == "winner":
+            # The draw may have happened in another worker; drop our cached epoch
+            epochs.resolver.invalidate()
+        self.deliver(message["event"], message["data"])
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def deliver(self, event: str, data):
+        """Hand a committed event to in-process listeners and every stream"""
+        for callback in self.listeners:
+            try:
+                callback(event, data)
+            except Exception as e:
+                logger.error(f"Event listener failed on {event}: {e}")
+        self.dispatch(RESYNC_FRAME if event == "resync" else format_event(event, data))
+
+    def dispatch(self, frame: str):
+        for queue in self.subscribers:
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC_FRAME)
+
+    async def publish(self, db: AsyncSession, event: str, data):
+        """Queue an event for delivery when `db`'s transaction commits"""
+        if self.uses_notify:
+            payload = notify_payload(event, data)
+            if len(payload) > NOTIFY_MAX_BYTES:
+                logger.error(f"{event} event is too large to NOTIFY ({len(payload)} bytes); sending resync instead")
+                payload = notify_payload("resync", {})
+            await db.execute(select(func.pg_notify(EVENTS_CHANNEL, payload)))
+        else:
+            db.sync_session.info.setdefault(PENDING_KEY, []).append((event, data))
+
+    async def publish_entries(self, db: AsyncSession, rows):
+        """Publish newly inserted entry rows, packed into NOTIFY-sized chunks"""
+        created_at = datetime.utcnow().isoformat()
+        entries = [
+            {
+                "epoch_id": row["epoch_id"],
+                "wallet_address": row["wallet_address"],
+                "tickets": row["tickets"],
+                "ada_amount": row["lovelace"] / 1_000_000,
+                "epok_amount": row["epok_units"],
+                "transaction_hash": row["transaction_hash"],
+                "created_at": created_at,
+            }
+            for row in rows
+        ]
+        empty = len(notify_payload("entries", []))
+        chunk, size = [], empty
+        for entry in entries:
+            # Plus the comma separating it from the previous entry
+            entry_size = len(json.dumps(entry, separators=(",", ":"))) + 1
+            if chunk and size + entry_size > NOTIFY_MAX_BYTES:
+                await self.publish(db, "entries", chunk)
+                chunk, size = [], empty
+            chunk.append(entry)
+            size += entry_size
+        if chunk:
+            await self.publish(db, "entries", chunk)
+
+    async def stream(self):
+        """SSE body for one client: events as they arrive, keepalives between"""
+        queue = asyncio.Queue(maxsize=self.client_buffer)
+        self.subscribers.add(queue)
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_S)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            self.subscribers.discard(queue)
+
+
+broadcaster = Broadcaster()
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _deliver_pending(session):
+    for event, data in session.info.pop(PENDING_KEY, []):
+        broadcaster.deliver(event, data)
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,167 @@
+"""Rollups of closed epochs for the history and leaderboard endpoints.
+
+epoch_history holds one row per closed epoch and wallet_lifetime_stats one
+row per wallet, summed over every closed epoch it entered. Both are
+written once per epoch, inside the transaction that closes it (see
+scheduler.close_epoch), from the per-epoch aggregates that ingestion
+already maintains, so the read endpoints never scan raffle_entries or
+raffle_epochs. `rebuild` recomputes them from those aggregates.
+"""
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .database import dialect_insert
+from .stats import STAT_COLUMNS, get_epoch_stats, stats_fields
+
+LIFETIME_COLUMNS = (*STAT_COLUMNS, "epochs_entered", "wins", "last_epoch_id")
+MAX_LEADERBOARD_SIZE = 100
+
+
+def history_fields(row: models.EpochHistory):
+    return {
+        "epoch_id": row.epoch_id,
+        "start_time": row.start_time,
+        "end_time": row.end_time,
+        "winner_address": row.winner_address,
+        "winner_transaction_hash": row.winner_transaction_hash,
+        "prize_pool": row.total_lovelace / 1_000_000,
+        "total_epok": row.total_epok_units,
+        "total_tickets": row.total_tickets,
+        "entry_count": row.entry_count,
+        "wallet_count": row.wallet_count,
+    }
+
+
+def wallet_fields(row: models.WalletLifetimeStats):
+    return {"wallet_address": row.wallet_address,
+            **stats_fields({name: getattr(row, name) for name in LIFETIME_COLUMNS})}
+
+
+async def record_closed_epoch(db: AsyncSession, epoch: models.RaffleEpoch):
+    """Fold a just-closed epoch into the rollups, in the caller's transaction.
+
+    Idempotent: the history row is inserted first, and the wallet totals are
+    only added when it was new.
+    """
+    totals = await get_epoch_stats(db, epoch.id)
+    wallet_count = await db.scalar(
+        select(func.count()).select_from(models.WalletEpochStats)
+        .where(models.WalletEpochStats.epoch_id == epoch.id)
+    )
+    inserted = await db.execute(
+        dialect_insert(db, models.EpochHistory).values(
+            epoch_id=epoch.id,
+            start_time=epoch.start_time,
+            end_time=epoch.end_time,
+            winner_address=epoch.winner_address,
+            winner_transaction_hash=epoch.winner_transaction_hash,
+            wallet_count=wallet_count,
+            **totals
+        ).on_conflict_do_nothing(index_elements=["epoch_id"])
+    )
+    if not inserted.rowcount:
+        return False
+
+    wallet = models.WalletEpochStats
+    lifetime = models.WalletLifetimeStats
+    stmt = dialect_insert(db, lifetime).from_select(
+        ["wallet_address", *STAT_COLUMNS, "epochs_entered", "wins", "last_epoch_id"],
+        select(wallet.wallet_address, *(getattr(wallet, name) for name in STAT_COLUMNS),
+               1, 0, wallet.epoch_id)
+        .where(wallet.epoch_id == epoch.id)
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["wallet_address"],
+        set_={
+            **{name: getattr(lifetime, name) + stmt.excluded[name] for name in (*STAT_COLUMNS, "epochs_entered")},
+            "last_epoch_id": stmt.excluded.last_epoch_id,
+        }
+    )
+    await db.execute(stmt)
+    if epoch.winner_address:
+        await db.execute(
+            update(lifetime).where(lifetime.wallet_address == epoch.winner_address)
+            .values(wins=lifetime.wins + 1)
+        )
+    return True
+
+
+def rebuild_statements():
+    """Statements that recompute both rollups from the per-epoch aggregates"""
+    epoch, history = models.RaffleEpoch, models.EpochHistory
+    epoch_stats, wallet = models.EpochStats, models.WalletEpochStats
+    lifetime = models.WalletLifetimeStats
+    wallet_counts = select(wallet.epoch_id, func.count().label("wallet_count"))\
+        .group_by(wallet.epoch_id).subquery()
+    completed = select(epoch.id).where(epoch.is_completed == True)
+
+    return [
+        delete(history),
+        delete(lifetime),
+        history.__table__.insert().from_select(
+            ["epoch_id", "start_time", "end_time", "winner_address", "winner_transaction_hash",
+             *STAT_COLUMNS, "wallet_count"],
+            select(
+                epoch.id, epoch.start_time, epoch.end_time, epoch.winner_address, epoch.winner_transaction_hash,
+                *(func.coalesce(getattr(epoch_stats, name), 0) for name in STAT_COLUMNS),
+                func.coalesce(wallet_counts.c.wallet_count, 0)
+            )
+            .outerjoin(epoch_stats, epoch_stats.epoch_id == epoch.id)
+            .outerjoin(wallet_counts, wallet_counts.c.epoch_id == epoch.id)
+            .where(epoch.is_completed == True)
+        ),
+        lifetime.__table__.insert().from_select(
+            ["wallet_address", *STAT_COLUMNS, "epochs_entered", "wins", "last_epoch_id"],
+            select(
+                wallet.wallet_address, *(func.sum(getattr(wallet, name)) for name in STAT_COLUMNS),
+                func.count(), 0, func.max(wallet.epoch_id)
+            )
+            .where(wallet.epoch_id.in_(completed))
+            .group_by(wallet.wallet_address)
+        ),
+        update(lifetime).values(wins=(
+            select(func.count()).where(history.winner_address == lifetime.wallet_address)
+            .scalar_subquery()
+        )),
+    ]
+
+
+async def rebuild(db: AsyncSession):
+    for statement in rebuild_statements():
+        await db.execute(statement)
+
+
+def history_page_query(cursor: int = None, limit: int = 20):
+    """Closed epochs, newest first; `cursor` is the last epoch id already seen"""
+    query = select(models.EpochHistory).order_by(models.EpochHistory.epoch_id.desc()).limit(limit + 1)
+    if cursor is not None:
+        query = query.where(models.EpochHistory.epoch_id < cursor)
+    return query
+
+
+def top_wallets_query(limit: int = 10):
+    """Wallets by lifetime tickets (served backwards off ix_wallet_lifetime_stats_tickets)"""
+    lifetime = models.WalletLifetimeStats
+    return select(lifetime)\
+        .order_by(lifetime.total_tickets.desc(), lifetime.wallet_address.desc())\
+        .limit(limit)
+
+
+async def get_history_page(db: AsyncSession, cursor: int = None, limit: int = 20):
+    rows = (await db.execute(history_page_query(cursor, limit))).scalars().all()
+    next_cursor = rows[limit - 1].epoch_id if len(rows) > limit else None
+    return [history_fields(row) for row in rows[:limit]], next_cursor
+
+
+async def get_wallet_lifetime(db: AsyncSession, wallet_address: str):
+    """A wallet's totals over every closed epoch (zeros if it never entered one)"""
+    row = await db.get(models.WalletLifetimeStats, wallet_address)
+    if row is None:
+        return {"wallet_address": wallet_address, **stats_fields(dict.fromkeys(LIFETIME_COLUMNS, 0)),
+                "last_epoch_id": None}
+    return wallet_fields(row)
+
+
+async def get_top_wallets(db: AsyncSession, limit: int = 10):
+    rows = await db.execute(top_wallets_query(limit))
+    return [wallet_fields(row) for row in rows.scalars()]
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+from bisect import bisect_right
+from datetime import datetime
+from sqlalchemy import select, text
+from . import models, ingest
+from .config import settings
+from .blockfrost_client import BlockfrostClient, get_client
+from .blockfrost_service import BlockfrostService
+from .database import AsyncSessionLocal, async_engine
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = "raffle_address"
+INDEXER_PAGE_SIZE = 100
+# Transactions whose UTxOs are fetched concurrently
+INDEXER_WINDOW = settings.indexer_window
+# Seconds between background catch-up runs; 0 disables the background loop
+INDEXER_INTERVAL = settings.indexer_interval
+
+# Postgres advisory lock key so only one worker indexes at a time ("IDXR")
+INDEXER_LOCK_KEY = 0x49445852
+
+
+class BackfillIndexer:
+    """Rebuilds raffle entries from the chain, independent of webhooks.
+
+    Pages through the raffle address's transactions in chain order starting
+    at the stored checkpoint, fetches their UTxOs concurrently (bounded by
+    `window`), validates them with BlockfrostService's rules and
+    bulk-inserts whatever is missing. The checkpoint advances in the same
+    transaction as each page's inserts, so an interrupted run resumes where
+    it stopped and re-running is always safe.
+    """
+
+    def __init__(self, client: BlockfrostClient = None, service: BlockfrostService = None,
+                 window: int = INDEXER_WINDOW, page_size: int = INDEXER_PAGE_SIZE,
+                 session_factory=AsyncSessionLocal):
+        self.client = client
+        self.service = service or BlockfrostService()
+        self.window = window
+        self.page_size = page_size
+        self.session_factory = session_factory
+
+    @property
+    def api(self):
+        return self.client or get_client()
+
+    async def _load_checkpoint(self, db):
+        checkpoint = await db.get(models.IndexerCheckpoint, CHECKPOINT_NAME)
+        if checkpoint is None:
+            checkpoint = models.IndexerCheckpoint(name=CHECKPOINT_NAME, block_height=0, tx_index=0)
+            db.add(checkpoint)
+            await db.flush()
+        return checkpoint
+
+    async def _load_epochs(self, db):
+        result = await db.execute(
+            select(models.RaffleEpoch.start_time, models.RaffleEpoch.end_time,
+                   models.RaffleEpoch.id, models.RaffleEpoch.is_completed)
+            .order_by(models.RaffleEpoch.start_time)
+        )
+        return result.all()
+
+    def _epoch_for(self, epochs, starts, block_time: int):
+        """Id of the open epoch whose window contains `block_time`, if any"""
+        moment = datetime.utcfromtimestamp(block_time)
+        position = bisect_right(starts, moment) - 1
+        if position < 0:
+            return None
+        start_time, end_time, epoch_id, is_completed = epochs[position]
+        if moment >= end_time or is_completed:
+            return None
+        return epoch_id
+
+    async def _fetch_utxos(self, tx_hashes):
+        semaphore = asyncio.Semaphore(self.window)
+
+        async def fetch(tx_hash):
+            async with semaphore:
+                return await self.api.transaction_utxos(tx_hash)
+
+        return await asyncio.gather(*(fetch(tx_hash) for tx_hash in tx_hashes))
+
+    async def run_once(self, max_pages: int = None):
+        """Replay dead-lettered webhook entries, then catch up from the checkpoint to the chain tip; returns run counters"""
+        counters = {"pages": 0, "transactions": 0, "inserted": 0, "skipped": 0}
+        # Webhook entries whose insert failed may lie behind the checkpoint already
+        counters["replayed"] = await ingest.replay_dead_letters(self.session_factory)
+        async with self.session_factory() as db:
+            checkpoint = await self._load_checkpoint(db)
+            epochs = await self._load_epochs(db)
+            starts = [epoch[0] for epoch in epochs]
+            position = (checkpoint.block_height, checkpoint.tx_index)
+            from_block = f"{position[0]}:{position[1]}" if position[0] else None
+            await db.commit()
+
+            page = 1
+            while max_pages is None or counters["pages"] < max_pages:
+                items = await self.api.address_transactions(
+                    self.service.raffle_address, page=page, count=self.page_size,
+                    order="asc", from_block=from_block
+                )
+                counters["pages"] += 1
+                at_tip = len(items) < self.page_size
+                # `from` is inclusive, so drop anything at or before the checkpoint
+                items = [item for item in items if (item["block_height"], item["tx_index"]) > position]
+                if items:
+                    utxos = await self._fetch_utxos([item["tx_hash"] for item in items])
+                    rows = []
+                    for item, tx_utxos in zip(items, utxos):
+                        epoch_id = self._epoch_for(epochs, starts, item["block_time"])
+                        entry = self.service.entry_from_utxos(item["tx_hash"], tx_utxos, epoch_id) if epoch_id else None
+                        if entry:
+                            rows.append(entry)
+                        else:
+                            counters["skipped"] += 1
+
+                    inserted = await ingest.insert_entries(db, rows)
+                    last = items[-1]
+                    position = (last["block_height"], last["tx_index"])
+                    checkpoint.block_height, checkpoint.tx_index = position
+                    db.add(checkpoint)
+                    await db.commit()
+
+                    counters["transactions"] += len(items)
+                    counters["inserted"] += len(inserted)
+
+                if at_tip:
+                    break
+                page += 1
+
+        logger.info(f"Backfill run finished: {counters}")
+        return counters
+
+    async def run_locked(self, max_pages: int = None):
+        """run_once, skipped if another process currently holds the indexer lock"""
+        if async_engine.dialect.name != "postgresql":
+            return await self.run_once(max_pages)
+        async with async_engine.connect() as conn:
+            acquired = await conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": INDEXER_LOCK_KEY})
+            if not acquired:
+                return None
+            try:
+                return await self.run_once(max_pages)
+            finally:
+                await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": INDEXER_LOCK_KEY})
+
+    async def run_forever(self, interval: float = INDEXER_INTERVAL):
+        while True:
+            try:
+                await self.run_locked()
+            except Exception as e:
+                logger.error(f"Backfill run failed: {e}")
+            await asyncio.sleep(interval)
+
+
+indexer = BackfillIndexer()
@@ -0,0 +1,292 @@
+import asyncio
+import json
+import logging
+import time
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, stats, wallets
+from .config import settings
+from .events import broadcaster
+from .database import AsyncSessionLocal, dialect_insert
+
+logger = logging.getLogger(__name__)
+
+INGEST_BATCH_SIZE = settings.ingest_batch_size
+INGEST_FLUSH_MS = settings.ingest_flush_ms
+INGEST_QUEUE_SIZE = settings.ingest_queue_size
+# A batch failing this many times is parked in ingest_dead_letters
+INGEST_MAX_ATTEMPTS = 3
+# Rows that can't even be parked (database down) are retried after this
+# delay, doubling per consecutive failure up to the max
+INGEST_RETRY_S = 1
+INGEST_RETRY_MAX_S = 60
+DEAD_LETTER_BATCH = 100
+
+
+class QueueFull(Exception):
+    pass
+
+
+def tx_hash_bytes(transaction_hash: str) -> bytes:
+    """The stored form of a hex transaction hash; raises ValueError if it isn't one"""
+    raw = bytes.fromhex(transaction_hash)
+    if len(raw) != 32:
+        raise ValueError(f"transaction hash {transaction_hash!r} is not 32 bytes")
+    return raw
+
+
+def frozen_error(epoch_id: int) -> str:
+    return f"epoch {epoch_id} closed before the entry was inserted"
+
+
+async def insert_entries(db: AsyncSession, rows):
+    """Insert entry rows in one statement, skipping already-known tx hashes.
+
+    Rows are dicts with `wallet_address`, hex `transaction_hash`, integer
+    `lovelace` and `epok_units`, `tickets` and `epoch_id`; senders are
+    interned into wallets first. Aggregates are updated for the rows that
+    were actually inserted, in the same transaction, and the new entries
+    and prize totals are published to live viewers on commit. Returns the
+    inserted rows; the caller commits.
+
+    Rows for an epoch that has closed (e.g. submitted by a worker whose
+    cached current epoch was just drawn) are paid entries that can't join
+    the draw any more: they are parked in ingest_dead_letters, in the same
+    transaction, to be settled by hand.
+    """
+    unique_rows = list({row["transaction_hash"]: row for row in rows}.values())
+    if not unique_rows:
+        return []
+
+    # Completed epochs are frozen. The key-share lock waits out a draw in
+    # progress (which holds the epoch row FOR UPDATE), then sees it completed.
+    epoch_ids = {row["epoch_id"] for row in unique_rows}
+    open_epochs = set((await db.execute(
+        select(models.RaffleEpoch.id)
+        .where(models.RaffleEpoch.id.in_(epoch_ids))
+        .where(models.RaffleEpoch.is_completed == False)
+        .with_for_update(read=True, key_share=True)
+    )).scalars().all())
+    if open_epochs != epoch_ids:
+        for epoch_id in sorted(epoch_ids - open_epochs):
+            frozen = [row for row in unique_rows if row["epoch_id"] == epoch_id]
+            logger.warning(f"Dead-lettering {len(frozen)} entries for closed epoch {epoch_id}")
+            await dead_letter(db, frozen, frozen_error(epoch_id))
+        unique_rows = [row for row in unique_rows if row["epoch_id"] in open_epochs]
+        if not unique_rows:
+            return []
+
+    wallet_ids = await wallets.wallet_ids(db, [row["wallet_address"] for row in unique_rows])
+    values = [
+        {
+            "wallet_id": wallet_ids[row["wallet_address"]],
+            "tx_hash": tx_hash_bytes(row["transaction_hash"]),
+            "lovelace": row["lovelace"],
+            "epok_units": row["epok_units"],
+            "tickets": row["tickets"],
+            "epoch_id": row["epoch_id"],
+        }
+        for row in unique_rows
+    ]
+    stmt = dialect_insert(db, models.RaffleEntry)\
+        .values(values)\
+        .on_conflict_do_nothing(index_elements=["tx_hash"])\
+        .returning(models.RaffleEntry.tx_hash)
+    result = await db.execute(stmt)
+    inserted_hashes = set(result.scalars().all())
+
+    inserted = [row for row, value in zip(unique_rows, values) if value["tx_hash"] in inserted_hashes]
+    await stats.record_entries(db, inserted)
+
+    if inserted:
+        await broadcaster.publish_entries(db, inserted)
+        for epoch_id in sorted({row["epoch_id"] for row in inserted}):
+            epoch_stats = await stats.get_epoch_stats(db, epoch_id)
+            await broadcaster.publish(db, "prize", {"epoch_id": epoch_id, **stats.stats_fields(epoch_stats)})
+    return inserted
+
+
+async def dead_letter(db: AsyncSession, rows, error):
+    """Park rows whose insert kept failing, for replay_dead_letters; the caller commits"""
+    stmt = dialect_insert(db, models.IngestDeadLetter).values([
+        {"transaction_hash": row["transaction_hash"], "row_json": json.dumps(row), "error": str(error), "attempts": 1}
+        for row in {row["transaction_hash"]: row for row in rows}.values()
+    ])
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=["transaction_hash"],
+        set_={"error": stmt.excluded.error, "attempts": models.IngestDeadLetter.attempts + 1}
+    ))
+
+
+async def replay_dead_letters(session_factory=AsyncSessionLocal, limit: int = DEAD_LETTER_BATCH):
+    """Insert parked entries, each in its own transaction; returns how many left the table.
+
+    An entry whose epoch was closed in the meantime can't be inserted any
+    more; it stays parked with that error for someone to settle by hand.
+    """
+    letter = models.IngestDeadLetter
+    replayed = 0
+    async with session_factory() as db:
+        # Least recently tried first, so entries that keep failing don't starve the rest
+        parked = (await db.execute(
+            select(letter.transaction_hash, letter.row_json).order_by(letter.updated_at).limit(limit)
+        )).all()
+        await db.commit()
+        for transaction_hash, row_json in parked:
+            row = json.loads(row_json)
+            try:
+                await insert_entries(db, [row])
+                stored = await db.scalar(select(models.RaffleEntry.id).where(
+                    models.RaffleEntry.tx_hash == tx_hash_bytes(transaction_hash)
+                ))
+                if stored is None:
+                    raise ValueError(frozen_error(row["epoch_id"]))
+                await db.execute(delete(letter).where(letter.transaction_hash == transaction_hash))
+                await db.commit()
+                replayed += 1
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Replay of dead-lettered entry {transaction_hash} failed: {e}")
+                await db.execute(update(letter).where(letter.transaction_hash == transaction_hash)
+                                 .values(error=str(e), attempts=letter.attempts + 1))
+                await db.commit()
+    if parked:
+        logger.info(f"Replayed {replayed} of {len(parked)} dead-lettered entries")
+    return replayed
+
+
+class IngestQueue:
+    """Buffers webhook entries and writes them in batches.
+
+    A single background task per worker drains the queue, flushing whenever
+    `batch_size` entries are waiting or `flush_ms` has passed since the
+    first one arrived.
+
+    Entries have already been acknowledged to Blockfrost, which won't
+    redeliver them, so a batch is never dropped: after INGEST_MAX_ATTEMPTS
+    failed inserts it is parked in ingest_dead_letters, and if even that
+    fails it goes back on the queue after a growing delay. Only rows still
+    waiting for that retry when the worker stops are lost, and those are
+    logged in full.
+    """
+
+    def __init__(self, batch_size=INGEST_BATCH_SIZE, flush_ms=INGEST_FLUSH_MS,
+                 maxsize=INGEST_QUEUE_SIZE, session_factory=AsyncSessionLocal):
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.maxsize = maxsize
+        self.session_factory = session_factory
+        self._queue = None
+        self._task = None
+        self._retry_delay = INGEST_RETRY_S
+        # Requeue tasks -> the batch each will put back
+        self._retrying = {}
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._queue = self._queue or asyncio.Queue(maxsize=self.maxsize)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush anything still queued and stop the background task"""
+        if self._task is None:
+            return
+        if not self._task.done():
+            await self._queue.put(None)
+            await self._task
+        self._task = None
+        unsaved = [item for task, batch in self._retrying.items() if task.cancel() for item in batch]
+        self._retrying.clear()
+        # Requeued after the stop marker
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                unsaved.append(item)
+        for row, _ in unsaved:
+            logger.error(f"Unsaved entry, not inserted or dead-lettered: {json.dumps(row)}")
+
+    def submit(self, row: dict):
+        """Queue an entry row; returns a future resolving to True if it was new"""
+        # A malformed hash would fail the whole batch; refuse it here instead
+        tx_hash_bytes(row["transaction_hash"])
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        # Webhook callers don't wait on the result; don't warn about unread failures
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            self._queue.put_nowait((row, future))
+        except asyncio.QueueFull:
+            raise QueueFull("ingest queue is full")
+        return future
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch):
+        rows = [row for row, _ in batch]
+        for attempt in range(1, INGEST_MAX_ATTEMPTS + 1):
+            try:
+                async with self.session_factory() as db:
+                    inserted = await insert_entries(db, rows)
+                    await db.commit()
+                break
+            except Exception as e:
+                logger.error(f"Ingest flush of {len(rows)} entries failed (attempt {attempt}): {e}")
+                if attempt == INGEST_MAX_ATTEMPTS:
+                    await self._park(batch, e)
+                    return
+                await asyncio.sleep(0.1 * attempt)
+
+        self._retry_delay = INGEST_RETRY_S
+        inserted_hashes = {row["transaction_hash"] for row in inserted}
+        for row, future in batch:
+            if not future.done():
+                future.set_result(row["transaction_hash"] in inserted_hashes)
+
+    async def _park(self, batch, error):
+        rows = [row for row, _ in batch]
+        try:
+            async with self.session_factory() as db:
+                await dead_letter(db, rows, error)
+                await db.commit()
+        except Exception as e:
+            delay = self._retry_delay
+            self._retry_delay = min(delay * 2, INGEST_RETRY_MAX_S)
+            logger.error(f"Dead-lettering {len(rows)} entries failed ({e}); requeueing them in {delay:g}s")
+            task = asyncio.create_task(self._requeue(batch, delay))
+            self._retrying[task] = batch
+            task.add_done_callback(lambda done: self._retrying.pop(done, None))
+            return
+        logger.warning(f"Dead-lettered {len(rows)} entries after {INGEST_MAX_ATTEMPTS} failed inserts: {error}")
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _requeue(self, batch, delay):
+        await asyncio.sleep(delay)
+        for item in batch:
+            await self._queue.put(item)
+
+
+queue = IngestQueue()
@@ -0,0 +1,260 @@
+"""Per-request metrics: wall time, SQL statements, upstream calls, N+1 detection.
+
+InstrumentationMiddleware tracks each request in a context variable that
+the SQLAlchemy engine events and the outbound HTTP wrappers add to, and
+exports the totals as Prometheus metrics, labelled by route template
+(so /metrics stays small whatever the URLs). Work outside a request, such
+as the ingest queue flush or the scheduler, is labelled "background".
+
+Set PROMETHEUS_MULTIPROC_DIR to an empty directory shared by the gunicorn
+workers to have /metrics aggregate all of them instead of whichever worker
+answered the scrape.
+"""
+import asyncio
+import contextvars
+import hmac
+import logging
+import random
+import time
+from collections import Counter as Tally
+from contextlib import contextmanager
+from functools import lru_cache
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from starlette.routing import Match
+from .config import settings
+from .profiler import Sampler
+
+logger = logging.getLogger(__name__)
+
+# A request running the same statement this many times is flagged as N+1
+N_PLUS_ONE_THRESHOLD = settings.n_plus_one_threshold
+
+# Sampling profiler: a random fraction of requests, plus any sent with
+# `X-Profile: <PROFILE_TOKEN>`; stacks are kept for requests slower than PROFILE_SLOW_MS
+PROFILE_RATE = settings.profile_rate
+PROFILE_TOKEN = settings.profile_token
+PROFILE_SLOW_MS = settings.profile_slow_ms
+PROFILE_INTERVAL_MS = settings.profile_interval_ms
+PROFILE_DIR = settings.profile_dir
+
+# Long-lived streams would swamp the latency histograms
+UNMEASURED_PATHS = ("/metrics", "/api/events")
+BACKGROUND = "background"
+UNMATCHED = "unmatched"
+
+REQUESTS = Counter(
+    "epok_http_requests_total", "Requests served", ["method", "route", "status"]
+)
+REQUEST_DURATION = Histogram(
+    "epok_http_request_duration_seconds", "Wall time per request", ["method", "route"]
+)
+REQUEST_QUERIES = Histogram(
+    "epok_db_queries_per_request", "SQL statements executed per request", ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+REQUEST_DB_TIME = Histogram(
+    "epok_db_seconds_per_request", "Time spent executing SQL per request", ["route"]
+)
+QUERY_DURATION = Histogram(
+    "epok_db_query_duration_seconds", "Duration of each SQL statement", ["route"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5)
+)
+UPSTREAM_DURATION = Histogram(
+    "epok_upstream_request_duration_seconds", "Outbound HTTP call latency", ["upstream", "route", "status"]
+)
+N_PLUS_ONE = Counter(
+    "epok_n_plus_one_total", f"Requests repeating one SQL statement {N_PLUS_ONE_THRESHOLD}+ times", ["route"]
+)
+
+
+# (method, path) -> route template, for parameterless routes served before routing
+_unrouted_paths = {}
+
+
+def route_path(scope, router=None):
+    """The path template of the route `scope` is (or will be) served by"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Not routed (yet), e.g. served by the response cache: match it ourselves
+    key = (scope["method"], scope["path"])
+    if key in _unrouted_paths:
+        return _unrouted_paths[key]
+    if router is not None:
+        for candidate in router.routes:
+            if candidate.matches(scope)[0] == Match.FULL:
+                if not candidate.param_convertors:
+                    _unrouted_paths[key] = candidate.path
+                return candidate.path
+    return UNMATCHED
+
+
+class RequestMetrics:
+    """What one request has spent so far"""
+
+    __slots__ = ("scope", "router", "queries", "db_time", "upstream_calls", "upstream_time", "statements")
+
+    def __init__(self, scope, router=None):
+        self.scope = scope
+        self.router = router
+        self.queries = 0
+        self.db_time = 0.0
+        self.upstream_calls = 0
+        self.upstream_time = 0.0
+        self.statements = Tally()
+
+    @property
+    def route(self):
+        """The matched route's path template"""
+        return route_path(self.scope, self.router)
+
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+def current_route():
+    metrics = _current.get()
+    return metrics.route if metrics else BACKGROUND
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started"] = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop("query_started", time.perf_counter())
+    metrics = _current.get()
+    QUERY_DURATION.labels(metrics.route if metrics else BACKGROUND).observe(elapsed)
+    if metrics:
+        metrics.queries += 1
+        metrics.db_time += elapsed
+        metrics.statements[statement] += 1
+
+
+def instrument_engine(engine):
+    """Count and time every statement `engine` (sync or async) executes"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(sync_engine, "before_cursor_execute", _before_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_execute)
+
+
+class UpstreamCall:
+    __slots__ = ("status",)
+
+    def __init__(self):
+        self.status = "error"
+
+
+@contextmanager
+def upstream_call(upstream: str):
+    """Time one outbound HTTP request; set `.status` on the yielded object once answered"""
+    call = UpstreamCall()
+    started = time.perf_counter()
+    try:
+        yield call
+    finally:
+        elapsed = time.perf_counter() - started
+        UPSTREAM_DURATION.labels(upstream, current_route(), str(call.status)).observe(elapsed)
+        metrics = _current.get()
+        if metrics:
+            metrics.upstream_calls += 1
+            metrics.upstream_time += elapsed
+
+
+@lru_cache(maxsize=1024)
+def _request_series(method: str, route: str, status: int):
+    """The labelled children a request updates (labels() takes a lock and builds keys on every call)"""
+    return (
+        REQUESTS.labels(method, route, str(status)),
+        REQUEST_DURATION.labels(method, route),
+        REQUEST_QUERIES.labels(route),
+        REQUEST_DB_TIME.labels(route),
+    )
+
+
+def render_metrics():
+    """(body, content type) for a Prometheus scrape"""
+    registry = REGISTRY
+    if settings.prometheus_multiproc_dir:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class InstrumentationMiddleware:
+    """Record per-route metrics for every HTTP request, and profile some of them.
+
+    Sits outermost, so responses served by the response cache are measured
+    too. Adds a Server-Timing header with the database and upstream time
+    spent before the response started.
+    """
+
+    def __init__(self, app, router=None, sampler: Sampler = None):
+        self.app = app
+        self.router = router
+        self.sampler = sampler
+
+    def _requested_profile(self, scope):
+        """Whether the caller asked for this request to be profiled"""
+        if not PROFILE_TOKEN:
+            return False
+        token = dict(scope["headers"]).get(b"x-profile")
+        return token is not None and hmac.compare_digest(token, PROFILE_TOKEN.encode())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in UNMEASURED_PATHS:
+            return await self.app(scope, receive, send)
+
+        metrics = RequestMetrics(scope, self.router)
+        token = _current.set(metrics)
+        status = 500
+        profile = None
+        requested = self._requested_profile(scope)
+        if self.sampler is not None and (requested or PROFILE_RATE > 0 and random.random() < PROFILE_RATE):
+            profile = self.sampler.profile(asyncio.current_task())
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = f"db;dur={metrics.db_time * 1000:.1f};desc=\"{metrics.queries} queries\", " \
+                         f"upstream;dur={metrics.upstream_time * 1000:.1f}"
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (b"server-timing", timing.encode())]}
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            if profile is not None:
+                self.sampler.finish(profile)
+            self._observe(scope, metrics, status, elapsed)
+            # Requested profiles are always kept; sampled ones only when slow
+            if profile is not None and profile.stacks and (requested or elapsed * 1000 >= PROFILE_SLOW_MS):
+                path = profile.dump(PROFILE_DIR, f"{scope['method']}-{metrics.route}-{elapsed * 1000:.0f}ms")
+                logger.info(f"Profiled {scope['method']} {scope['path']} ({elapsed * 1000:.0f} ms): {path}")
+
+    def _observe(self, scope, metrics, status, elapsed):
+        route = metrics.route
+        requests, duration, queries, db_time = _request_series(scope["method"], route, status)
+        requests.inc()
+        duration.observe(elapsed)
+        queries.observe(metrics.queries)
+        db_time.observe(metrics.db_time)
+
+        if metrics.statements:
+            statement, count = metrics.statements.most_common(1)[0]
+            if count >= N_PLUS_ONE_THRESHOLD:
+                N_PLUS_ONE.labels(route).inc()
+                logger.warning(f"Possible N+1 in {scope['method']} {route}: "
+                               f"{count}x {' '.join(statement.split())[:200]}")
+
+
+sampler = Sampler(PROFILE_INTERVAL_MS / 1000)
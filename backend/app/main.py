@@ -1,131 +1,142 @@
-from fastapi import FastAPI, HTTPException, Depends, Response, APIRouter
+from fastapi import FastAPI, HTTPException, Depends, Response, APIRouter, Query
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime, timedelta
-import os
-from dotenv import load_dotenv
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from . import models, blockfrost_service
-from .database import get_db, engine
+from fastapi.responses import JSONResponse, StreamingResponse
+from contextlib import asynccontextmanager
+from typing import Optional
+import asyncio
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import blockfrost_client, stats, pagination, epochs, ingest, indexer, events, scheduler
+from . import history, snapshot, rate_limit
+from . import instrumentation
+from .config import settings
+from .instrumentation import InstrumentationMiddleware
+from .rate_limit import RateLimitMiddleware
+from .response_cache import ResponseCacheMiddleware
+from .epoch_info import provider as epoch_info_provider
+from .database import get_db, async_engine
 from . import webhook_handler
-from blockfrost import BlockFrostApi
-import httpx
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
-
-load_dotenv()
-
-app = FastAPI(title="Epok Raffle API")
-
-# Configure CORS - Allow the Vercel frontend to access our API
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["https://epok-eight.vercel.app"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared by every request in this worker; connections open on first use
+    app.state.blockfrost = blockfrost_client.get_client()
+    app.state.epoch_info = epoch_info_provider
+    ingest.queue.start()
+    await events.broadcaster.start()
+    background = []
+    if settings.scheduler_enabled:
+        # Epoch rollover and draws; only the worker holding the lock acts
+        background.append(asyncio.create_task(scheduler.scheduler.run_forever()))
+    if settings.indexer_interval > 0:
+        # Periodic catch-up so entries missed by webhooks still land
+        background.append(asyncio.create_task(indexer.indexer.run_forever(settings.indexer_interval)))
+    yield
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    # Drain queued webhook entries before the worker exits
+    await ingest.queue.stop()
+    await events.broadcaster.stop()
+    await blockfrost_client.close_client()
+    await epoch_info_provider.aclose()
+    await async_engine.dispose()
 
 # Create API router
 api_router = APIRouter(prefix="/api")
 
-# Initialize Blockfrost client
-api = BlockFrostApi(
-    project_id=os.environ.get('BLOCKFROST_PROJECT_ID')
-)
-
-async def get_cardano_epoch_info():
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get('https://cardanocountdown.com/api/epoch')
-            if response.status_code == 200:
-                data = response.json()
-                return {
-                    'current_epoch': data['epoch'],
-                    'progress': data['progress'],
-                    'time_remaining': data['timeLeft']
-                }
-    except Exception as e:
-        logger.error(f"Error fetching epoch info: {e}")
-    return None
-
 @api_router.get("/current-epoch")
 async def get_current_epoch():
-    epoch_info = await get_cardano_epoch_info()
+    epoch_info = await epoch_info_provider.get()
     if epoch_info:
         return epoch_info
     return {"error": "Failed to fetch epoch information"}
 
 @api_router.get("/current-prize")
-async def get_current_prize(db: Session = Depends(get_db)):
-    current_epoch = get_or_create_current_epoch(db)
+async def get_current_prize(db: AsyncSession = Depends(get_db)):
+    current_epoch = await epochs.resolver.current(db)
+    if not current_epoch:
+        return {"amount": 0}
     
-    # Get total ADA in current epoch
-    total_ada = db.query(func.sum(models.RaffleEntry.ada_amount))\
-        .filter(models.RaffleEntry.epoch_id == current_epoch.id)\
-        .scalar() or 0
+    # Get total ADA in current epoch from the running aggregate
+    epoch_stats = await stats.get_epoch_stats(db, current_epoch.id)
     
     return {
-        "amount": total_ada
+        "amount": epoch_stats["total_lovelace"] / 1_000_000
     }
 
 @api_router.get("/participants")
-async def get_participants(db: Session = Depends(get_db)):
-    current_epoch = get_or_create_current_epoch(db)
+async def get_participants(
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_db)
+):
+    current_epoch = await epochs.resolver.current(db)
+    if not current_epoch:
+        return {"epoch_id": None, "participants": [], "total_entries": 0, "next_cursor": None}
     
-    entries = db.query(models.RaffleEntry)\
-        .filter(models.RaffleEntry.epoch_id == current_epoch.id)\
-        .all()
+    if format == "ndjson":
+        return pagination.ndjson_response(current_epoch.id, pagination.PARTICIPANT_FIELDS, cursor)
     
-    total_entries = sum(entry.tickets for entry in entries)
-    
-    participants_data = []
-    for entry in entries:
-        participants_data.append({
-            "wallet_address": entry.wallet_address,
-            "tickets": entry.tickets,
-            "ada_amount": entry.ada_amount,
-            "transaction_hash": entry.transaction_hash,
-            "created_at": entry.created_at.isoformat()
-        })
+    participants_data, next_cursor = await pagination.get_page(
+        db, current_epoch.id, pagination.PARTICIPANT_FIELDS, cursor, limit
+    )
+    epoch_stats = await stats.get_epoch_stats(db, current_epoch.id)
+    total_entries = epoch_stats["total_tickets"]
     
     return {
+        "epoch_id": current_epoch.id,
         "participants": participants_data,
-        "total_entries": total_entries
+        "total_entries": total_entries,
+        "next_cursor": next_cursor
     }
 
 @api_router.get("/entries")
-async def get_entries(db: Session = Depends(get_db)):
-    current_epoch = get_or_create_current_epoch(db)
+async def get_entries(
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_db)
+):
+    current_epoch = await epochs.resolver.current(db)
+    if not current_epoch:
+        return {"epoch_id": None, "entries": [], "next_cursor": None}
     
-    entries = db.query(models.RaffleEntry)\
-        .filter(models.RaffleEntry.epoch_id == current_epoch.id)\
-        .all()
+    if format == "ndjson":
+        return pagination.ndjson_response(current_epoch.id, pagination.ENTRY_FIELDS, cursor)
     
-    entries_data = []
-    for entry in entries:
-        entries_data.append({
-            "wallet_address": entry.wallet_address,
-            "tickets": entry.tickets,
-            "transaction_hash": entry.transaction_hash,
-            "created_at": entry.created_at.isoformat()
-        })
+    entries_data, next_cursor = await pagination.get_page(
+        db, current_epoch.id, pagination.ENTRY_FIELDS, cursor, limit
+    )
     
     return {
-        "entries": entries_data
+        "epoch_id": current_epoch.id,
+        "entries": entries_data,
+        "next_cursor": next_cursor
     }
 
+@api_router.get("/events")
+async def get_events():
+    """Live raffle updates as Server-Sent Events.
+
+    Emits `entries` (new entries), `prize` (updated epoch totals) and
+    `winner` once drawn; `resync` means updates may have been missed and the
+    client should refetch. Nothing here touches the database.
+    """
+    return StreamingResponse(
+        events.broadcaster.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_router.get("/latest-winner")
-async def get_latest_winner(db: Session = Depends(get_db)):
+async def get_latest_winner(db: AsyncSession = Depends(get_db)):
     """Get the most recent raffle winner"""
-    latest_completed = db.query(models.RaffleEpoch)\
-        .filter(models.RaffleEpoch.is_completed == True)\
-        .order_by(models.RaffleEpoch.end_time.desc())\
-        .first()
+    result = await db.execute(epochs.latest_completed_query())
+    latest_completed = result.scalars().first()
     
     if latest_completed and latest_completed.winner_address:
         return {
@@ -134,47 +145,137 @@ async def get_latest_winner(db: Session = Depends(get_db)):
         }
     return {"winner_address": None, "end_time": None}
 
-# Include the routers
-app.include_router(api_router)
-app.include_router(webhook_handler.router)
+@api_router.get("/history")
+async def get_history(
+    limit: int = Query(20, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Closed epochs, newest first, with their winner and prize pool"""
+    epochs_data, next_cursor = await history.get_history_page(db, cursor, limit)
+    return {"epochs": epochs_data, "next_cursor": next_cursor}
 
-@app.get("/")
+@api_router.get("/leaderboard")
+async def get_leaderboard(
+    limit: int = Query(10, ge=1, le=history.MAX_LEADERBOARD_SIZE),
+    db: AsyncSession = Depends(get_db)
+):
+    """Wallets with the most tickets over all closed epochs"""
+    return {"wallets": await history.get_top_wallets(db, limit)}
+
+@api_router.get("/wallets/{wallet_address}")
+async def get_wallet(wallet_address: str, db: AsyncSession = Depends(get_db)):
+    """A wallet's lifetime totals over closed epochs, plus the current epoch so far"""
+    lifetime = await history.get_wallet_lifetime(db, wallet_address)
+    current_epoch = await epochs.resolver.current(db)
+    current = None
+    if current_epoch:
+        current = {"epoch_id": current_epoch.id,
+                   **stats.stats_fields(await stats.get_wallet_stats(db, current_epoch.id, wallet_address))}
+    return {**lifetime, "current_epoch": current}
+
+# Closed epochs never change, so their archive is served from the epoch's snapshot
+ARCHIVE_HEADERS = {"Cache-Control": "public, max-age=31536000, immutable"}
+
+async def closed_epoch_snapshot(epoch_id: int, db: AsyncSession):
+    epoch_snapshot = await snapshot.store.ensure(db, epoch_id)
+    if epoch_snapshot is None:
+        if not snapshot.SNAPSHOT_ENABLED:
+            raise HTTPException(status_code=503, detail="Epoch snapshots are disabled")
+        raise HTTPException(status_code=404, detail="No closed epoch with that id")
+    return epoch_snapshot
+
+@api_router.get("/epochs/{epoch_id}/stats")
+async def get_epoch_archive_stats(
+    epoch_id: int,
+    top: int = Query(10, ge=0, le=100),
+    db: AsyncSession = Depends(get_db)
+):
+    """Totals and top wallets of a closed epoch"""
+    epoch_snapshot = await closed_epoch_snapshot(epoch_id, db)
+    body = {**epoch_snapshot.stats(), "top_wallets": epoch_snapshot.top_wallets(top)}
+    return JSONResponse(body, headers=ARCHIVE_HEADERS)
+
+@api_router.get("/epochs/{epoch_id}/entries")
+async def get_epoch_archive_entries(
+    epoch_id: int,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """A closed epoch's entries in draw order; the cursor is a position in that order"""
+    epoch_snapshot = await closed_epoch_snapshot(epoch_id, db)
+    stop = min(cursor + limit, len(epoch_snapshot))
+    body = {
+        "entries": [epoch_snapshot.entry(index) for index in range(cursor, stop)],
+        "next_cursor": stop if stop < len(epoch_snapshot) else None
+    }
+    return JSONResponse(body, headers=ARCHIVE_HEADERS)
+
+router = APIRouter()
+
+@router.get("/")
 async def root():
     return {"message": "Welcome to Epok Raffle API"}
 
-@app.options("/{rest_of_path:path}")
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics (this worker's, unless PROMETHEUS_MULTIPROC_DIR is set)"""
+    body, content_type = instrumentation.render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@router.options("/{rest_of_path:path}")
 async def preflight_handler(rest_of_path: str):
     return {"detail": "OK"}
 
-def get_or_create_current_epoch(db: Session):
-    """Get current epoch or create new one if previous ended"""
-    try:
-        current_time = datetime.utcnow()
-        
-        # Check for active epoch
-        current_epoch = db.query(models.RaffleEpoch)\
-            .filter(models.RaffleEpoch.end_time > current_time)\
-            .filter(models.RaffleEpoch.is_completed == False)\
-            .first()
-        
-        if not current_epoch:
-            # Create new epoch
-            start_time = current_time
-            end_time = start_time + timedelta(days=5)
-            
-            current_epoch = models.RaffleEpoch(
-                start_time=start_time,
-                end_time=end_time,
-                is_completed=False
-            )
-            db.add(current_epoch)
-            db.commit()
-            db.refresh(current_epoch)
-        
-        return current_epoch
-    except Exception as e:
-        db.rollback()
-        print(f"Error in get_or_create_current_epoch: {str(e)}")
-        raise
-
-blockfrost = blockfrost_service.BlockfrostService()
+def configure_logging(level: str):
+    logging.basicConfig(
+        level=level.upper(),
+        format="%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s"
+    )
+    # httpx logs every Blockfrost call at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+def create_app() -> FastAPI:
+    """Build the API app.
+
+    Touches neither the database nor the network, so workers (or a
+    `gunicorn --preload` master) are ready as soon as the code is imported.
+    The schema is managed by Alembic alone (`alembic upgrade head`), and
+    clients and background tasks start in the lifespan.
+
+    Settings come from the environment only: every module, this one
+    included, reads `config.settings` once when it is first imported, so
+    set the environment before importing `app` to run with other values.
+    """
+    configure_logging(settings.log_level)
+    app = FastAPI(title="Epok Raffle API", lifespan=lifespan)
+
+    # Serve unchanged read responses from memory, with ETag revalidation
+    app.add_middleware(ResponseCacheMiddleware)
+
+    # Per-client token buckets shared by all workers, and early rejection of oversized
+    # bodies and wrong webhook secrets (inside CORS, so refusals still carry its headers)
+    limiter = rate_limit.RateLimiter.from_settings(settings) if settings.rate_limit_enabled else None
+    app.add_middleware(RateLimitMiddleware, router=app.router, limiter=limiter,
+                       max_body_bytes=settings.max_body_bytes, proxy_hops=settings.rate_limit_proxy_hops)
+
+    # Configure CORS - Allow the Vercel frontend to access our API
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["https://epok-eight.vercel.app"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Per-route timings, SQL and upstream counts for /metrics (outermost, so cache hits count too)
+    instrumentation.instrument_engine(async_engine)
+    app.add_middleware(InstrumentationMiddleware, router=app.router, sampler=instrumentation.sampler)
+
+    app.include_router(api_router)
+    app.include_router(webhook_handler.router)
+    app.include_router(router)
+    return app
+
+app = create_app()
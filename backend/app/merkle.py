@@ -0,0 +1,85 @@
+"""RFC 6962 (Certificate Transparency) Merkle tree hashing over ticket ranges.
+
+Each raffle entry is one leaf covering the ticket range
+[start, start + tickets). Trees are built incrementally, holding only one
+hash per level (O(log n) memory), so an epoch of any size can be hashed
+while its entries stream past.
+"""
+import hashlib
+
+EMPTY_ROOT = hashlib.sha256(b"").digest()
+
+
+def leaf_hash(transaction_hash: str, start: int, tickets: int) -> bytes:
+    return hashlib.sha256(
+        b"\x00" + transaction_hash.encode() + start.to_bytes(8, "big") + tickets.to_bytes(8, "big")
+    ).digest()
+
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+class MerkleBuilder:
+    """Streaming tree hash: add leaves in order, then read `root()`.
+
+    The stack holds the perfect subtrees covering the leaves added so far as
+    (first leaf, leaf count, hash), largest first; these are exactly the
+    left-hand siblings on the audit path of the next leaf.
+    """
+
+    def __init__(self, first_leaf: int = 0):
+        self.size = 0
+        self.first_leaf = first_leaf
+        self.stack = []
+
+    def add(self, leaf: bytes):
+        start, size, digest = self.first_leaf + self.size, 1, leaf
+        while self.stack and self.stack[-1][1] == size:
+            left_start, left_size, left = self.stack.pop()
+            start, size, digest = left_start, left_size + size, node_hash(left, digest)
+        self.stack.append((start, size, digest))
+        self.size += 1
+
+    def root(self) -> bytes:
+        if not self.stack:
+            return EMPTY_ROOT
+        digest = self.stack[-1][2]
+        for _, _, left in reversed(self.stack[:-1]):
+            digest = node_hash(left, digest)
+        return digest
+
+
+def _split(size: int) -> int:
+    """Largest power of two strictly below `size`"""
+    return 1 << (size - 1).bit_length() - 1
+
+
+def path_ranges(index: int, size: int, start: int = 0):
+    """Leaf ranges [first, end) whose subtree hashes form the audit path of `index`, leaf upwards"""
+    if size <= 1:
+        return []
+    k = _split(size)
+    if index - start < k:
+        return path_ranges(index, k, start) + [(start + k, start + size)]
+    return path_ranges(index, size - k, start + k) + [(start, start + k)]
+
+
+def verify_inclusion(index: int, size: int, leaf: bytes, path, root: bytes) -> bool:
+    """Check an audit path (RFC 9162 section 2.1.3.2)"""
+    if index >= size:
+        return False
+    fn, sn, digest = index, size - 1, leaf
+    for sibling in path:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            digest = node_hash(sibling, digest)
+            while not fn & 1 and fn != 0:
+                fn >>= 1
+                sn >>= 1
+        else:
+            digest = node_hash(digest, sibling)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and digest == root
@@ -1,25 +1,59 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, DateTime, Boolean, ForeignKey, Text, LargeBinary, Index, text
+)
+from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.sql import func
 from datetime import datetime
-import random
 
 Base = declarative_base()
 
+class Wallet(Base):
+    """A sender address, stored once and referred to by id (see wallets.py)"""
+    __tablename__ = "wallets"
+
+    id = Column(Integer, primary_key=True)
+    address = Column(String, nullable=False, unique=True)
+
 class RaffleEntry(Base):
     __tablename__ = "raffle_entries"
     
     id = Column(Integer, primary_key=True, index=True)
-    wallet_address = Column(String, index=True)
-    transaction_hash = Column(String, unique=True, index=True)
-    ada_amount = Column(Float)
-    epok_amount = Column(Float)
+    wallet_id = Column(Integer, ForeignKey('wallets.id'), nullable=False)
+    # Raw 32-byte hash; hex only at the edges (API, webhooks, Merkle leaves)
+    tx_hash = Column(LargeBinary(32), nullable=False, unique=True, index=True)
+    # Exact on-chain quantities: lovelace and EPOK base units
+    lovelace = Column(BigInteger, nullable=False, default=0)
+    epok_units = Column(BigInteger, nullable=False, default=0)
     tickets = Column(Integer, default=1)
     created_at = Column(DateTime, default=func.now())
     epoch_id = Column(Integer, ForeignKey('raffle_epochs.id'))
+    wallet = relationship("Wallet")
     epoch = relationship("RaffleEpoch", back_populates="entries")
 
+    __table_args__ = (
+        # Keyset pages, NDJSON streams and the draw walk one epoch in id order;
+        # on Postgres the INCLUDE columns make those index-only scans
+        Index(
+            "ix_raffle_entries_epoch_id_id", "epoch_id", "id",
+            postgresql_include=["wallet_id", "tickets", "lovelace", "tx_hash", "created_at"]
+        ),
+        # Verifiable draws stream an epoch's entries in transaction hash order
+        Index("ix_raffle_entries_epoch_id_tx_hash", "epoch_id", "tx_hash", postgresql_include=["tickets", "wallet_id"]),
+        # Per-wallet totals within an epoch (aggregate rebuilds, wallet lookups)
+        Index(
+            "ix_raffle_entries_epoch_id_wallet", "epoch_id", "wallet_id",
+            postgresql_include=["tickets", "lovelace", "epok_units"]
+        ),
+    )
+
+    @property
+    def transaction_hash(self):
+        return self.tx_hash.hex()
+
+    @property
+    def ada_amount(self):
+        return self.lovelace / 1_000_000
+
 class RaffleEpoch(Base):
     __tablename__ = "raffle_epochs"
     
@@ -28,7 +62,28 @@ class RaffleEpoch(Base):
     end_time = Column(DateTime, nullable=False)
     is_completed = Column(Boolean, default=False)
     winner_address = Column(String, nullable=True)
+    # Draw record, enough to replay and verify the draw later (see draw.replay_draw)
+    draw_seed = Column(String, nullable=True)
+    draw_block_hash = Column(String, nullable=True)
+    draw_block_height = Column(Integer, nullable=True)
+    ticket_merkle_root = Column(String, nullable=True)
+    total_tickets = Column(Integer, nullable=True)
+    entry_count = Column(Integer, nullable=True)
+    winner_transaction_hash = Column(String, nullable=True)
+    drawn_at = Column(DateTime, nullable=True)
     entries = relationship("RaffleEntry", back_populates="epoch")
+    stats = relationship("EpochStats", uselist=False, back_populates="epoch")
+
+    __table_args__ = (
+        # Latest completed epoch (/api/latest-winner)
+        Index("ix_raffle_epochs_completed_end_time", "is_completed", "end_time"),
+        # The few open epochs, searched by end time to find the current one
+        Index(
+            "ix_raffle_epochs_active_end_time", "end_time",
+            postgresql_where=text("is_completed = false"),
+            sqlite_where=text("is_completed = 0")
+        ),
+    )
     
     def calculate_progress(self):
         """Calculate the progress percentage of the current epoch"""
@@ -41,18 +96,92 @@ class RaffleEpoch(Base):
         total_duration = (self.end_time - self.start_time).total_seconds()
         elapsed_duration = (now - self.start_time).total_seconds()
         return min(100, max(0, (elapsed_duration / total_duration) * 100))
-    
-    def select_winner(self):
-        """Randomly select a winner based on number of tickets"""
-        if not self.entries:
-            return None
-            
-        # Create a list of wallet addresses, repeated by their ticket count
-        tickets = []
-        for entry in self.entries:
-            tickets.extend([entry.wallet_address] * entry.tickets)
-            
-        if tickets:
-            self.winner_address = random.choice(tickets)
-            return self.winner_address
-        return None
+
+class EpochStats(Base):
+    """Running totals for an epoch, updated alongside every entry insert"""
+    __tablename__ = "epoch_stats"
+
+    epoch_id = Column(Integer, ForeignKey('raffle_epochs.id'), primary_key=True)
+    total_lovelace = Column(BigInteger, nullable=False, default=0)
+    total_epok_units = Column(BigInteger, nullable=False, default=0)
+    total_tickets = Column(Integer, nullable=False, default=0)
+    entry_count = Column(Integer, nullable=False, default=0)
+    epoch = relationship("RaffleEpoch", back_populates="stats")
+
+class WalletEpochStats(Base):
+    """Running totals for one wallet within an epoch"""
+    __tablename__ = "wallet_epoch_stats"
+
+    epoch_id = Column(Integer, ForeignKey('raffle_epochs.id'), primary_key=True)
+    wallet_address = Column(String, primary_key=True)
+    total_lovelace = Column(BigInteger, nullable=False, default=0)
+    total_epok_units = Column(BigInteger, nullable=False, default=0)
+    total_tickets = Column(Integer, nullable=False, default=0)
+    entry_count = Column(Integer, nullable=False, default=0)
+
+class EpochHistory(Base):
+    """Closed epoch rollup for the history endpoint, written once at close (see history.py)"""
+    __tablename__ = "epoch_history"
+
+    epoch_id = Column(Integer, ForeignKey('raffle_epochs.id'), primary_key=True)
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False)
+    winner_address = Column(String, nullable=True)
+    winner_transaction_hash = Column(String, nullable=True)
+    total_lovelace = Column(BigInteger, nullable=False, default=0)
+    total_epok_units = Column(BigInteger, nullable=False, default=0)
+    total_tickets = Column(Integer, nullable=False, default=0)
+    entry_count = Column(Integer, nullable=False, default=0)
+    wallet_count = Column(Integer, nullable=False, default=0)
+
+class WalletLifetimeStats(Base):
+    """One wallet's totals over every closed epoch, added to as each epoch closes"""
+    __tablename__ = "wallet_lifetime_stats"
+
+    wallet_address = Column(String, primary_key=True)
+    total_lovelace = Column(BigInteger, nullable=False, default=0)
+    total_epok_units = Column(BigInteger, nullable=False, default=0)
+    total_tickets = Column(Integer, nullable=False, default=0)
+    entry_count = Column(Integer, nullable=False, default=0)
+    epochs_entered = Column(Integer, nullable=False, default=0)
+    wins = Column(Integer, nullable=False, default=0)
+    last_epoch_id = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        # Top wallets by tickets, read off the end of the index
+        Index("ix_wallet_lifetime_stats_tickets", "total_tickets", "wallet_address"),
+    )
+
+class TransactionCache(Base):
+    """Persistent tier of the Blockfrost tx/UTxO cache; confirmed txs never change"""
+    __tablename__ = "blockfrost_tx_cache"
+
+    tx_hash = Column(String, primary_key=True)
+    tx_json = Column(Text, nullable=False)
+    utxos_json = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+
+class IndexerCheckpoint(Base):
+    """Last chain position a backfill indexer has fully processed"""
+    __tablename__ = "indexer_checkpoints"
+
+    name = Column(String, primary_key=True)
+    block_height = Column(Integer, nullable=False, default=0)
+    tx_index = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+class IngestDeadLetter(Base):
+    """A webhook entry acknowledged to Blockfrost whose insert kept failing.
+
+    Blockfrost won't redeliver it, so it is kept here until
+    ingest.replay_dead_letters inserts it (see IngestQueue).
+    """
+    __tablename__ = "ingest_dead_letters"
+
+    transaction_hash = Column(String, primary_key=True)
+    # The row as submitted to the ingest queue
+    row_json = Column(Text, nullable=False)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
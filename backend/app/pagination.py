@@ -0,0 +1,82 @@
+import json
+from datetime import datetime
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .database import AsyncSessionLocal
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Rows fetched per round-trip from the server-side cursor in NDJSON mode
+STREAM_BATCH_SIZE = 1000
+
+PARTICIPANT_FIELDS = ("wallet_address", "tickets", "ada_amount", "epok_amount", "transaction_hash", "created_at")
+ENTRY_FIELDS = ("wallet_address", "tickets", "transaction_hash", "created_at")
+
+# API field -> stored column, and how to turn the stored value back into the API's form
+FIELD_COLUMNS = {
+    "wallet_address": models.Wallet.address,
+    "tickets": models.RaffleEntry.tickets,
+    "ada_amount": models.RaffleEntry.lovelace,
+    "epok_amount": models.RaffleEntry.epok_units,
+    "transaction_hash": models.RaffleEntry.tx_hash,
+    "created_at": models.RaffleEntry.created_at,
+}
+FIELD_CONVERTERS = {
+    "ada_amount": lambda lovelace: lovelace / 1_000_000,
+    "transaction_hash": bytes.hex,
+    "created_at": datetime.isoformat,
+}
+
+
+def serialize_row(row, fields):
+    data = dict(zip(fields, row[1:]))
+    for field, convert in FIELD_CONVERTERS.items():
+        if data.get(field) is not None:
+            data[field] = convert(data[field])
+    return data
+
+
+def entries_query(epoch_id: int, fields, cursor: int = None):
+    """Entries of an epoch in id order, starting after the `cursor` id.
+
+    Ids are assigned in insert order, so keying on id alone also walks the
+    entries in created_at order.
+    """
+    columns = [FIELD_COLUMNS[field] for field in fields]
+    query = select(models.RaffleEntry.id, *columns)\
+        .where(models.RaffleEntry.epoch_id == epoch_id)\
+        .order_by(models.RaffleEntry.id)
+    if "wallet_address" in fields:
+        query = query.join(models.Wallet, models.Wallet.id == models.RaffleEntry.wallet_id)
+    if cursor is not None:
+        query = query.where(models.RaffleEntry.id > cursor)
+    return query
+
+
+async def get_page(db: AsyncSession, epoch_id: int, fields, cursor: int = None, limit: int = DEFAULT_PAGE_SIZE):
+    """Return (rows, next_cursor); next_cursor is None on the last page"""
+    result = await db.execute(entries_query(epoch_id, fields, cursor).limit(limit + 1))
+    rows = result.all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return [serialize_row(row, fields) for row in rows[:limit]], next_cursor
+
+
+async def stream_ndjson(epoch_id: int, fields, cursor: int = None):
+    """Yield one JSON line per entry from a server-side cursor.
+
+    Opens its own session because the response body is produced after the
+    request's dependencies have been torn down.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(
+            entries_query(epoch_id, fields, cursor).execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        async for row in result:
+            yield json.dumps(serialize_row(row, fields)) + "\n"
+
+
+def ndjson_response(epoch_id: int, fields, cursor: int = None):
+    return StreamingResponse(stream_ndjson(epoch_id, fields, cursor), media_type="application/x-ndjson")
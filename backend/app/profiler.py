@@ -0,0 +1,128 @@
+"""Sampling profiler for individual requests.
+
+A background thread wakes every `interval` seconds while any profiled
+request is in flight and records where each one is: the event loop
+thread's Python stack while the request's task is running, or the chain
+of coroutines it is suspended in (ending in `[await ...]`) while it waits on
+the database or an upstream. Samples are written as folded stacks
+("frame;frame;frame count" per line), which flamegraph.pl, speedscope and
+inferno read directly, so a flame graph shows both CPU and waiting time.
+"""
+import asyncio
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+def _label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _await_stack(awaitable):
+    """Frames of a suspended coroutine chain, outermost first"""
+    stack = []
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            stack.append(f"[await {type(awaitable).__name__}]")
+            break
+        stack.append(_label(frame))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return stack
+
+
+def _thread_stack(frame, root=None):
+    """Frames from the bottom of the thread (or `root`) down to `frame`, outermost first.
+
+    Returns (stack, whether `root` was on it).
+    """
+    stack = []
+    while frame is not None:
+        stack.append(_label(frame))
+        if frame is root:
+            return stack[::-1], True
+        frame = frame.f_back
+    return stack[::-1], False
+
+
+class RequestProfile:
+    """Stack samples for one request's task"""
+
+    def __init__(self, task: asyncio.Task, thread_id: int):
+        self.task = task
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.started = time.perf_counter()
+
+    def sample(self, frames):
+        coro = self.task.get_coro()
+        if getattr(coro, "cr_running", False):
+            stack, rooted = _thread_stack(frames.get(self.thread_id), coro.cr_frame)
+            if not rooted:
+                # Running in a SQLAlchemy greenlet, whose stack doesn't lead back to the task
+                stack = ["[greenlet]"] + stack
+        else:
+            stack = _await_stack(coro)
+        if stack:
+            self.stacks[";".join(stack)] += 1
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def dump(self, directory: str, name: str):
+        """Write the folded stacks to `directory`; returns the file path"""
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_")
+        path = os.path.join(directory, f"{int(time.time() * 1000)}-{slug}.folded")
+        with open(path, "w") as f:
+            f.write(self.folded())
+        return path
+
+
+class Sampler(threading.Thread):
+    """One per process; samples every active RequestProfile every `interval` seconds"""
+
+    def __init__(self, interval: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.interval = interval
+        self.active = set()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+
+    def profile(self, task: asyncio.Task):
+        """Start sampling `task`, which must be running on the calling thread"""
+        profile = RequestProfile(task, threading.get_ident())
+        with self.lock:
+            self.active.add(profile)
+            if not self.is_alive():
+                self.start()
+        self.wake.set()
+        return profile
+
+    def finish(self, profile: RequestProfile):
+        with self.lock:
+            self.active.discard(profile)
+
+    def run(self):
+        while True:
+            self.wake.wait()
+            with self.lock:
+                profiles = list(self.active)
+                if not profiles:
+                    self.wake.clear()
+                    continue
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            for profile in profiles:
+                try:
+                    profile.sample(frames)
+                except Exception as e:
+                    # Frames change under us; a lost sample is fine
+                    logger.debug(f"Profiler sample failed: {e!r}")
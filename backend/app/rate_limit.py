@@ -0,0 +1,195 @@
+"""Per-client rate limiting and cheap rejection of abusive requests.
+
+Every request takes a token from the bucket of its client IP and route
+template (so /api/wallets/{address} is one route whatever the address);
+buckets refill at RATE_LIMIT_RATE tokens/s up to RATE_LIMIT_BURST, and an
+empty bucket is answered 429 without reaching the app or the database.
+
+The buckets live in RATE_LIMIT_FILE, memory-mapped by every gunicorn
+worker on the host, so a client gets the same budget whichever worker it
+lands on, with no external service. The file is a hash table of
+RATE_LIMIT_SLOTS fixed-size slots, 4-way set associative: a key lives in
+one of the 4 slots of its set, and a new key replaces the least recently
+used of them. Each update holds an fcntl lock on its set's bytes only.
+
+Bodies larger than MAX_BODY_BYTES are refused from the Content-Length
+header before anything reads them. Webhook deliveries carrying the right
+secret are not limited (the ingest queue absorbs Blockfrost's bursts);
+wrong secrets are answered 401 here and count against the sender's bucket.
+Behind proxies, RATE_LIMIT_PROXY_HOPS says how many of them append to
+X-Forwarded-For, and the client IP is taken from the entry the outermost
+one added. Entries before it come from the client, which can write
+anything there (uvicorn's --forwarded-allow-ips='*' trusts the first
+entry, so it can't be used for this).
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+from fastapi import HTTPException
+from .config import Settings
+from .instrumentation import route_path
+from .webhook_handler import valid_secret
+
+logger = logging.getLogger(__name__)
+
+# Key fingerprint (0 for an empty slot), tokens left, last update (unix time)
+SLOT = struct.Struct("<Qdd")
+WAYS = 4
+
+WEBHOOK_PATHS = ("/webhook", "/transaction-webhook")
+# Scraped by Prometheus, which would otherwise share a bucket with nothing else
+UNLIMITED_PATHS = ("/metrics",)
+BODY_METHODS = ("POST", "PUT", "PATCH")
+
+
+class RateLimiter:
+    """Token buckets in a memory-mapped file shared between processes"""
+
+    def __init__(self, path: str, rate: float, burst: int, slots: int = 65536):
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self.sets = max(1, slots // WAYS)
+        self._fd = None
+        self._map = None
+
+    @classmethod
+    def from_settings(cls, settings: Settings):
+        return cls(settings.rate_limit_file, settings.rate_limit_rate, settings.rate_limit_burst,
+                   settings.rate_limit_slots)
+
+    def _open(self):
+        # Opened on first use, so each forked worker maps the file itself
+        size = self.sets * WAYS * SLOT.size
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        except OSError as e:
+            # Still limit, per worker, rather than not at all
+            logger.warning("Rate limit file %s unusable (%s); limits are per worker", self.path, e)
+            fd = None
+            self._map = mmap.mmap(-1, size)
+        self._fd = fd
+
+    def take(self, key: bytes) -> float:
+        """Take a token from `key`'s bucket: 0 if there was one, else seconds until there will be"""
+        if self._map is None:
+            self._open()
+        fingerprint = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+        start = fingerprint % self.sets * WAYS * SLOT.size
+        length = WAYS * SLOT.size
+        now = time.time()
+        if self._fd is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, start)
+        try:
+            victim, oldest = start, math.inf
+            for offset in range(start, start + length, SLOT.size):
+                slot_key, tokens, updated = SLOT.unpack_from(self._map, offset)
+                if slot_key == fingerprint:
+                    tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+                    break
+                if updated < oldest:
+                    victim, oldest = offset, updated
+            else:
+                offset, tokens = victim, float(self.burst)
+            allowed = tokens >= 1
+            SLOT.pack_into(self._map, offset, fingerprint, tokens - allowed, now)
+        finally:
+            if self._fd is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)
+        return 0.0 if allowed else (1 - tokens) / self.rate
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+async def respond(send, status: int, detail: str, headers=()):
+    body = json.dumps({"detail": detail}).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode()), *headers]})
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    """Refuse oversized bodies, wrong webhook secrets and clients over their rate.
+
+    Each check runs on the request line and headers alone, before any body
+    is read or parsed. Without a limiter only the body size and the webhook
+    secret are checked.
+    """
+
+    def __init__(self, app, router=None, limiter: RateLimiter = None, max_body_bytes: int = 1024 * 1024,
+                 proxy_hops: int = 0):
+        self.app = app
+        self.router = router
+        self.limiter = limiter
+        self.max_body_bytes = max_body_bytes
+        self.proxy_hops = proxy_hops
+
+    def _bounded(self, receive):
+        """`receive` for a body of unknown length, failing once it passes max_body_bytes"""
+        received = 0
+
+        async def bounded_receive():
+            nonlocal received
+            message = await receive()
+            received += len(message.get("body", b""))
+            if received > self.max_body_bytes:
+                raise HTTPException(status_code=413, detail="Request body too large")
+            return message
+        return bounded_receive
+
+    def _client(self, scope, headers):
+        """The client's IP: as recorded by the outermost of our proxies, else the peer's"""
+        forwarded = headers.get(b"x-forwarded-for") if self.proxy_hops else None
+        if forwarded:
+            hops = forwarded.decode("latin1").split(",")
+            return hops[-min(self.proxy_hops, len(hops))].strip()
+        client = scope.get("client")
+        return client[0] if client else "-"
+
+    def _limited(self, scope, headers):
+        """Seconds the client must wait before this request would be accepted, or 0"""
+        if self.limiter is None:
+            return 0.0
+        key = f"{self._client(scope, headers)} {scope['method']} {route_path(scope, self.router)}"
+        return self.limiter.take(key.encode())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in UNLIMITED_PATHS:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        if scope["method"] in BODY_METHODS:
+            length = headers.get(b"content-length")
+            if length is None:
+                receive = self._bounded(receive)
+            elif not length.isdigit() or int(length) > self.max_body_bytes:
+                return await respond(send, 413, "Request body too large")
+
+        if scope["path"] in WEBHOOK_PATHS:
+            if valid_secret(headers.get(b"webhook-secret")):
+                return await self.app(scope, receive, send)
+            wait = self._limited(scope, headers)
+            if not wait:
+                return await respond(send, 401, "Invalid webhook secret")
+        else:
+            wait = self._limited(scope, headers)
+        if wait:
+            return await respond(send, 429, "Too many requests",
+                                 [(b"retry-after", str(math.ceil(wait)).encode())])
+        await self.app(scope, receive, send)
@@ -0,0 +1,200 @@
+import hashlib
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from . import epochs
+from .config import settings
+from .events import broadcaster
+
+RESPONSE_CACHE_SIZE = settings.response_cache_size
+RESPONSE_CACHE_MAX_BYTES = settings.response_cache_max_bytes
+
+# Read endpoints whose output depends only on the current epoch's entries
+EPOCH_PATHS = ("/api/current-prize", "/api/participants", "/api/entries")
+# Read endpoints that only change when a winner is drawn
+GLOBAL_PATHS = ("/api/latest-winner", "/api/leaderboard")
+
+KEPT_HEADERS = (b"content-type",)
+
+
+class CachedResponse:
+    __slots__ = ("body", "headers", "etag", "last_modified")
+
+    def __init__(self, body: bytes, headers, last_modified: float):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.last_modified = int(last_modified)
+        self.headers = [
+            *headers,
+            (b"etag", self.etag.encode()),
+            (b"last-modified", formatdate(self.last_modified, usegmt=True).encode()),
+            (b"cache-control", b"no-cache"),
+        ]
+
+
+class ResponseCache:
+    """Serialized read responses, versioned by what they depend on.
+
+    Each epoch has a version counter that committed ingestion bumps (via the
+    broadcaster's `entries`/`prize` events, which reach every worker); a
+    global generation is bumped by draws and resyncs. The versions are part
+    of the cache key, so a bump simply makes older entries unreachable and
+    they age out of the bounded LRU. ETags hash the body, so they agree
+    across workers.
+    """
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.versions = {}
+        self.generation = 0
+        self.modified = {}
+        self.generation_modified = time.time()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
+
+    def on_event(self, event: str, data):
+        if event == "entries":
+            for epoch_id in {entry["epoch_id"] for entry in data}:
+                self.bump(epoch_id)
+        elif event == "prize":
+            self.bump(data["epoch_id"])
+        elif event in ("winner", "resync"):
+            self.bump()
+
+    def bump(self, epoch_id: int = None):
+        """Invalidate one epoch's responses, or everything when no epoch is given"""
+        if epoch_id is None:
+            self.generation += 1
+            self.generation_modified = time.time()
+        else:
+            self.versions[epoch_id] = self.versions.get(epoch_id, 0) + 1
+            self.modified[epoch_id] = time.time()
+
+    def key(self, path: str, query: bytes):
+        """Cache key for a request, or None if it can't be served from cache"""
+        if path in GLOBAL_PATHS:
+            return (path, query, None, 0, self.generation)
+        current = epochs.resolver.cached()
+        if current is None:
+            # Let the handler resolve (and cache) the epoch first
+            return None
+        return (path, query, current.id, self.versions.get(current.id, 0), self.generation)
+
+    def last_modified(self, key):
+        epoch_id = key[2]
+        return max(self.modified.get(epoch_id, 0), self.generation_modified)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry: CachedResponse):
+        if self.maxsize <= 0 or len(entry.body) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous.body)
+        self._entries[key] = entry
+        self._bytes += len(entry.body)
+        while len(self._entries) > self.maxsize or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted.body)
+
+
+def not_modified(headers, entry: CachedResponse):
+    """Evaluate If-None-Match (or, without it, If-Modified-Since) against `entry`"""
+    if_none_match = headers.get(b"if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.decode("latin-1").split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == entry.etag for tag in tags)
+    if_modified_since = headers.get(b"if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since.decode("latin-1")).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return entry.last_modified <= since
+    return False
+
+
+class ResponseCacheMiddleware:
+    """Serve cacheable GETs from `cache` and answer revalidations with 304.
+
+    A hit never reaches the endpoint, so neither it nor a 304 touches the
+    database. NDJSON streams are passed through untouched.
+    """
+
+    def __init__(self, app, cache: ResponseCache = None):
+        self.app = app
+        self.cache = cache or response_cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or \
+                scope["path"] not in EPOCH_PATHS + GLOBAL_PATHS or b"format=ndjson" in scope["query_string"]:
+            return await self.app(scope, receive, send)
+
+        key = self.cache.key(scope["path"], scope["query_string"])
+        if key is None:
+            return await self.app(scope, receive, send)
+
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.cache.hits += 1
+        else:
+            self.cache.misses += 1
+            entry = await self._render(scope, receive, send, key)
+            if entry is None:
+                return
+
+        headers = dict(scope["headers"])
+        if not_modified(headers, entry):
+            self.cache.not_modified += 1
+            await send({"type": "http.response.start", "status": 304,
+                        "headers": [h for h in entry.headers if h[0] != b"content-type"]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [*entry.headers, (b"content-length", str(len(entry.body)).encode())]})
+        await send({"type": "http.response.body", "body": entry.body})
+
+    async def _render(self, scope, receive, send, key):
+        """Run the endpoint, caching a 200; other responses are forwarded as-is"""
+        start = None
+        chunks = []
+
+        async def capture(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+
+        if start["status"] != 200:
+            await send(start)
+            await send({"type": "http.response.body", "body": b"".join(chunks)})
+            return None
+        headers = [(name, value) for name, value in start["headers"] if name.lower() in KEPT_HEADERS]
+        entry = CachedResponse(b"".join(chunks), headers, self.cache.last_modified(key))
+        self.cache.put(key, entry)
+        return entry
+
+
+response_cache = ResponseCache()
+broadcaster.add_listener(response_cache.on_event)
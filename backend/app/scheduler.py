@@ -0,0 +1,211 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, draw, epochs, history, ingest, snapshot
+from .config import settings
+from .database import AsyncSessionLocal, async_engine
+from .epoch_info import provider as epoch_info_provider
+from .events import broadcaster
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = settings.scheduler_enabled
+# Longest the leader sleeps between passes (and followers between lock attempts)
+SCHEDULER_POLL_S = settings.scheduler_poll_s
+# How long before an epoch ends its successor is created
+SCHEDULER_LEAD_S = settings.scheduler_lead_s
+
+# Postgres advisory lock held by the leader for as long as it leads ("ROLL")
+SCHEDULER_LOCK_KEY = 0x524F4C4C
+
+
+async def close_epoch(db: AsyncSession, epoch_id: int, close_empty: bool = True):
+    """Freeze, draw and complete an epoch, publishing the winner.
+
+    The epoch row is locked FOR UPDATE first. Entry inserts take a key-share
+    lock on their epoch (see ingest.insert_entries), so from here until
+    commit no entries can be added, and afterwards inserts see the epoch as
+    completed and skip it. The history rollups are updated in the same
+    transaction. Returns (epoch, DrawResult or None); the epoch is None if
+    it was missing or already completed. Raises draw.DrawNotReady (after
+    rolling back) when the draw must wait.
+
+    The frozen entries are exported to a columnar snapshot first, which the
+    draw reads instead of the database and which is published once the
+    draw has committed. Without one (disabled, or the export failed) the
+    draw streams the entries from the database as before.
+
+    The closing block is looked up before the lock is taken, with no
+    transaction open: it can take many Blockfrost calls, and entries for
+    the epoch would queue behind the lock meanwhile.
+    """
+    epoch = await db.get(models.RaffleEpoch, epoch_id)
+    if not epoch or epoch.is_completed:
+        await db.rollback()
+        return None, None
+    end_time = epoch.end_time
+    await db.rollback()
+    block = await draw.seed_block(end_time)
+
+    epoch = await db.get(models.RaffleEpoch, epoch_id, with_for_update=True, populate_existing=True)
+    if not epoch or epoch.is_completed:
+        await db.rollback()
+        return None, None
+
+    path = await _export_snapshot(db, epoch)
+    frozen = snapshot.store.open_unpublished(path) if path else None
+    try:
+        result = await draw.draw_epoch(db, epoch, block, snapshot=frozen)
+    except BaseException:
+        await db.rollback()
+        if path:
+            snapshot.store.discard(path)
+        raise
+
+    if result is None:
+        if not close_empty:
+            await db.rollback()
+            if path:
+                snapshot.store.discard(path)
+            return epoch, None
+        epoch.is_completed = True
+        epoch.drawn_at = datetime.utcnow()
+    else:
+        await broadcaster.publish(db, "winner", {
+            "epoch_id": epoch.id,
+            "winner_address": result.winner_address,
+            "total_entries": result.total_tickets,
+            "end_time": epoch.end_time.isoformat()
+        })
+    await history.record_closed_epoch(db, epoch)
+    await db.commit()
+    epochs.resolver.invalidate()
+    if path:
+        try:
+            await snapshot.store.publish(path, epoch)
+        except (snapshot.SnapshotError, OSError) as e:
+            # Rebuilt from the database on first read
+            logger.error(f"Snapshot of epoch {epoch.id} not published: {e}")
+            snapshot.store.discard(path)
+    return epoch, result
+
+
+async def _export_snapshot(db: AsyncSession, epoch: models.RaffleEpoch):
+    """Path of a fresh unpublished snapshot of the locked epoch, or None"""
+    if not snapshot.SNAPSHOT_ENABLED:
+        return None
+    try:
+        return await snapshot.store.export(db, epoch)
+    except (snapshot.SnapshotError, OSError) as e:
+        logger.error(f"Snapshot export of epoch {epoch.id} failed, drawing from the database: {e}")
+        return None
+
+
+class EpochScheduler:
+    """Single-leader epoch rollover, run in the background of every worker.
+
+    Whichever worker holds the Postgres advisory lock leads; the others
+    retry every `poll` seconds and take over if the leader's connection
+    drops. The leader closes and draws ended epochs, opens each epoch's
+    successor `lead` seconds ahead of time (starting exactly at the old
+    end), and warms the current-epoch caches, waking at the next end_time.
+    With SQLite the single process always leads.
+    """
+
+    def __init__(self, engine=async_engine, session_factory=AsyncSessionLocal,
+                 poll: float = SCHEDULER_POLL_S, lead: float = SCHEDULER_LEAD_S):
+        self.engine = engine
+        self.session_factory = session_factory
+        self.poll = poll
+        self.lead = lead
+        self._warming = None
+
+    @asynccontextmanager
+    async def leadership(self):
+        """Yield a liveness check if this process leads, else None"""
+        if self.engine.dialect.name != "postgresql":
+            async def alive():
+                return True
+            yield alive
+            return
+
+        async with self.engine.connect() as conn:
+            acquired = await conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": SCHEDULER_LOCK_KEY})
+            if not acquired:
+                await conn.rollback()
+                yield None
+                return
+
+            async def alive():
+                # The lock lives and dies with this connection
+                await conn.execute(text("SELECT 1"))
+                return True
+            try:
+                yield alive
+            finally:
+                await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEDULER_LOCK_KEY})
+
+    async def run_forever(self):
+        while True:
+            try:
+                async with self.leadership() as alive:
+                    if alive:
+                        logger.info("Epoch scheduler: leading")
+                        while await alive():
+                            await asyncio.sleep(await self.tick())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Epoch scheduler failed: {e}")
+            await asyncio.sleep(self.poll)
+
+    async def tick(self):
+        """One rollover pass; returns seconds until the next one is due"""
+        now = datetime.utcnow()
+        delay = self.poll
+        # Webhook entries whose insert failed, before the epoch they belong to is drawn
+        await ingest.replay_dead_letters(self.session_factory)
+
+        async with self.session_factory() as db:
+            # Draw every epoch that has ended, oldest first
+            while True:
+                ended = (await db.execute(epochs.undrawn_epoch_query(now))).scalars().first()
+                if ended is None:
+                    break
+                # close_epoch rolls back, which expires `ended`
+                ended_id = ended.id
+                try:
+                    epoch, result = await close_epoch(db, ended_id)
+                except draw.DrawNotReady as e:
+                    logger.info(f"Epoch {ended_id} not drawn yet: {e}")
+                    break
+                if result:
+                    logger.info(f"Epoch {epoch.id} closed, winner {result.winner_address}")
+
+            # Make sure an epoch is open now, and its successor once it's close to ending
+            current = (await db.execute(epochs.active_epoch_query(now))).scalars().first()
+            if current is None:
+                await epochs.open_epoch(db, now)
+                await db.commit()
+                current = (await db.execute(epochs.active_epoch_query(now))).scalars().first()
+            if current is not None:
+                remaining = (current.end_time - now).total_seconds()
+                if remaining <= self.lead:
+                    await epochs.open_epoch(db, current.end_time)
+                    await db.commit()
+                # Wake at the rollover, or when the successor is due
+                until_next = remaining - self.lead if remaining > self.lead else remaining
+                delay = max(1.0, min(delay, until_next))
+
+            # Warm this worker's caches for the (possibly new) current epoch
+            epochs.resolver.invalidate()
+            await epochs.resolver.current(db)
+        # Upstream retries shouldn't hold up the next rollover
+        self._warming = asyncio.ensure_future(epoch_info_provider.get())
+        return delay
+
+
+scheduler = EpochScheduler()
@@ -0,0 +1,516 @@
+"""Columnar, memory-mappable snapshots of closed epochs.
+
+A snapshot holds an epoch's ticketed entries in draw order (transaction
+hash) as fixed-width columns, so reading one needs no database and no
+per-row objects: every column is a zero-copy memoryview over the mapped
+file.
+
+Layout (native byte order, recorded in the metadata):
+
+    header   b"EPOKSNAP", format version
+    columns  entry_id (int64), first_ticket (int64), tickets (uint32),
+             wallet (uint32 index into the wallet dictionary),
+             lovelace (int64), epok (int64), created_at (int64 unix us),
+             tx_hash (raw 32-byte blobs); each 8-byte aligned
+    wallets  uint64 offsets[n + 1] into a UTF-8 blob of interned addresses
+    metadata JSON: epoch, totals, column layout and per-column checksums
+    footer   metadata offset, metadata length, b"EPOKSNAP"
+
+The metadata sits at the end so it can be rewritten in place once the
+draw that used the snapshot has committed.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .config import settings
+from .database import AsyncSessionLocal
+from .merkle import MerkleBuilder, leaf_hash
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ENABLED = settings.snapshot_enabled
+SNAPSHOT_DIR = settings.snapshot_dir
+# Snapshots each worker keeps mapped
+SNAPSHOT_OPEN_MAX = settings.snapshot_open_max
+# Rows buffered per column before they are written out
+SNAPSHOT_BATCH_SIZE = 10_000
+
+MAGIC = b"EPOKSNAP"
+VERSION = 1
+HEADER = struct.Struct("<8sHxxxxxx")
+FOOTER = struct.Struct("<QQ8s")
+HASH_SIZE = 32
+
+# (column, array typecode), in file order
+COLUMNS = (
+    ("entry_id", "q"),
+    ("first_ticket", "q"),
+    ("tickets", "I"),
+    ("wallet", "I"),
+    ("lovelace", "q"),
+    ("epok", "q"),
+    ("created_at", "q"),
+)
+
+
+class SnapshotError(Exception):
+    """The snapshot can't be written or doesn't match what it claims to hold"""
+
+
+def _align(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def _micros(moment: datetime) -> int:
+    if moment is None:
+        return 0
+    return int(moment.replace(tzinfo=timezone.utc).timestamp() * 1_000_000)
+
+
+def _isoformat(moment: datetime):
+    return moment.isoformat() if moment else None
+
+
+def epoch_metadata(epoch: models.RaffleEpoch):
+    """The epoch columns a snapshot carries, JSON-ready"""
+    return {
+        "id": epoch.id,
+        "start_time": _isoformat(epoch.start_time),
+        "end_time": _isoformat(epoch.end_time),
+        "is_completed": bool(epoch.is_completed),
+        "winner_address": epoch.winner_address,
+        "winner_transaction_hash": epoch.winner_transaction_hash,
+        "draw_seed": epoch.draw_seed,
+        "draw_block_hash": epoch.draw_block_hash,
+        "draw_block_height": epoch.draw_block_height,
+        "ticket_merkle_root": epoch.ticket_merkle_root,
+        "drawn_at": _isoformat(epoch.drawn_at),
+    }
+
+
+class SnapshotWriter:
+    """Writes `count` entries, fed in draw order, to `path`.
+
+    Column positions follow from `count`, so each column is written in
+    batches straight to its place in the file; memory is bounded by the
+    batch size plus the wallet dictionary. The Merkle root of the ticket
+    ranges is computed along the way.
+    """
+
+    def __init__(self, path: str, count: int, batch_size: int = SNAPSHOT_BATCH_SIZE):
+        self.path = path
+        self.count = count
+        self.batch_size = batch_size
+        self.layout = {}
+        offset = HEADER.size
+        for name, code in COLUMNS:
+            self.layout[name] = (offset, code)
+            offset += _align(array(code).itemsize * count)
+        self.layout["tx_hash"] = (offset, "B")
+        offset += _align(HASH_SIZE * count)
+        self.data_end = offset
+
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION))
+        self.file.truncate(self.data_end)
+        self.buffers = {name: array(code) for name, code in COLUMNS}
+        self.hashes = bytearray()
+        self.checksums = {name: hashlib.blake2b(digest_size=16) for name in self.layout}
+        self.written = 0
+        self.rows = 0
+        self.wallets = {}
+        self.tree = MerkleBuilder()
+        self.total_tickets = 0
+        self.total_lovelace = 0
+        self.total_epok = 0
+
+    def add(self, entry_id, tx_hash: bytes, wallet_address, tickets, lovelace, epok, created_at):
+        if len(tx_hash) != HASH_SIZE:
+            raise SnapshotError(f"transaction hash {tx_hash.hex()} is not 32 bytes")
+        if self.rows >= self.count:
+            raise SnapshotError("more entries than counted; entries changed while exporting")
+
+        wallet = self.wallets.setdefault(wallet_address, len(self.wallets))
+        buffers = self.buffers
+        buffers["entry_id"].append(entry_id)
+        buffers["first_ticket"].append(self.total_tickets)
+        buffers["tickets"].append(tickets)
+        buffers["wallet"].append(wallet)
+        buffers["lovelace"].append(lovelace)
+        buffers["epok"].append(epok)
+        buffers["created_at"].append(_micros(created_at))
+        self.hashes += tx_hash
+
+        self.tree.add(leaf_hash(tx_hash.hex(), self.total_tickets, tickets))
+        self.total_tickets += tickets
+        self.total_lovelace += lovelace
+        self.total_epok += epok
+        self.rows += 1
+        if self.rows - self.written >= self.batch_size:
+            self._flush()
+
+    def extend(self, rows):
+        for row in rows:
+            self.add(*row)
+
+    def _write(self, name, data: bytes, itemsize: int):
+        self.file.seek(self.layout[name][0] + self.written * itemsize)
+        self.file.write(data)
+        self.checksums[name].update(data)
+
+    def _flush(self):
+        for name, code in COLUMNS:
+            buffer = self.buffers[name]
+            self._write(name, buffer.tobytes(), buffer.itemsize)
+            del buffer[:]
+        self._write("tx_hash", bytes(self.hashes), HASH_SIZE)
+        self.hashes.clear()
+        self.written = self.rows
+
+    def finish(self, metadata: dict):
+        """Write the wallet dictionary and metadata; returns the full metadata"""
+        self._flush()
+        if self.rows != self.count:
+            raise SnapshotError("fewer entries than counted; entries changed while exporting")
+
+        offsets = array("Q", [0])
+        blob = bytearray()
+        for address in self.wallets:
+            blob += address.encode()
+            offsets.append(len(blob))
+        self.file.seek(self.data_end)
+        self.file.write(offsets.tobytes())
+        self.file.write(blob)
+        metadata = {
+            **metadata,
+            "format": VERSION,
+            "byteorder": sys.byteorder,
+            "entry_count": self.rows,
+            "total_tickets": self.total_tickets,
+            "total_lovelace": self.total_lovelace,
+            "total_epok": self.total_epok,
+            "wallet_count": len(self.wallets),
+            "merkle_root": self.tree.root().hex(),
+            "columns": {name: [offset, code] for name, (offset, code) in self.layout.items()},
+            "wallets": [self.data_end, len(self.wallets), self.data_end + len(offsets) * offsets.itemsize, len(blob)],
+            "checksums": {name: checksum.hexdigest() for name, checksum in self.checksums.items()},
+        }
+        _write_metadata(self.file, self.file.tell(), metadata)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        return metadata
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _write_metadata(file, offset: int, metadata: dict):
+    body = json.dumps(metadata, separators=(",", ":")).encode()
+    file.seek(offset)
+    file.write(body)
+    file.write(FOOTER.pack(offset, len(body), MAGIC))
+    file.truncate()
+
+
+def _read_footer(file):
+    file.seek(-FOOTER.size, os.SEEK_END)
+    offset, length, magic = FOOTER.unpack(file.read(FOOTER.size))
+    if magic != MAGIC:
+        raise SnapshotError("not an epoch snapshot (bad footer)")
+    return offset, length
+
+
+def update_metadata(path: str, **fields):
+    """Rewrite the metadata block in place with `fields` merged in"""
+    with open(path, "r+b") as f:
+        offset, length = _read_footer(f)
+        f.seek(offset)
+        metadata = {**json.loads(f.read(length)), **fields}
+        _write_metadata(f, offset, metadata)
+        f.flush()
+        os.fsync(f.fileno())
+    return metadata
+
+
+class Snapshot:
+    """A snapshot file mapped read-only, with each column as a typed memoryview"""
+
+    def __init__(self, path: str, verify: bool = True):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise SnapshotError(f"{path}: unsupported snapshot format")
+            offset, length = _read_footer(f)
+            f.seek(offset)
+            self.metadata = json.loads(f.read(length))
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.metadata["byteorder"] != sys.byteorder:
+            raise SnapshotError(f"{path}: written on a {self.metadata['byteorder']}-endian machine")
+
+        count = self.metadata["entry_count"]
+        view = memoryview(self._mmap)
+        self.columns = {}
+        for name, (start, code) in self.metadata["columns"].items():
+            size = (HASH_SIZE if name == "tx_hash" else array(code).itemsize) * count
+            self.columns[name] = view[start:start + size].cast(code)
+        offsets_start, wallet_count, blob_start, blob_length = self.metadata["wallets"]
+        self.wallet_offsets = view[offsets_start:offsets_start + (wallet_count + 1) * 8].cast("Q")
+        self.wallet_blob = view[blob_start:blob_start + blob_length]
+        self._wallet_totals = None
+        if verify:
+            self.verify()
+
+    def verify(self):
+        for name, expected in self.metadata["checksums"].items():
+            if hashlib.blake2b(self.columns[name], digest_size=16).hexdigest() != expected:
+                raise SnapshotError(f"{self.path}: column {name} is corrupt")
+
+    def __len__(self):
+        return self.metadata["entry_count"]
+
+    @property
+    def epoch(self):
+        return self.metadata["epoch"]
+
+    @property
+    def total_tickets(self):
+        return self.metadata["total_tickets"]
+
+    def wallet_address(self, wallet: int) -> str:
+        return bytes(self.wallet_blob[self.wallet_offsets[wallet]:self.wallet_offsets[wallet + 1]]).decode()
+
+    def transaction_hash(self, index: int) -> str:
+        return self.columns["tx_hash"][index * HASH_SIZE:(index + 1) * HASH_SIZE].hex()
+
+    def rows(self, start: int = 0, stop: int = None):
+        """(entry_id, transaction_hash, wallet_address, tickets) in draw order"""
+        entry_ids, tickets, wallets = self.columns["entry_id"], self.columns["tickets"], self.columns["wallet"]
+        for index in range(start, len(self) if stop is None else min(stop, len(self))):
+            yield entry_ids[index], self.transaction_hash(index), self.wallet_address(wallets[index]), tickets[index]
+
+    def entry(self, index: int):
+        columns = self.columns
+        return {
+            "wallet_address": self.wallet_address(columns["wallet"][index]),
+            "transaction_hash": self.transaction_hash(index),
+            "tickets": columns["tickets"][index],
+            "first_ticket": columns["first_ticket"][index],
+            "ada_amount": columns["lovelace"][index] / 1_000_000,
+            "epok_amount": columns["epok"][index],
+        }
+
+    def locate(self, ticket: int) -> int:
+        """Index of the entry holding ticket number `ticket`"""
+        if not 0 <= ticket < self.total_tickets:
+            raise IndexError("ticket out of range")
+        return bisect_right(self.columns["first_ticket"], ticket) - 1
+
+    def wallet_totals(self):
+        """Tickets per wallet address, computed once from the columns"""
+        if self._wallet_totals is None:
+            totals = Counter()
+            for wallet, tickets in zip(self.columns["wallet"], self.columns["tickets"]):
+                totals[wallet] += tickets
+            self._wallet_totals = totals
+        return self._wallet_totals
+
+    def top_wallets(self, limit: int = 10):
+        return [
+            {"wallet_address": self.wallet_address(wallet), "tickets": tickets}
+            for wallet, tickets in self.wallet_totals().most_common(limit)
+        ]
+
+    def stats(self):
+        metadata = self.metadata
+        return {
+            **metadata["epoch"],
+            "entry_count": metadata["entry_count"],
+            "total_tickets": metadata["total_tickets"],
+            "total_ada": metadata["total_lovelace"] / 1_000_000,
+            "total_epok": metadata["total_epok"],
+            "wallet_count": metadata["wallet_count"],
+        }
+
+
+def export_rows_query(epoch_id: int):
+    """The draw's rows plus the amounts and timestamps analytics need"""
+    entry = models.RaffleEntry
+    return select(entry.id, entry.tx_hash, models.Wallet.address, entry.tickets,
+                  entry.lovelace, entry.epok_units, entry.created_at)\
+        .join(models.Wallet, models.Wallet.id == entry.wallet_id)\
+        .where(entry.epoch_id == epoch_id)\
+        .where(entry.tickets > 0)\
+        .order_by(entry.tx_hash)
+
+
+class SnapshotStore:
+    """Snapshots on local disk, one file per epoch, mapped on demand.
+
+    Files are written under a temporary name and renamed into place, so
+    readers never see a partial snapshot. The directory is only a cache:
+    any closed epoch's snapshot can be rebuilt from the database, which
+    `ensure` does when one is missing (e.g. on a fresh dyno). Concurrent
+    misses for the same epoch share a single rebuild. The async methods do
+    their file writes and hashing in worker threads, off the event loop.
+    """
+
+    def __init__(self, directory: str = SNAPSHOT_DIR, max_open: int = SNAPSHOT_OPEN_MAX,
+                 session_factory=AsyncSessionLocal):
+        self.directory = directory
+        self.max_open = max_open
+        self.session_factory = session_factory
+        self._open = OrderedDict()
+        self._inflight = {}
+
+    def path(self, epoch_id: int) -> str:
+        return os.path.join(self.directory, f"epoch-{epoch_id}.snap")
+
+    def get(self, epoch_id: int):
+        """The published snapshot of `epoch_id`, or None"""
+        snapshot = self._cached(epoch_id)
+        if snapshot is None:
+            snapshot = self._remember(epoch_id, self._map(epoch_id))
+        return snapshot
+
+    async def load(self, epoch_id: int):
+        """`get`, mapping and verifying the file in a worker thread"""
+        snapshot = self._cached(epoch_id)
+        if snapshot is None:
+            snapshot = self._remember(epoch_id, await asyncio.to_thread(self._map, epoch_id))
+        return snapshot
+
+    def _cached(self, epoch_id: int):
+        snapshot = self._open.get(epoch_id)
+        if snapshot is not None:
+            self._open.move_to_end(epoch_id)
+        return snapshot
+
+    def _map(self, epoch_id: int):
+        path = self.path(epoch_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            return Snapshot(path)
+        except (SnapshotError, ValueError, OSError) as e:
+            logger.error(f"Ignoring snapshot of epoch {epoch_id}: {e}")
+            return None
+
+    def _remember(self, epoch_id: int, snapshot):
+        if snapshot is None:
+            return None
+        self._open[epoch_id] = snapshot
+        # Evicted maps are closed once nothing reads them any more
+        while len(self._open) > self.max_open:
+            self._open.popitem(last=False)
+        return snapshot
+
+    async def export(self, db: AsyncSession, epoch: models.RaffleEpoch, batch_size: int = SNAPSHOT_BATCH_SIZE):
+        """Write `epoch`'s entries to an unpublished file; returns its path.
+
+        The caller keeps the epoch frozen (or it is already completed) so
+        the entries can't change during the export.
+        """
+        entry = models.RaffleEntry
+        count = await db.scalar(
+            select(func.count()).where(entry.epoch_id == epoch.id).where(entry.tickets > 0)
+        )
+        path, writer = await asyncio.to_thread(self._create, epoch.id, count, batch_size)
+        metadata = {"epoch": epoch_metadata(epoch)}
+        try:
+            result = await db.stream(export_rows_query(epoch.id).execution_options(yield_per=batch_size))
+            async for rows in result.partitions():
+                await asyncio.to_thread(writer.extend, rows)
+            await asyncio.to_thread(writer.finish, metadata)
+        except BaseException:
+            writer.abort()
+            raise
+        return path
+
+    def _create(self, epoch_id: int, count: int, batch_size: int):
+        os.makedirs(self.directory, exist_ok=True)
+        # Unique per export: other workers may be rebuilding the same epoch
+        fd, path = tempfile.mkstemp(prefix=f"epoch-{epoch_id}.", suffix=".snap.tmp", dir=self.directory)
+        os.close(fd)
+        try:
+            return path, SnapshotWriter(path, count, batch_size)
+        except BaseException:
+            self.discard(path)
+            raise
+
+    async def publish(self, path: str, epoch: models.RaffleEpoch):
+        """Stamp the (now committed) epoch's draw into the file and move it into place"""
+        metadata = await asyncio.to_thread(update_metadata, path, epoch=epoch_metadata(epoch))
+        recorded = epoch.ticket_merkle_root
+        if recorded and recorded != metadata["merkle_root"]:
+            os.unlink(path)
+            raise SnapshotError(f"epoch {epoch.id}: entries no longer match the recorded draw")
+        os.replace(path, self.path(epoch.id))
+        self._open.pop(epoch.id, None)
+        logger.info(f"Published snapshot of epoch {epoch.id} ({metadata['entry_count']} entries)")
+        return self.path(epoch.id)
+
+    def discard(self, path: str):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    async def ensure(self, db: AsyncSession, epoch_id: int):
+        """The snapshot of a completed epoch, building it from the database if needed.
+
+        None if the epoch isn't completed, or if snapshots are disabled and
+        there is no file for it.
+        """
+        snapshot = await self.load(epoch_id)
+        if snapshot is not None or not SNAPSHOT_ENABLED:
+            return snapshot
+        epoch = await db.get(models.RaffleEpoch, epoch_id)
+        if epoch is None or not epoch.is_completed:
+            return None
+
+        task = self._inflight.get(epoch_id)
+        if task is None:
+            task = asyncio.ensure_future(self._rebuild(epoch_id))
+            self._inflight[epoch_id] = task
+        return await asyncio.shield(task)
+
+    async def _rebuild(self, epoch_id: int):
+        # Its own session, as the request that started it may finish first
+        try:
+            async with self.session_factory() as db:
+                epoch = await db.get(models.RaffleEpoch, epoch_id)
+                path = await self.export(db, epoch)
+            try:
+                await self.publish(path, epoch)
+            except SnapshotError as e:
+                logger.error(str(e))
+                return None
+            return await self.load(epoch_id)
+        finally:
+            self._inflight.pop(epoch_id, None)
+
+    def open_unpublished(self, path: str):
+        # Just written by this process; skip re-hashing every column
+        return Snapshot(path, verify=False)
+
+
+store = SnapshotStore()
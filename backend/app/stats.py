@@ -0,0 +1,114 @@
+from sqlalchemy import func, select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .database import dialect_insert
+from .events import broadcaster
+
+STAT_COLUMNS = ("total_lovelace", "total_epok_units", "total_tickets", "entry_count")
+
+
+def stats_fields(totals: dict):
+    """Stored totals in the API's form: ADA and EPOK rather than lovelace and base units"""
+    fields = {name: value for name, value in totals.items() if name not in ("total_lovelace", "total_epok_units")}
+    return {"total_ada": totals["total_lovelace"] / 1_000_000, "total_epok": totals["total_epok_units"], **fields}
+
+
+async def _upsert_increment(db: AsyncSession, model, keys: dict, values: dict):
+    stmt = dialect_insert(db, model).values(**keys, **values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={name: getattr(model, name) + stmt.excluded[name] for name in values}
+    )
+    await db.execute(stmt)
+
+
+async def record_entries(db: AsyncSession, rows):
+    """Add newly inserted entries to the epoch and wallet aggregates.
+
+    `rows` are dicts with the RaffleEntry column values. They are folded
+    per epoch and per wallet first, so a batch costs one upsert per
+    distinct key. Runs in the caller's transaction so the totals commit
+    or roll back together with the entries themselves.
+    """
+    epochs, wallets = {}, {}
+    for row in rows:
+        values = {
+            "total_lovelace": row.get("lovelace") or 0,
+            "total_epok_units": row.get("epok_units") or 0,
+            "total_tickets": row.get("tickets") or 0,
+            "entry_count": 1,
+        }
+        for totals, key in (
+            (epochs, (row["epoch_id"],)),
+            (wallets, (row["epoch_id"], row["wallet_address"])),
+        ):
+            current = totals.setdefault(key, dict.fromkeys(STAT_COLUMNS, 0))
+            for name, value in values.items():
+                current[name] += value
+
+    # Fixed key order keeps concurrent batches from deadlocking on each other's rows
+    for (epoch_id,), values in sorted(epochs.items()):
+        await _upsert_increment(db, models.EpochStats, {"epoch_id": epoch_id}, values)
+    for (epoch_id, wallet_address), values in sorted(wallets.items()):
+        await _upsert_increment(
+            db,
+            models.WalletEpochStats,
+            {"epoch_id": epoch_id, "wallet_address": wallet_address},
+            values
+        )
+
+
+async def get_epoch_stats(db: AsyncSession, epoch_id: int):
+    """Return the epoch's totals as a dict (zeros if nothing recorded yet)"""
+    # The totals are bumped with raw upserts, so never trust an identity-map copy
+    row = await db.get(models.EpochStats, epoch_id, populate_existing=True)
+    return {name: (getattr(row, name) if row else 0) for name in STAT_COLUMNS}
+
+
+async def get_wallet_stats(db: AsyncSession, epoch_id: int, wallet_address: str):
+    row = await db.get(models.WalletEpochStats, (epoch_id, wallet_address))
+    return {name: (getattr(row, name) if row else 0) for name in STAT_COLUMNS}
+
+
+def _aggregate_select(*group_by):
+    """Totals per `group_by`; grouping by models.Wallet.address joins in the wallets"""
+    entry = models.RaffleEntry
+    query = select(
+        *group_by,
+        func.coalesce(func.sum(entry.lovelace), 0),
+        func.coalesce(func.sum(entry.epok_units), 0),
+        func.coalesce(func.sum(entry.tickets), 0),
+        func.count(entry.id)
+    ).select_from(entry).group_by(*group_by)
+    if any(column.table is models.Wallet.__table__ for column in group_by):
+        query = query.join(models.Wallet, models.Wallet.id == entry.wallet_id)
+    return query
+
+
+async def reconcile(db: AsyncSession, epoch_id: int = None):
+    """Rebuild the aggregates from raw entries (all epochs, or just one)"""
+    entry = models.RaffleEntry
+    epoch_select = _aggregate_select(entry.epoch_id)
+    wallet_select = _aggregate_select(entry.epoch_id, models.Wallet.address)
+    clear_epochs = delete(models.EpochStats)
+    clear_wallets = delete(models.WalletEpochStats)
+
+    if epoch_id is not None:
+        epoch_select = epoch_select.where(entry.epoch_id == epoch_id)
+        wallet_select = wallet_select.where(entry.epoch_id == epoch_id)
+        clear_epochs = clear_epochs.where(models.EpochStats.epoch_id == epoch_id)
+        clear_wallets = clear_wallets.where(models.WalletEpochStats.epoch_id == epoch_id)
+
+    await db.execute(clear_epochs)
+    await db.execute(clear_wallets)
+    await db.execute(
+        models.EpochStats.__table__.insert()
+        .from_select(["epoch_id", *STAT_COLUMNS], epoch_select)
+    )
+    await db.execute(
+        models.WalletEpochStats.__table__.insert()
+        .from_select(["epoch_id", "wallet_address", *STAT_COLUMNS], wallet_select)
+    )
+    # Totals may have changed under live viewers and cached responses
+    await broadcaster.publish(db, "resync", {})
+    await db.commit()
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from . import models
+from .config import settings
+from .blockfrost_client import BlockfrostClient, get_client
+from .database import AsyncSessionLocal, dialect_insert
+
+logger = logging.getLogger(__name__)
+
+TX_CACHE_SIZE = settings.tx_cache_size
+TX_CACHE_PERSISTENT = settings.tx_cache_persistent
+
+
+class TxCache:
+    """Cache of (tx, utxos) Blockfrost responses keyed by tx hash.
+
+    Confirmed transactions are immutable, so entries never need
+    invalidating. Lookups go to an in-memory LRU of at most `maxsize`
+    transactions, then (optionally) the blockfrost_tx_cache table, and only
+    then to the network. Concurrent misses for the same hash share a single
+    fetch.
+    """
+
+    def __init__(self, maxsize: int = TX_CACHE_SIZE, persistent: bool = TX_CACHE_PERSISTENT,
+                 session_factory=AsyncSessionLocal):
+        self.maxsize = maxsize
+        self.persistent = persistent
+        self.session_factory = session_factory
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+        }
+
+    def _remember(self, tx_hash, value):
+        self._entries[tx_hash] = value
+        self._entries.move_to_end(tx_hash)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def get(self, tx_hash: str, fetch):
+        """Return (tx, utxos) for `tx_hash`, calling `fetch()` only on a full miss"""
+        value = self._entries.get(tx_hash)
+        if value is not None:
+            self._entries.move_to_end(tx_hash)
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(tx_hash)
+        if task is None:
+            task = asyncio.ensure_future(self._load(tx_hash, fetch))
+            self._inflight[tx_hash] = task
+        else:
+            # Piggyback on the fetch another request already started
+            self.hits += 1
+        return await asyncio.shield(task)
+
+    async def _load(self, tx_hash, fetch):
+        try:
+            value = await self._load_persistent(tx_hash)
+            if value is not None:
+                self.persistent_hits += 1
+            else:
+                self.misses += 1
+                tx, utxos = await fetch()
+                value = (tx, utxos)
+                await self._store_persistent(tx_hash, value)
+            self._remember(tx_hash, value)
+            return value
+        finally:
+            self._inflight.pop(tx_hash, None)
+
+    async def _load_persistent(self, tx_hash):
+        if not self.persistent:
+            return None
+        try:
+            async with self.session_factory() as db:
+                row = await db.get(models.TransactionCache, tx_hash)
+                if row:
+                    return json.loads(row.tx_json), json.loads(row.utxos_json)
+        except Exception as e:
+            logger.warning(f"Transaction cache read failed for {tx_hash}: {e}")
+        return None
+
+    async def _store_persistent(self, tx_hash, value):
+        if not self.persistent:
+            return
+        tx, utxos = value
+        try:
+            async with self.session_factory() as db:
+                stmt = dialect_insert(db, models.TransactionCache)\
+                    .values(tx_hash=tx_hash, tx_json=json.dumps(tx), utxos_json=json.dumps(utxos))\
+                    .on_conflict_do_nothing(index_elements=["tx_hash"])
+                await db.execute(stmt)
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Transaction cache write failed for {tx_hash}: {e}")
+
+
+cache = TxCache()
+
+
+async def transaction_with_utxos(tx_hash: str, client: BlockfrostClient = None):
+    """Cached drop-in for BlockfrostClient.transaction_with_utxos"""
+    client = client or get_client()
+    return await cache.get(tx_hash, lambda: client.transaction_with_utxos(tx_hash))
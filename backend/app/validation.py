@@ -0,0 +1,117 @@
+"""Raffle entry rules, applied to a transaction in one pass over its outputs.
+
+An entry costs one bundle of ENTRY_LOVELACE lovelace plus ENTRY_EPOK_UNITS
+EPOK sent to the raffle wallet. A transaction may carry several bundles,
+as several outputs or as one output holding a multiple of both, and earns
+one ticket per bundle, all recorded as a single entry row. The same rules
+serve the /webhook payload, Blockfrost's /txs/{hash}/utxos response (the
+two share the inputs/outputs shape) and the chain indexer.
+
+With ENTRY_MATCH=exact (the default) an output only counts when it holds
+the same whole number of bundles in both ADA and EPOK; with floor, any
+surplus in either is ignored. MAX_TICKETS_PER_TX, if set, rejects a
+transaction paying for more tickets than that; the default 0 accepts any
+number. A transaction is never given fewer tickets than it paid for.
+"""
+from dataclasses import dataclass
+from typing import Optional
+from .config import Settings, settings
+
+ENTRY_LOVELACE = settings.entry_lovelace
+ENTRY_EPOK_UNITS = settings.entry_epok_units
+ENTRY_MATCH = settings.entry_match
+MAX_TICKETS_PER_TX = settings.max_tickets_per_tx
+
+
+@dataclass(frozen=True)
+class EntryRules:
+    raffle_address: Optional[str]
+    # Blockfrost asset unit: policy id followed by the hex asset name
+    epok_unit: Optional[str]
+    lovelace_per_ticket: int = ENTRY_LOVELACE
+    epok_per_ticket: int = ENTRY_EPOK_UNITS
+    exact: bool = ENTRY_MATCH != "floor"
+    max_tickets: int = MAX_TICKETS_PER_TX
+
+    @classmethod
+    def from_settings(cls, settings: Settings):
+        return cls(raffle_address=settings.raffle_wallet_address, epok_unit=settings.epok_unit)
+
+    def describe(self):
+        return f"whole bundles of {self.lovelace_per_ticket / 1_000_000:g} ADA and {self.epok_per_ticket} EPOK"
+
+    def bundles(self, lovelace: int, epok_units: int) -> int:
+        """Entry bundles paid for by one output holding these amounts"""
+        count = min(lovelace // self.lovelace_per_ticket, epok_units // self.epok_per_ticket)
+        if self.exact and (lovelace != count * self.lovelace_per_ticket
+                           or epok_units != count * self.epok_per_ticket):
+            return 0
+        return count
+
+
+@dataclass
+class Evaluation:
+    """What a transaction earns; `reason` says why when it earns nothing"""
+    sender: Optional[str]
+    tickets: int = 0
+    lovelace: int = 0
+    epok_units: int = 0
+    outputs: int = 0
+    to_raffle: bool = False
+    reason: Optional[str] = None
+
+    @property
+    def valid(self):
+        return self.tickets > 0
+
+    def entry_row(self, tx_hash: str, epoch_id: int):
+        return {
+            "wallet_address": self.sender,
+            "transaction_hash": tx_hash,
+            "lovelace": self.lovelace,
+            "epok_units": self.epok_units,
+            "tickets": self.tickets,
+            "epoch_id": epoch_id,
+        }
+
+
+def sender_address(inputs):
+    """The address paying for the transaction: its first spent (not collateral or reference) input"""
+    for tx_input in inputs:
+        if not tx_input.get("collateral") and not tx_input.get("reference"):
+            return tx_input.get("address")
+    return None
+
+
+def evaluate(tx: dict, rules: EntryRules = None) -> Evaluation:
+    """Count the entry bundles `tx` pays to the raffle wallet"""
+    rules = rules or default_rules
+    result = Evaluation(sender=sender_address(tx.get("inputs", ())))
+    for output in tx.get("outputs", ()):
+        if output.get("address") != rules.raffle_address:
+            continue
+        result.to_raffle = True
+        assets = {}
+        for asset in output.get("amount", ()):
+            assets[asset["unit"]] = assets.get(asset["unit"], 0) + int(asset["quantity"])
+        lovelace, epok_units = assets.get("lovelace", 0), assets.get(rules.epok_unit, 0)
+        bundles = rules.bundles(lovelace, epok_units)
+        if bundles:
+            result.tickets += bundles
+            result.lovelace += lovelace
+            result.epok_units += epok_units
+            result.outputs += 1
+
+    if not result.to_raffle:
+        result.reason = "not to raffle wallet"
+    elif not result.tickets:
+        result.reason = f"no output to the raffle wallet holds {rules.describe()}"
+    elif not result.sender:
+        result.tickets, result.reason = 0, "no sender input"
+    elif rules.max_tickets and result.tickets > rules.max_tickets:
+        result.reason = f"pays for {result.tickets} tickets, over the limit of {rules.max_tickets} per transaction"
+        result.tickets = 0
+    return result
+
+
+default_rules = EntryRules.from_settings(settings)
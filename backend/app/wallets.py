@@ -0,0 +1,56 @@
+"""Wallet addresses interned into the wallets table.
+
+Entries refer to their sender by integer id instead of repeating the
+100+ character bech32 address on every row. Ids never change once
+committed, so each worker remembers the ones it has seen; ids resolved
+inside a transaction are only remembered once it commits.
+"""
+from sqlalchemy import event as sa_event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from . import models
+from .config import settings
+from .database import dialect_insert
+
+WALLET_CACHE_SIZE = settings.wallet_cache_size
+
+PENDING_KEY = "pending_wallet_ids"
+
+_ids = {}
+
+
+def _remember(ids: dict):
+    if len(_ids) + len(ids) > WALLET_CACHE_SIZE:
+        _ids.clear()
+    _ids.update(ids)
+
+
+async def wallet_ids(db: AsyncSession, addresses):
+    """Map each address to its wallet id, creating wallets that are new"""
+    resolved = {address: _ids[address] for address in addresses if address in _ids}
+    missing = sorted(set(addresses) - resolved.keys())
+    if missing:
+        # Sorted, so concurrent batches take the unique index locks in one order
+        await db.execute(
+            dialect_insert(db, models.Wallet)
+            .values([{"address": address} for address in missing])
+            .on_conflict_do_nothing(index_elements=["address"])
+        )
+        found = dict((await db.execute(
+            select(models.Wallet.address, models.Wallet.id).where(models.Wallet.address.in_(missing))
+        )).all())
+        db.sync_session.info.setdefault(PENDING_KEY, {}).update(found)
+        resolved.update(found)
+    return resolved
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _remember_pending(session):
+    pending = session.info.pop(PENDING_KEY, None)
+    if pending:
+        _remember(pending)
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(PENDING_KEY, None)
@@ -1,30 +1,31 @@
-from fastapi import FastAPI, APIRouter, Request, HTTPException, Depends
-from sqlalchemy.orm import Session
-from . import models
+from fastapi import APIRouter, Request, HTTPException, Depends, Query
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import draw, stats, pagination, epochs, ingest, blockfrost_service, tx_cache, scheduler, validation
+from .config import settings
 from .database import get_db
-import os
-from dotenv import load_dotenv
 from datetime import datetime
-import random
-from blockfrost import BlockFrostApi
+import hmac
+from typing import Optional
 
-load_dotenv()
-
-REQUIRED_EPOK_AMOUNT = 1000  # Amount of EPOK tokens required
-RAFFLE_WALLET_ADDRESS = os.getenv("RAFFLE_WALLET_ADDRESS")  # Your raffle wallet address
-EPOK_POLICY_ID = os.getenv("EPOK_POLICY_ID")  # EPOK token policy ID
+router = APIRouter()
 
-api = BlockFrostApi(
-    project_id=os.environ.get('BLOCKFROST_PROJECT_ID')
-)
+def valid_secret(value) -> bool:
+    """Whether a webhook-secret header value is BLOCKFROST_WEBHOOK_SECRET, compared in constant time.
 
-router = APIRouter()
+    Nothing matches while no secret is configured.
+    """
+    secret = settings.blockfrost_webhook_secret
+    if not secret or value is None:
+        return False
+    if isinstance(value, str):
+        value = value.encode("latin-1")
+    return hmac.compare_digest(value, secret.encode())
 
 @router.post("/webhook")
-async def handle_webhook(request: Request, db: Session = Depends(get_db)):
+async def handle_webhook(request: Request, db: AsyncSession = Depends(get_db)):
     # Verify webhook secret
-    webhook_secret = request.headers.get("webhook-secret")
-    if webhook_secret != os.getenv("BLOCKFROST_WEBHOOK_SECRET"):
+    if not valid_secret(request.headers.get("webhook-secret")):
         raise HTTPException(status_code=401, detail="Invalid webhook secret")
 
     # Parse webhook payload
@@ -32,63 +33,45 @@ async def handle_webhook(request: Request, db: Session = Depends(get_db)):
     
     try:
         tx = payload["payload"]
-        sender_addr = tx["inputs"][0]["address"]
-        
-        # Check if this is a transaction to our raffle wallet
-        if not any(output["address"] == RAFFLE_WALLET_ADDRESS for output in tx["outputs"]):
-            return {"status": "ignored", "reason": "not to raffle wallet"}
+        evaluation = validation.evaluate(tx)
+        if not evaluation.to_raffle:
+            return {"status": "ignored", "reason": evaluation.reason}
 
         # Get current epoch
-        current_epoch = db.query(models.RaffleEpoch)\
-            .filter(models.RaffleEpoch.end_time > datetime.utcnow())\
-            .filter(models.RaffleEpoch.is_completed == False)\
-            .first()
+        current_epoch = await epochs.resolver.current(db)
         
         if not current_epoch:
             return {"status": "error", "reason": "no active raffle epoch"}
 
-        # Check for the required EPOK amount
-        required_amount = int(os.getenv("REQUIRED_EPOK_AMOUNT", "1000"))
+        if not evaluation.valid:
+            return {"status": "ignored", "reason": evaluation.reason}
+
+        # Queue one entry holding every ticket in the transaction for the next batched insert
+        try:
+            ingest.queue.submit(evaluation.entry_row(tx["hash"], current_epoch.id))
+        except ingest.QueueFull:
+            # Let Blockfrost redeliver once the backlog has drained
+            raise HTTPException(status_code=503, detail="Ingestion backlog full, retry later")
         
-        for output in tx["outputs"]:
-            if output["address"] == RAFFLE_WALLET_ADDRESS:
-                amount = int(output.get("amount", [{"quantity": "0"}])[0].get("quantity", "0"))
-                if amount >= required_amount:
-                    # Add entry to raffle
-                    entry = models.RaffleEntry(
-                        wallet_address=sender_addr,
-                        transaction_hash=tx["hash"],
-                        ada_amount=5.0,  # Fixed amount
-                        epok_amount=amount,
-                        tickets=1,
-                        epoch_id=current_epoch.id
-                    )
-                    
-                    db.add(entry)
-                    db.commit()
-                    
-                    # Get total entries for this wallet
-                    total_entries = db.query(models.RaffleEntry)\
-                        .filter(models.RaffleEntry.wallet_address == sender_addr)\
-                        .filter(models.RaffleEntry.epoch_id == current_epoch.id)\
-                        .count()
-                    
-                    return {
-                        "status": "success",
-                        "message": f"Added raffle entry for {sender_addr}",
-                        "total_tickets": total_entries
-                    }
+        # Tickets already committed for this wallet, from the running aggregate
+        wallet_stats = await stats.get_wallet_stats(db, current_epoch.id, evaluation.sender)
         
-        return {"status": "ignored", "reason": "insufficient EPOK amount"}
+        return JSONResponse(status_code=202, content={
+            "status": "accepted",
+            "message": f"Queued raffle entry for {evaluation.sender}",
+            "tickets": evaluation.tickets,
+            "total_tickets": wallet_stats["total_tickets"]
+        })
                     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/transaction-webhook")
-async def handle_transaction_webhook(request: Request, db: Session = Depends(get_db)):
+async def handle_transaction_webhook(request: Request, db: AsyncSession = Depends(get_db)):
     # Verify webhook secret
-    webhook_secret = request.headers.get("webhook-secret")
-    if webhook_secret != os.getenv("BLOCKFROST_WEBHOOK_SECRET"):
+    if not valid_secret(request.headers.get("webhook-secret")):
         raise HTTPException(status_code=401, detail="Invalid webhook secret")
 
     # Parse webhook payload
@@ -96,160 +79,86 @@ async def handle_transaction_webhook(request: Request, db: Session = Depends(get
     
     try:
         tx_hash = payload["tx_hash"]
-        # Process the transaction using blockfrost service
-        blockfrost_service = BlockfrostService()
-        current_epoch = get_or_create_current_epoch(db)
-        result = await blockfrost_service.process_transaction(tx_hash, db, current_epoch)
+        # Process the transaction using the shared blockfrost service
+        current_epoch = await get_current_epoch(db)
+        result = await blockfrost_service.service.process_transaction(tx_hash, db, current_epoch)
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-async def handle_transaction_webhook(tx_hash: str, db: Session):
-    """Handle incoming transaction webhook from Blockfrost"""
-    try:
-        # Get transaction details
-        tx = api.transaction(tx_hash)
-        
-        # Get UTXOs for this transaction
-        utxos = api.transaction_utxos(tx_hash)
-        
-        # Check if this transaction is to our raffle wallet
-        valid_entries = []
-        for output in utxos.outputs:
-            if output.address == RAFFLE_WALLET_ADDRESS:
-                # Check for EPOK tokens
-                for asset in output.amount:
-                    if asset.unit == EPOK_POLICY_ID:
-                        if int(asset.quantity) >= REQUIRED_EPOK_AMOUNT:
-                            # Valid entry found
-                            valid_entries.append({
-                                'wallet_address': tx.inputs[0].address,  # Sender's address
-                                'ada_amount': output.amount[0].quantity,  # ADA amount
-                                'epok_amount': asset.quantity,
-                                'transaction_hash': tx_hash
-                            })
-        
-        # Add valid entries to database
-        current_epoch = get_or_create_current_epoch(db)
-        for entry in valid_entries:
-            new_entry = models.RaffleEntry(
-                epoch_id=current_epoch.id,
-                wallet_address=entry['wallet_address'],
-                ada_amount=entry['ada_amount'],
-                epok_amount=entry['epok_amount'],
-                transaction_hash=entry['transaction_hash'],
-                tickets=1  # Can modify this based on amount sent
-            )
-            db.add(new_entry)
-        
-        db.commit()
-        return {"status": "success", "entries_added": len(valid_entries)}
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing transaction: {str(e)}")
-
-def get_or_create_current_epoch(db: Session):
-    """Get current epoch from Cardano network"""
+async def get_current_epoch(db: AsyncSession):
+    """Get the open epoch; the rollover scheduler opens new ones"""
     try:
-        latest_epoch = api.epoch_latest()
-        current_epoch = db.query(models.RaffleEpoch)\
-            .filter(models.RaffleEpoch.epoch_number == latest_epoch.epoch)\
-            .first()
-        
-        if not current_epoch:
-            current_epoch = models.RaffleEpoch(
-                epoch_number=latest_epoch.epoch,
-                start_time=latest_epoch.start_time,
-                end_time=latest_epoch.end_time,
-                is_completed=False
-            )
-            db.add(current_epoch)
-            db.commit()
-        
-        return current_epoch
-        
+        current_epoch = await epochs.resolver.current(db)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting epoch: {str(e)}")
+    if not current_epoch:
+        raise HTTPException(status_code=503, detail="No open raffle epoch")
+    return current_epoch
+
+@router.get("/tx-cache/stats")
+async def get_tx_cache_stats():
+    """Hit/miss counters for this worker's Blockfrost transaction cache"""
+    return tx_cache.cache.stats()
 
 @router.get("/entries")
-async def get_entries(db: Session = Depends(get_db)):
-    """Get all current raffle entries for active epoch"""
-    current_epoch = db.query(models.RaffleEpoch)\
-        .filter(models.RaffleEpoch.end_time > datetime.utcnow())\
-        .filter(models.RaffleEpoch.is_completed == False)\
-        .first()
+async def get_entries(
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[int] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get current raffle entries for active epoch, one page at a time"""
+    current_epoch = await epochs.resolver.current(db)
     
     if not current_epoch:
-        return {"entries": [], "count": 0}
+        return {"entries": [], "count": 0, "next_cursor": None}
+    
+    fields = ("wallet_address", "tickets", "transaction_hash")
+    if format == "ndjson":
+        return pagination.ndjson_response(current_epoch.id, fields, cursor)
     
-    entries = db.query(models.RaffleEntry)\
-        .filter(models.RaffleEntry.epoch_id == current_epoch.id)\
-        .all()
+    entries_data, next_cursor = await pagination.get_page(db, current_epoch.id, fields, cursor, limit)
+    epoch_stats = await stats.get_epoch_stats(db, current_epoch.id)
     
     return {
-        "entries": [
-            {
-                "wallet_address": entry.wallet_address,
-                "tickets": entry.tickets,
-                "transaction_hash": entry.transaction_hash
-            }
-            for entry in entries
-        ],
-        "count": len(entries)
+        "entries": entries_data,
+        "count": epoch_stats["entry_count"],
+        "next_cursor": next_cursor
     }
 
 @router.post("/draw-winner")
-async def draw_winner(db: Session = Depends(get_db)):
-    """Draw a winner for the current epoch"""
-    current_epoch = db.query(models.RaffleEpoch)\
-        .filter(models.RaffleEpoch.end_time > datetime.utcnow())\
-        .filter(models.RaffleEpoch.is_completed == False)\
-        .first()
+async def draw_winner(epoch_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    """Draw the winner of an epoch: by default the oldest ended, undrawn one"""
+    if epoch_id is None:
+        result = await db.execute(epochs.undrawn_epoch_query(datetime.utcnow()))
+        ended = result.scalars().first()
+        current_epoch = await epochs.resolver.current(db) if not ended else None
+        epoch_id = ended.id if ended else (current_epoch.id if current_epoch else None)
     
-    if not current_epoch:
-        raise HTTPException(status_code=400, detail="No active raffle epoch")
+    try:
+        # Seeded, replayable draw over the entries in transaction hash order
+        epoch, result = await scheduler.close_epoch(db, epoch_id, close_empty=False) \
+            if epoch_id else (None, None)
+    except draw.DrawNotReady as e:
+        raise HTTPException(status_code=409, detail=str(e))
     
-    entries = db.query(models.RaffleEntry)\
-        .filter(models.RaffleEntry.epoch_id == current_epoch.id)\
-        .all()
+    if not epoch:
+        # Another worker may already have drawn the epoch we had cached
+        epochs.resolver.invalidate()
+        raise HTTPException(status_code=400, detail="No active raffle epoch")
     
-    if not entries:
+    if not result:
         raise HTTPException(status_code=400, detail="No entries in current epoch")
     
-    # Create weighted list based on number of tickets
-    weighted_addresses = []
-    for entry in entries:
-        weighted_addresses.extend([entry.wallet_address] * entry.tickets)
-    
-    # Select random winner
-    winner = random.choice(weighted_addresses)
-    
-    # Update epoch
-    current_epoch.is_completed = True
-    current_epoch.winner_address = winner
-    db.commit()
-    
-    return {
-        "status": "success",
-        "winner": winner,
-        "total_entries": len(weighted_addresses)
-    }
-
-@router.post("/epochs/new")
-async def create_epoch(end_time: datetime, db: Session = Depends(get_db)):
-    """Create a new raffle epoch"""
-    epoch = models.RaffleEpoch(
-        end_time=end_time
-    )
-    db.add(epoch)
-    db.commit()
-    
     return {
         "status": "success",
+        "winner": result.winner_address,
+        "total_entries": result.total_tickets,
         "epoch_id": epoch.id,
-        "end_time": end_time
+        "seed": result.seed,
+        "merkle_root": result.merkle_root
     }
-
-app = FastAPI()
-app.include_router(router)
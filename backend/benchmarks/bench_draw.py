@@ -0,0 +1,77 @@
+"""Benchmark the weighted winner draw.
+
+Compares the original approach (materialize every entry, expand one list
+slot per ticket, random.choice) against the cumulative TicketIndex fed from
+a row stream. Run from the backend directory:
+
+    python -m benchmarks.bench_draw --tickets 10000 1000000 10000000
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from collections import namedtuple
+
+from app.draw import TicketIndex
+
+Entry = namedtuple("Entry", "id wallet_address tickets")
+
+
+def synthetic_entries(total_tickets, max_tickets, wallets):
+    """Yield entries until `total_tickets` tickets have been handed out"""
+    entry_id = 0
+    remaining = total_tickets
+    while remaining > 0:
+        entry_id += 1
+        tickets = min(remaining, 1 + (entry_id * 7919) % max_tickets)
+        remaining -= tickets
+        yield Entry(entry_id, wallets[entry_id % len(wallets)], tickets)
+
+
+def list_draw(rows):
+    entries = list(rows)  # what .all() does
+    tickets = []
+    for entry in entries:
+        tickets.extend([entry.wallet_address] * entry.tickets)
+    return random.choice(tickets)
+
+
+def index_draw(rows):
+    index = TicketIndex.from_rows((entry.id, entry.tickets) for entry in rows)
+    return index.pick()
+
+
+def measure(fn, make_rows):
+    # Time and memory are taken in separate runs so tracing doesn't skew timings
+    start = time.perf_counter()
+    fn(make_rows())
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    fn(make_rows())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(elapsed, 4), "peak_mb": round(peak / 1_000_000, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, nargs="+", default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument("--max-tickets-per-entry", type=int, default=1)
+    parser.add_argument("--wallets", type=int, default=5_000)
+    args = parser.parse_args()
+
+    wallets = [f"addr1q{i:0>97}" for i in range(args.wallets)]
+    results = []
+    for total in args.tickets:
+        for name, fn in (("list", list_draw), ("index", index_draw)):
+            make_rows = lambda: synthetic_entries(total, args.max_tickets_per_entry, wallets)
+            result = {"approach": name, "tickets": total, **measure(fn, make_rows)}
+            results.append(result)
+            print(json.dumps(result), flush=True)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Concurrent polling load test for the read endpoints.
+
+Simulates open browser tabs hammering the endpoints the frontend polls and
+reports throughput and latency percentiles. Point it at any running
+server (e.g. one started from an older commit) to compare before/after:
+
+    python -m benchmarks.bench_polling --seed 20000 --serve --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+DEFAULT_PATHS = ["/api/current-prize", "/api/participants", "/api/entries"]
+
+
+def seed(entries):
+    """Reset the database to one open epoch holding `entries` one-ticket entries"""
+    from benchmarks import datagen
+    datagen.seed(entries)
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_summary(latencies):
+    """p50/p95/p99 in milliseconds for a list of latencies in seconds"""
+    return {
+        f"p{pct}_ms": round(percentile(latencies, pct) * 1000, 2) if latencies else None
+        for pct in (50, 95, 99)
+    }
+
+
+async def poll(client, paths, deadline, latencies, errors, revalidate=False):
+    """Request `paths` round-robin; with `revalidate`, send back each path's last ETag.
+
+    Failed requests go to `errors` as (status or exception name, seconds taken).
+    """
+    etags = {}
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        headers = {"If-None-Match": etags[path]} if revalidate and path in etags else None
+        start = time.perf_counter()
+        try:
+            response = await client.get(path, headers=headers)
+            if response.status_code >= 400:
+                errors.append((response.status_code, time.perf_counter() - start))
+                continue
+        except httpx.HTTPError as e:
+            errors.append((type(e).__name__, time.perf_counter() - start))
+            continue
+        latencies.append(time.perf_counter() - start)
+        if "etag" in response.headers:
+            etags[path] = response.headers["etag"]
+
+
+async def run_load(url, paths, concurrency, duration, revalidate=False):
+    """Successful requests per second over the whole run (including requests still
+    in flight at the deadline) and their latency percentiles.
+
+    A server that starves some connections can look fast to the rest, so
+    failures are broken down by kind and `p99_with_errors_ms` also counts
+    the time failed requests took (a timeout counts as 30s).
+    """
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        deadline = started + duration
+        await asyncio.gather(*(
+            poll(client, paths, deadline, latencies, errors, revalidate) for _ in range(concurrency)
+        ))
+    seconds = time.perf_counter() - started
+    return {
+        "url": url,
+        "paths": paths,
+        "concurrency": concurrency,
+        "duration_s": duration,
+        "seconds": round(seconds, 2),
+        "requests": len(latencies),
+        "errors": len(errors),
+        "error_kinds": dict(Counter(str(kind) for kind, _ in errors)),
+        "rps": round(len(latencies) / seconds, 1),
+        **latency_summary(latencies),
+        "p99_with_errors_ms": latency_summary(latencies + [took for _, took in errors])["p99_ms"],
+    }
+
+
+def serve(workers, port, env=None, interval=0.2, preload=True):
+    """Start gunicorn the same way the Procfile does; returns once it answers GET /
+
+    The rate limiter is off unless `env` turns it on: every load generator
+    request comes from one IP.
+    """
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-w", str(workers), "-k", "uvicorn.workers.UvicornWorker",
+         "-b", f"127.0.0.1:{port}", *(["--preload"] if preload else []), "app.main:app"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env={**os.environ, "RATE_LIMIT_ENABLED": "false", **(env or {})},
+    )
+    deadline = time.time() + 30
+    # One client for every attempt; building one per poll is slow enough to delay the server's own startup
+    with httpx.Client() as client:
+        while time.time() < deadline:
+            try:
+                if client.get(f"http://127.0.0.1:{port}/").status_code == 200:
+                    return process
+            except httpx.HTTPError:
+                time.sleep(interval)
+    process.terminate()
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--seed", type=int, help="Reset the database and seed this many entries first")
+    parser.add_argument("--serve", action="store_true", help="Start gunicorn on --port for the run")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "4")))
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--revalidate", action="store_true", help="Send If-None-Match with the last ETag seen")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        seed(args.seed)
+
+    process = None
+    url = args.url
+    if args.serve:
+        process = serve(args.workers, args.port)
+        url = f"http://127.0.0.1:{args.port}"
+    try:
+        result = asyncio.run(run_load(url, args.paths, args.concurrency, args.duration, args.revalidate))
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+    print(json.dumps(result))
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Check that rate limits hold across gunicorn workers, and time the shared buckets.
+
+Starts gunicorn with --workers workers and a burst of --burst requests
+(refilling too slowly to matter), sends --requests requests to GET / from
+one client over fresh connections so they spread across the workers, and
+fails unless exactly --burst were accepted: a per-worker limit would let
+up to workers x burst through. Then times RateLimiter.take from
+--workers processes updating one shared file at once, all on the same
+keys (the worst case for the per-set locks):
+
+    python -m benchmarks.bench_rate_limit --workers 4
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+from app.rate_limit import RateLimiter
+from benchmarks.bench_polling import serve
+
+
+async def count_statuses(port, requests, concurrency):
+    # No keep-alive, so each request is accepted by whichever worker is free
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=0)
+    statuses = {}
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits) as client:
+        responses = await asyncio.gather(*(client.get("/") for _ in range(requests)))
+    for response in responses:
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    return statuses
+
+
+def shared_limit(workers, port, burst, requests, concurrency, path):
+    env = {"RATE_LIMIT_ENABLED": "true", "RATE_LIMIT_FILE": path, "RATE_LIMIT_BURST": str(burst), "RATE_LIMIT_RATE": "0.0001",
+           "SCHEDULER_ENABLED": "false"}
+    process = serve(workers, port, env=env)
+    try:
+        # serve() already spent one token waiting for GET /
+        statuses = asyncio.run(count_statuses(port, requests, concurrency))
+    finally:
+        process.terminate()
+        process.wait()
+    accepted = statuses.get(200, 0) + 1
+    return {"measure": "shared limit", "workers": workers, "burst": burst, "requests": requests + 1,
+            "accepted": accepted, "statuses": statuses, "ok": accepted == burst}
+
+
+def take_loop(path, keys, calls, results):
+    limiter = RateLimiter(path, rate=1e9, burst=10 ** 9)
+    started = time.perf_counter()
+    for i in range(calls):
+        limiter.take(keys[i % len(keys)])
+    results.put(time.perf_counter() - started)
+
+
+def contention(workers, calls, path):
+    keys = [f"10.0.0.{i} GET /api/participants".encode() for i in range(64)]
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=take_loop, args=(path, keys, calls, results))
+                 for _ in range(workers)]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    seconds = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+    return {"measure": "take", "processes": workers, "calls": workers * calls,
+            "per_second": round(workers * calls / elapsed),
+            "mean_us": round(sum(seconds) / (workers * calls) * 1e6, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--burst", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--calls", type=int, default=100_000, help="take() calls per process")
+    parser.add_argument("--port", type=int, default=8012)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        result = shared_limit(args.workers, args.port, args.burst, args.requests - 1, args.concurrency,
+                              os.path.join(directory, "serve"))
+        print(json.dumps(result), flush=True)
+        for workers in sorted({1, args.workers}):
+            print(json.dumps(contention(workers, args.calls, os.path.join(directory, f"take-{workers}"))),
+                  flush=True)
+    sys.exit(0 if result["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Read endpoint throughput with the response cache cold, hot and revalidating.
+
+Seeds one epoch, then runs the polling load three times against a fresh
+gunicorn: with the cache disabled (every request renders from the DB), with
+it enabled (after the first hit, bodies come from memory) and with clients
+sending If-None-Match (304s, no body):
+
+    python -m benchmarks.bench_response_cache --seed 20000 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+
+from benchmarks.bench_polling import DEFAULT_PATHS, run_load, seed, serve
+
+SCENARIOS = (
+    ("cold", {"RESPONSE_CACHE_SIZE": "0"}, False),
+    ("hot", {}, False),
+    ("revalidate", {}, True),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS + ["/api/latest-winner"])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "4")))
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    seed(args.seed)
+    results = {}
+    for name, env, revalidate in SCENARIOS:
+        process = serve(args.workers, args.port, env)
+        try:
+            url = f"http://127.0.0.1:{args.port}"
+            results[name] = asyncio.run(run_load(url, args.paths, args.concurrency, args.duration, revalidate))
+        finally:
+            process.terminate()
+            process.wait()
+        print(json.dumps({"scenario": name, **results[name]}))
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark closed-epoch snapshots against reading the same epoch from the database.
+
+Seeds DATABASE_URL (it is reset) with one closed epoch of --entries entries,
+then times exporting it, replaying the draw from the database and from the
+snapshot (checking both agree), and the top-wallets aggregation both ways,
+and compares the snapshot's size with the entries table's:
+
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_snapshot --entries 100000 1000000
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import func, select, text
+
+from app import draw, models, snapshot
+from app.database import AsyncSessionLocal, engine
+from benchmarks import datagen
+from benchmarks.suite import peak_rss_mb
+
+SEED = bytes(32)
+
+
+def table_bytes():
+    """On-disk size of the entries table (with indexes), or the whole SQLite file"""
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            return conn.scalar(text("SELECT pg_total_relation_size('raffle_entries')"))
+        return conn.scalar(text("PRAGMA page_count")) * conn.scalar(text("PRAGMA page_size"))
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return result, round(time.perf_counter() - start, 4)
+
+
+async def top_wallets_query(db, epoch_id, limit=10):
+    entry = models.RaffleEntry
+    tickets = func.sum(entry.tickets).label("tickets")
+    rows = await db.execute(
+        select(models.Wallet.address, tickets).join(models.Wallet, models.Wallet.id == entry.wallet_id)
+        .where(entry.epoch_id == epoch_id)
+        .group_by(models.Wallet.address).order_by(tickets.desc()).limit(limit)
+    )
+    return rows.all()
+
+
+async def measure(entries, wallets, store):
+    epoch_id = datagen.seed(entries, 2, wallets)[0]
+    result = {"entries": entries, "table_mb": round(table_bytes() / 1_000_000, 2)}
+
+    async with AsyncSessionLocal() as db:
+        epoch = await db.get(models.RaffleEpoch, epoch_id)
+        path, result["export_s"] = await timed(store.export(db, epoch))
+        await store.publish(path, epoch)
+        result["snapshot_mb"] = round(os.path.getsize(store.path(epoch_id)) / 1_000_000, 2)
+
+        start = time.perf_counter()
+        epoch_snapshot = snapshot.Snapshot(store.path(epoch_id))
+        result["open_verified_s"] = round(time.perf_counter() - start, 4)
+
+        from_db, result["replay_db_s"] = await timed(draw.replay_draw(db, epoch_id, SEED))
+        start = time.perf_counter()
+        from_snapshot = draw.replay_snapshot(epoch_snapshot, SEED)
+        result["replay_snapshot_s"] = round(time.perf_counter() - start, 4)
+        # Memory is taken in a separate run so tracing doesn't skew the timing
+        tracemalloc.start()
+        draw.replay_snapshot(epoch_snapshot, SEED)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["replay_snapshot_peak_mb"] = round(peak / 1_000_000, 2)
+        result["replays_agree"] = from_db == from_snapshot
+
+        _, result["top_wallets_db_s"] = await timed(top_wallets_query(db, epoch_id))
+        start = time.perf_counter()
+        epoch_snapshot.top_wallets()
+        result["top_wallets_snapshot_s"] = round(time.perf_counter() - start, 4)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--wallets", type=int, default=5_000)
+    args = parser.parse_args()
+
+    store = snapshot.SnapshotStore(tempfile.mkdtemp(prefix="epok-bench-snapshots-"))
+    results = []
+    for entries in args.entries:
+        result = asyncio.run(measure(entries, args.wallets, store))
+        results.append(result)
+        print(json.dumps(result), flush=True)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Measure how long a worker takes to start serving.
+
+Times, in fresh processes, importing the application module, and
+starting gunicorn the way the Procfile does (with and without --preload)
+until it answers its first request (GET /) and its first database-backed
+one (/api/current-prize).
+The database in DATABASE_URL must already have its schema:
+
+    alembic upgrade head
+    python -m benchmarks.bench_startup --workers 1 4 --repeat 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.bench_polling import serve
+
+IMPORT_SCRIPT = (
+    "import time; started = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - started)"
+)
+
+
+def import_seconds():
+    output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], check=True, capture_output=True, text=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def first_request_seconds(workers, port, preload):
+    """(seconds until GET / answers, seconds until /api/current-prize answers) from process start"""
+    started = time.perf_counter()
+    process = serve(workers, port, interval=0.005, preload=preload)
+    try:
+        ready = time.perf_counter() - started
+        response = httpx.get(f"http://127.0.0.1:{port}/api/current-prize")
+        response.raise_for_status()
+        return ready, time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def summary(samples):
+    return {"median_s": round(statistics.median(samples), 3), "min_s": round(min(samples), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8011)
+    args = parser.parse_args()
+
+    results = [{"measure": "import app.main", **summary([import_seconds() for _ in range(args.repeat)])}]
+    print(json.dumps(results[-1]), flush=True)
+    for workers in args.workers:
+        for preload in (False, True):
+            samples = [first_request_seconds(workers, args.port, preload) for _ in range(args.repeat)]
+            results.append({
+                "measure": "first request", "workers": workers, "preload": preload,
+                "root": summary([ready for ready, _ in samples]),
+                "database": summary([first_db for _, first_db in samples]),
+            })
+            print(json.dumps(results[-1]), flush=True)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Compare the compact entry layout with the old string/float one.
+
+Seeds DATABASE_URL (it is reset) with --entries entries, copies them into a
+side table laid out the way raffle_entries was before migration 0005
+(address and hex hash strings, float amounts, the same indexes), then
+reports table and per-index sizes and times the draw-order scan and the
+per-wallet aggregate against both, through the async driver the app uses
+(psycopg2 decodes bytea several times slower than asyncpg, which would
+misattribute its cost to the layout):
+
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_storage --entries 100000 1000000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from sqlalchemy import Column, DateTime, Float, Index, Integer, MetaData, String, Table, func, select, text
+
+from app import draw, models
+from app.database import SessionLocal, async_engine, engine
+from benchmarks import datagen
+
+legacy_metadata = MetaData()
+legacy = Table(
+    "legacy_raffle_entries", legacy_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("wallet_address", String, index=True),
+    Column("transaction_hash", String, unique=True, index=True),
+    Column("ada_amount", Float),
+    Column("epok_amount", Float),
+    Column("tickets", Integer),
+    Column("created_at", DateTime),
+    Column("epoch_id", Integer),
+)
+Index("ix_legacy_raffle_entries_epoch_id_id", legacy.c.epoch_id, legacy.c.id,
+      postgresql_include=["wallet_address", "tickets", "ada_amount", "transaction_hash", "created_at"])
+Index("ix_legacy_raffle_entries_epoch_id_tx_hash", legacy.c.epoch_id, legacy.c.transaction_hash,
+      postgresql_include=["tickets"])
+Index("ix_legacy_raffle_entries_epoch_id_wallet", legacy.c.epoch_id, legacy.c.wallet_address,
+      postgresql_include=["tickets", "ada_amount", "epok_amount"])
+
+
+def copy_to_legacy(db):
+    entry, wallet = models.RaffleEntry, models.Wallet
+    if engine.dialect.name == "postgresql":
+        hex_hash = func.encode(entry.tx_hash, "hex")
+    else:
+        hex_hash = func.lower(func.hex(entry.tx_hash))
+    db.execute(legacy.insert().from_select(
+        ["id", "wallet_address", "transaction_hash", "ada_amount", "epok_amount", "tickets", "created_at", "epoch_id"],
+        select(entry.id, wallet.address, hex_hash, entry.lovelace / 1_000_000.0, entry.epok_units,
+               entry.tickets, entry.created_at, entry.epoch_id)
+        .join(wallet, wallet.id == entry.wallet_id)
+    ))
+
+
+def sizes(conn, table):
+    """Bytes used by the table itself and by each of its indexes"""
+    if engine.dialect.name == "postgresql":
+        indexes = conn.execute(text(
+            "SELECT indexrelid::regclass::text, pg_relation_size(indexrelid) FROM pg_index "
+            "WHERE indrelid = CAST(:table AS regclass)"
+        ), {"table": table}).all()
+        heap = conn.scalar(text("SELECT pg_table_size(CAST(:table AS regclass))"), {"table": table})
+    else:
+        indexes = conn.execute(text(
+            "SELECT name, SUM(pgsize) FROM dbstat WHERE name IN "
+            "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table) GROUP BY name"
+        ), {"table": table}).all()
+        heap = conn.scalar(text("SELECT SUM(pgsize) FROM dbstat WHERE name = :table"), {"table": table})
+    return {
+        "table_mb": round(heap / 1_000_000, 2),
+        "indexes_mb": round(sum(size for _, size in indexes) / 1_000_000, 2),
+        "index_mb": {name: round(size / 1_000_000, 2) for name, size in sorted(indexes)},
+    }
+
+
+async def timed(conn, query, repeat):
+    """Best of `repeat` runs, fetching every row (through Core, so both layouts skip ORM row loading)"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        (await conn.execute(query)).all()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 4)
+
+
+async def time_queries(result, epoch_id, repeat):
+    async with async_engine.connect() as conn:
+        for layout, queries in (("compact", compact_queries(epoch_id)), ("legacy", legacy_queries(epoch_id))):
+            for name, query in queries.items():
+                result[layout][name] = await timed(conn, query, repeat)
+    await async_engine.dispose()
+
+
+def compact_queries(epoch_id):
+    entry, wallet = models.RaffleEntry, models.Wallet
+    return {
+        "draw_scan_s": draw.audit_rows_query(epoch_id),
+        "wallet_totals_s": select(wallet.address, func.sum(entry.tickets), func.sum(entry.lovelace))
+        .join(wallet, wallet.id == entry.wallet_id)
+        .where(entry.epoch_id == epoch_id).group_by(wallet.address),
+    }
+
+
+def legacy_queries(epoch_id):
+    return {
+        "draw_scan_s": select(legacy.c.id, legacy.c.transaction_hash, legacy.c.wallet_address, legacy.c.tickets)
+        .where(legacy.c.epoch_id == epoch_id).order_by(legacy.c.transaction_hash),
+        "wallet_totals_s": select(legacy.c.wallet_address, func.sum(legacy.c.tickets), func.sum(legacy.c.ada_amount))
+        .where(legacy.c.epoch_id == epoch_id).group_by(legacy.c.wallet_address),
+    }
+
+
+def measure(entries, wallets, repeat):
+    epoch_id = datagen.seed(entries, 1, wallets)[0]
+    legacy_metadata.drop_all(bind=engine)
+    legacy_metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        copy_to_legacy(db)
+        db.commit()
+    with engine.connect() as conn:
+        conn.execute(text("ANALYZE"))
+        conn.commit()
+        result = {"entries": entries, "compact": sizes(conn, "raffle_entries"),
+                  "legacy": sizes(conn, "legacy_raffle_entries")}
+        result["compact"]["wallets_mb"] = sizes(conn, "wallets")["table_mb"]
+
+    asyncio.run(time_queries(result, epoch_id, repeat))
+    legacy_metadata.drop_all(bind=engine)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--wallets", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    results = []
+    for entries in args.entries:
+        result = measure(entries, args.wallets, args.repeat)
+        results.append(result)
+        print(json.dumps(result), flush=True)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Compare two benchmark suite reports scenario by scenario.
+
+Prints the change in throughput, p95 latency, statements per request and
+peak RSS, and exits non-zero if any scenario regressed by more than
+--threshold percent on throughput or p95:
+
+    python -m benchmarks.compare before.json after.json --threshold 15
+"""
+import argparse
+import json
+import sys
+
+# (metric, higher is better)
+METRICS = (("rps", True), ("p95_ms", False), ("queries_per_request", False), ("peak_rss_mb", False))
+GATED = ("rps", "p95_ms")
+
+
+def change(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def compare(before, after, threshold):
+    """Rows of (scenario, metric, old, new, percent change, regressed)"""
+    old_results = {result["scenario"]: result for result in before["scenarios"]}
+    rows = []
+    for result in after["scenarios"]:
+        old = old_results.get(result["scenario"])
+        if old is None:
+            continue
+        for metric, higher_is_better in METRICS:
+            delta = change(old.get(metric), result.get(metric))
+            worse = delta is not None and (-delta if higher_is_better else delta) > threshold
+            rows.append((result["scenario"], metric, old.get(metric), result.get(metric), delta,
+                         worse and metric in GATED))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10, help="Allowed regression, in percent")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    rows = compare(before, after, args.threshold)
+    for scenario, metric, old, new, delta, regressed in rows:
+        shown = f"{delta:+.1f}%" if delta is not None else "n/a"
+        print(f"{'REGRESSED' if regressed else '         '} {scenario:<28} {metric:<20} {old!s:>10} -> {new!s:<10} {shown}")
+    sys.exit(1 if any(row[-1] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Synthetic raffle data for benchmarks and plan checks.
+
+Lays out a run of back-to-back epochs: completed history (each with a
+winner), optionally some that have ended but not been drawn yet, and the
+open epoch last. Every epoch gets the same number of one-ticket entries
+from a fixed pool of wallets, and the epoch/wallet aggregates are rebuilt
+from them, so the database looks like one the app has been filling for a
+while. Writes through the blocking engine into DATABASE_URL:
+
+    python -m benchmarks.datagen --entries 100000 --epochs 10 --undrawn 1
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select, text
+
+from app import epochs, history, models, stats
+from app.database import engine, SessionLocal
+
+BATCH_SIZE = 10_000
+
+
+def wallet_address(i):
+    return f"addr1q{i:0>97}"
+
+
+def transaction_hash(i):
+    return f"{i:064x}"
+
+
+def reset():
+    """Drop and recreate every table"""
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+
+
+def epoch_rows(count, undrawn=0, now=None):
+    """`count` consecutive epochs; the last is open, the `undrawn` before it have just ended"""
+    now = now or datetime.utcnow()
+    # The open epoch started an hour ago so the ones before it have properly ended
+    start = now - timedelta(hours=1) - epochs.EPOCH_LENGTH * (count - 1)
+    rows = []
+    for i in range(count):
+        drawn = i < count - 1 - undrawn
+        rows.append({
+            "start_time": start + epochs.EPOCH_LENGTH * i,
+            "end_time": start + epochs.EPOCH_LENGTH * (i + 1),
+            "is_completed": drawn,
+            "winner_address": wallet_address(i) if drawn else None,
+        })
+    return rows
+
+
+def wallet_rows(wallets):
+    """The `wallets` sender addresses; wallet i gets id i + 1"""
+    return [{"id": i + 1, "address": wallet_address(i)} for i in range(wallets)]
+
+
+def entry_rows(epoch_ids, entries, wallets, first=0, now=None):
+    """`entries` one-ticket entries per epoch, cycling through `wallets` senders"""
+    now = now or datetime.utcnow()
+    i = first
+    for epoch_id in epoch_ids:
+        for _ in range(entries):
+            yield {
+                "wallet_id": i % wallets + 1,
+                "tx_hash": bytes.fromhex(transaction_hash(i)),
+                "lovelace": 5_000_000,
+                "epok_units": 1000,
+                "tickets": 1,
+                "created_at": now,
+                "epoch_id": epoch_id,
+            }
+            i += 1
+
+
+def rebuild_stats(db):
+    """Recompute the aggregates from the raw entries, then the history rollups from them"""
+    entry = models.RaffleEntry
+    db.execute(models.EpochStats.__table__.delete())
+    db.execute(models.WalletEpochStats.__table__.delete())
+    db.execute(
+        models.EpochStats.__table__.insert()
+        .from_select(["epoch_id", *stats.STAT_COLUMNS], stats._aggregate_select(entry.epoch_id))
+    )
+    db.execute(
+        models.WalletEpochStats.__table__.insert()
+        .from_select(["epoch_id", "wallet_address", *stats.STAT_COLUMNS],
+                     stats._aggregate_select(entry.epoch_id, models.Wallet.address))
+    )
+    for statement in history.rebuild_statements():
+        db.execute(statement)
+
+
+def seed(entries, epoch_count=1, wallets=5000, undrawn=0, analyze=False):
+    """Reset the database and fill `epoch_count` epochs with `entries` entries each.
+
+    Returns the epoch ids, oldest first; the last one is open.
+    """
+    reset()
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        db.execute(insert(models.RaffleEpoch), epoch_rows(epoch_count, undrawn, now))
+        db.execute(insert(models.Wallet), wallet_rows(wallets))
+        epoch_ids = db.scalars(select(models.RaffleEpoch.id).order_by(models.RaffleEpoch.end_time)).all()
+        batch = []
+        for row in entry_rows(epoch_ids, entries, wallets, now=now):
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                db.execute(insert(models.RaffleEntry), batch)
+                batch = []
+        if batch:
+            db.execute(insert(models.RaffleEntry), batch)
+        rebuild_stats(db)
+        db.commit()
+    if analyze:
+        with engine.connect() as conn:
+            conn.execute(text("ANALYZE"))
+            conn.commit()
+    return epoch_ids
+
+
+def next_transaction_index():
+    """First synthetic transaction number not used by the seeded entries"""
+    with SessionLocal() as db:
+        return db.scalar(select(func.count()).select_from(models.RaffleEntry))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=20000, help="Entries per epoch")
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--wallets", type=int, default=5000)
+    parser.add_argument("--undrawn", type=int, default=0, help="Ended epochs left for the draw")
+    parser.add_argument("--analyze", action="store_true", help="Refresh planner statistics afterwards")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    epoch_ids = seed(args.entries, args.epochs, args.wallets, args.undrawn, args.analyze)
+    print(json.dumps({
+        "epochs": epoch_ids,
+        "entries": args.entries * len(epoch_ids),
+        "seconds": round(time.perf_counter() - started, 2),
+    }))
+
+
+if __name__ == "__main__":
+    main()
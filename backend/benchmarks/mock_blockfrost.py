@@ -0,0 +1,209 @@
+"""Local stand-in for the Blockfrost API (and cardanocountdown's epoch API).
+
+Serves transactions, UTxOs and blocks from an in-memory store so the backend
+can be exercised without a project id or network access. Can inject 429s to
+exercise the client's retry and rate-limit handling. Transactions can be
+added over HTTP (POST /_mock/transactions) when the mock runs on its own:
+
+    uvicorn benchmarks.mock_blockfrost:app --port 8100
+    BLOCKFROST_BASE_URL=http://127.0.0.1:8100 EPOCH_INFO_URL=http://127.0.0.1:8100/api/epoch ...
+
+or in-process:
+
+    transport = httpx.ASGITransport(app=mock_blockfrost.create_app())
+    client = BlockfrostClient(base_url="http://mock", transport=transport)
+"""
+import os
+import time
+from fastapi import Body, FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse
+
+EPOCH_LENGTH_S = 5 * 24 * 3600
+
+# Shelley mainnet epoch 208 start; later epochs follow every 5 days
+SHELLEY_EPOCH = 208
+SHELLEY_START = 1_596_059_091
+SHELLEY_SLOT_OFFSET = 1_591_566_291
+
+
+class MockChain:
+    """In-memory transactions keyed by hash, plus per-address history"""
+
+    def __init__(self):
+        self.transactions = {}
+        self.utxos = {}
+        self.address_history = {}
+        self.blocks = {}
+        self.blocks_by_slot = {}
+        self.block_height = 10_000_000
+
+    def add_block(self, block_time=None, tx_count=0):
+        """Mint a block at `block_time` (one block per slot at most)"""
+        self.block_height += 1
+        block_time = int(block_time or time.time())
+        block = {
+            "hash": f"{self.block_height:064x}",
+            "height": self.block_height,
+            "time": block_time,
+            "slot": block_time - SHELLEY_SLOT_OFFSET,
+            "tx_count": tx_count,
+        }
+        self.blocks[block["hash"]] = block
+        self.blocks_by_slot[block["slot"]] = block
+        return block
+
+    def block_view(self, block):
+        return {**block, "confirmations": self.block_height - block["height"]}
+
+    def add_transaction(self, tx_hash, sender, outputs, block_time=None):
+        """Record a tx from `sender` paying `outputs` ([(address, [(unit, quantity)])])"""
+        block = self.add_block(block_time, tx_count=1)
+        block_time = block["time"]
+        self.transactions[tx_hash] = {
+            "hash": tx_hash,
+            "block": block["hash"],
+            "block_height": self.block_height,
+            "block_time": block_time,
+            "slot": block["slot"],
+            "index": 0,
+            "fees": "170000",
+        }
+        self.utxos[tx_hash] = {
+            "hash": tx_hash,
+            "inputs": [{
+                "address": sender,
+                "amount": [{"unit": "lovelace", "quantity": "100000000"}],
+                "tx_hash": f"{self.block_height - 1:064x}",
+                "output_index": 0,
+            }],
+            "outputs": [
+                {
+                    "address": address,
+                    "amount": [{"unit": unit, "quantity": str(quantity)} for unit, quantity in amounts],
+                    "output_index": index,
+                }
+                for index, (address, amounts) in enumerate(outputs)
+            ],
+        }
+        for address, _ in outputs:
+            self.address_history.setdefault(address, []).append({
+                "tx_hash": tx_hash,
+                "tx_index": 0,
+                "block_height": self.block_height,
+                "block_time": block_time,
+            })
+        return self.transactions[tx_hash]
+
+
+def create_app(chain: MockChain = None, rate_limit_every: int = None):
+    """Build the mock app; every `rate_limit_every`-th request gets a 429"""
+    chain = chain or MockChain()
+    if rate_limit_every is None:
+        rate_limit_every = int(os.getenv("MOCK_429_EVERY", "0"))
+    app = FastAPI(title="Mock Blockfrost")
+    app.state.chain = chain
+    app.state.requests = 0
+
+    @app.middleware("http")
+    async def inject_rate_limit(request, call_next):
+        app.state.requests += 1
+        if rate_limit_every and app.state.requests % rate_limit_every == 0:
+            return JSONResponse(
+                status_code=429,
+                content={"status_code": 429, "error": "Project Over Limit", "message": "Slow down"},
+                headers={"retry-after": "0"},
+            )
+        return await call_next(request)
+
+    @app.get("/txs/{tx_hash}")
+    async def transaction(tx_hash: str):
+        if tx_hash not in chain.transactions:
+            raise HTTPException(status_code=404, detail="The requested component has not been found.")
+        return chain.transactions[tx_hash]
+
+    @app.get("/txs/{tx_hash}/utxos")
+    async def transaction_utxos(tx_hash: str):
+        if tx_hash not in chain.utxos:
+            raise HTTPException(status_code=404, detail="The requested component has not been found.")
+        return chain.utxos[tx_hash]
+
+    @app.get("/addresses/{address}/transactions")
+    async def address_transactions(address: str, page: int = 1, count: int = 100, order: str = "asc",
+                                   from_: str = Query(None, alias="from")):
+        history = chain.address_history.get(address, [])
+        if from_:
+            height, _, index = from_.partition(":")
+            start = (int(height), int(index or 0))
+            history = [item for item in history if (item["block_height"], item["tx_index"]) >= start]
+        if order == "desc":
+            history = history[::-1]
+        return history[(page - 1) * count:page * count]
+
+    @app.get("/blocks/latest")
+    async def block_latest():
+        tip = chain.blocks.get(f"{chain.block_height:064x}")
+        if tip is not None:
+            return chain.block_view(tip)
+        return {
+            "hash": f"{chain.block_height:064x}",
+            "height": chain.block_height,
+            "time": int(time.time()),
+        }
+
+    def find_block(hash_or_number):
+        block = chain.blocks.get(hash_or_number)
+        if block is None and hash_or_number.isdigit():
+            block = next((b for b in chain.blocks.values() if b["height"] == int(hash_or_number)), None)
+        if block is None:
+            raise HTTPException(status_code=404, detail="The requested component has not been found.")
+        return block
+
+    @app.get("/blocks/slot/{slot}")
+    async def block_in_slot(slot: int):
+        if slot not in chain.blocks_by_slot:
+            raise HTTPException(status_code=404, detail="The requested component has not been found.")
+        return chain.block_view(chain.blocks_by_slot[slot])
+
+    @app.get("/blocks/{hash_or_number}")
+    async def block(hash_or_number: str):
+        return chain.block_view(find_block(hash_or_number))
+
+    @app.get("/blocks/{hash_or_number}/next")
+    async def blocks_next(hash_or_number: str, count: int = 100):
+        height = find_block(hash_or_number)["height"]
+        following = sorted((b for b in chain.blocks.values() if b["height"] > height), key=lambda b: b["height"])
+        return [chain.block_view(b) for b in following[:count]]
+
+    def current_epoch():
+        elapsed = int(time.time()) - SHELLEY_START
+        start_time = SHELLEY_START + elapsed - elapsed % EPOCH_LENGTH_S
+        return SHELLEY_EPOCH + elapsed // EPOCH_LENGTH_S, start_time
+
+    @app.get("/epochs/latest")
+    async def epoch_latest():
+        epoch, start_time = current_epoch()
+        return {
+            "epoch": epoch,
+            "start_time": start_time,
+            "end_time": start_time + EPOCH_LENGTH_S,
+            "block_count": 0,
+            "tx_count": len(chain.transactions),
+        }
+
+    @app.get("/api/epoch")
+    async def cardanocountdown_epoch():
+        """cardanocountdown.com's epoch endpoint; the app only reads `epoch`"""
+        epoch, start_time = current_epoch()
+        return {"epoch": epoch, "start": start_time, "end": start_time + EPOCH_LENGTH_S}
+
+    @app.post("/_mock/transactions")
+    async def add_transactions(transactions: list = Body(...)):
+        """Add [{tx_hash, sender, outputs: [[address, [[unit, quantity]]]]}] to the chain"""
+        for tx in transactions:
+            chain.add_transaction(tx["tx_hash"], tx["sender"], tx["outputs"], tx.get("block_time"))
+        return {"added": len(transactions), "block_height": chain.block_height}
+
+    return app
+
+
+app = create_app()
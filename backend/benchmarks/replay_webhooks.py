@@ -0,0 +1,132 @@
+"""Replay Blockfrost webhook deliveries against the API.
+
+Generates qualifying raffle transactions (5 ADA + 1000 EPOK to the raffle
+wallet), registers them with the mock chain so the backend can look them
+up, then fires them at /webhook (full payload) or /transaction-webhook
+(hash only, fetched back from Blockfrost) with the shared secret, and
+reports throughput and latency:
+
+    uvicorn benchmarks.mock_blockfrost:app --port 8100 &
+    python -m benchmarks.replay_webhooks --url http://127.0.0.1:8000 \\
+        --mock-url http://127.0.0.1:8100 --kind transaction --count 5000
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+import httpx
+
+from benchmarks.bench_polling import latency_summary
+
+ENTRY_LOVELACE = 5_000_000
+ENTRY_EPOK = 1000
+
+
+def entry_transactions(count, raffle_address, policy_id, first=0, wallets=5000, namespace="replay", bundles=1):
+    """Qualifying transactions in the shape MockChain.add_transaction takes, each paying `bundles` entries"""
+    return [
+        {
+            "tx_hash": hashlib.sha256(f"{namespace}:{i}".encode()).hexdigest(),
+            "sender": f"addr1q{namespace}{i % wallets:0>90}",
+            "outputs": [[raffle_address, [["lovelace", ENTRY_LOVELACE], [policy_id, ENTRY_EPOK]]]] * bundles,
+        }
+        for i in range(first, first + count)
+    ]
+
+
+def webhook_payload(tx):
+    """The /webhook body Blockfrost would deliver for `tx`"""
+    return {
+        "type": "transaction",
+        "payload": {
+            "hash": tx["tx_hash"],
+            "inputs": [{"address": tx["sender"]}],
+            "outputs": [
+                {
+                    "address": address,
+                    "amount": [{"unit": unit, "quantity": str(quantity)} for unit, quantity in amounts],
+                }
+                for address, amounts in tx["outputs"]
+            ],
+        },
+    }
+
+
+def deliveries(transactions, kind):
+    """(path, body) per transaction for the chosen webhook route"""
+    if kind == "webhook":
+        return [("/webhook", webhook_payload(tx)) for tx in transactions]
+    return [("/transaction-webhook", {"tx_hash": tx["tx_hash"]}) for tx in transactions]
+
+
+async def replay(client, requests, secret, concurrency):
+    """POST every (path, body) with `concurrency` senders; returns latencies, statuses and seconds taken"""
+    latencies, statuses = [], {}
+    pending = iter(requests)
+    headers = {"webhook-secret": secret or ""}
+
+    async def sender():
+        for path, body in pending:
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, json=body, headers=headers)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(sender() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+def summarize(latencies, statuses, seconds):
+    errors = sum(count for status, count in statuses.items() if not isinstance(status, int) or status >= 400)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "seconds": round(seconds, 3),
+        "rps": round(len(latencies) / seconds, 1) if seconds else None,
+        **latency_summary(latencies),
+    }
+
+
+async def run(url, mock_url, kind, count, concurrency, secret, raffle_address, policy_id, bundles=1):
+    transactions = entry_transactions(count, raffle_address, policy_id, namespace=f"replay{int(time.time())}",
+                                      bundles=bundles)
+    if kind == "transaction" and mock_url:
+        async with httpx.AsyncClient(base_url=mock_url, timeout=60) as mock:
+            response = await mock.post("/_mock/transactions", json=transactions)
+            response.raise_for_status()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        result = await replay(client, deliveries(transactions, kind), secret, concurrency)
+    return {"url": url, "kind": kind, "concurrency": concurrency, **summarize(*result)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--mock-url", help="Mock Blockfrost to register the transactions with")
+    parser.add_argument("--kind", choices=("webhook", "transaction"), default="webhook")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--bundles", type=int, default=1, help="Entry outputs per transaction")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--secret", default=os.getenv("BLOCKFROST_WEBHOOK_SECRET"))
+    parser.add_argument("--raffle-address", default=os.getenv("RAFFLE_WALLET_ADDRESS"))
+    parser.add_argument("--policy-id", default=os.getenv("EPOK_POLICY_ID"))
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, args.mock_url, args.kind, args.count, args.concurrency,
+                             args.secret, args.raffle_address, args.policy_id, args.bundles))
+    print(json.dumps(result))
+    return result
+
+
+if __name__ == "__main__":
+    main()
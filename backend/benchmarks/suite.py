@@ -0,0 +1,344 @@
+"""Benchmark suite covering every API route, for comparing commits.
+
+Seeds DATABASE_URL (it is reset) with synthetic epochs, then drives the app
+in-process through httpx's ASGI transport with Blockfrost and
+cardanocountdown served by the in-process mock, so runs need no network
+and every database statement can be counted. Scenarios:
+
+  read:<path>      concurrent polling of each GET route for --duration
+  ingest:webhook   a burst of /webhook deliveries, including the queue drain
+  ingest:transaction  a burst of /transaction-webhook deliveries (Blockfrost lookups)
+  events:fanout    one delivery to --subscribers open /api/events streams, repeated
+  ratelimit:middleware  the rate limiter's cost per request, apart from the app
+  draw             /draw-winner over each ended epoch holding --entries entries
+
+Each scenario reports throughput, p50/p95/p99 latency, database statements
+per request and the process' peak RSS so far, as one JSON document:
+
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.suite --output before.json
+    python -m benchmarks.compare before.json after.json
+
+This measures one worker; use bench_polling --serve for multi-worker HTTP load.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+# Fixed settings the scenarios depend on; read by the app modules at import
+SUITE_ENV = {
+    "SCHEDULER_ENABLED": "false",
+    "INDEXER_INTERVAL": "0",
+    "BLOCKFROST_RATE": "1000000",
+    "BLOCKFROST_BURST": "1000000",
+    # One client drives every scenario: keep the limiter in the path, never refusing
+    "RATE_LIMIT_RATE": "1000000",
+    "RATE_LIMIT_BURST": "1000000",
+}
+SUITE_DEFAULTS = {
+    "BLOCKFROST_WEBHOOK_SECRET": "bench-secret",
+    "RAFFLE_WALLET_ADDRESS": f"addr1qraffle{0:0>90}",
+    "EPOK_POLICY_ID": f"{0:056x}45504f4b",
+}
+
+READ_PATHS = [
+    "/",
+    "/api/current-epoch",
+    "/api/current-prize",
+    "/api/participants",
+    "/api/entries",
+    "/api/latest-winner",
+    "/api/history",
+    "/api/leaderboard",
+    f"/api/wallets/addr1q{0:0>97}",
+    "/entries",
+    "/tx-cache/stats",
+]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class QueryCounter:
+    """Counts statements sent to the database by the app's async engine"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+class Suite:
+    def __init__(self, args):
+        from app import main, database
+        from benchmarks import mock_blockfrost
+        self.args = args
+        self.app = main.app
+        self.chain = mock_blockfrost.MockChain()
+        self.mock = mock_blockfrost.create_app(self.chain, rate_limit_every=0)
+        self.queries = QueryCounter(database.async_engine)
+        self.results = []
+
+    def record(self, name, latencies, errors, seconds, queries, **extra):
+        from benchmarks.bench_polling import latency_summary
+        result = {
+            "scenario": name,
+            "requests": len(latencies),
+            "errors": errors,
+            "seconds": round(seconds, 3),
+            "rps": round(len(latencies) / seconds, 1) if seconds else None,
+            **latency_summary(latencies),
+            "queries_per_request": round(queries / len(latencies), 2) if latencies else None,
+            "peak_rss_mb": peak_rss_mb(),
+            **extra,
+        }
+        self.results.append(result)
+        print(json.dumps(result), file=sys.stderr)
+        return result
+
+    def use_mock_upstreams(self):
+        """Point the shared Blockfrost client and the epoch info provider at the mock"""
+        from app import blockfrost_client
+        from app.epoch_info import provider
+        transport = httpx.ASGITransport(app=self.mock)
+        blockfrost_client._client = blockfrost_client.BlockfrostClient(
+            project_id="bench", base_url="http://mock", transport=transport
+        )
+        provider.url = "http://mock/api/epoch"
+        provider.transport = transport
+
+    def mint_closing_blocks(self, epoch_ids):
+        """A block at each epoch's end, buried deep enough for the verifiable draw"""
+        from app import draw, models
+        from app.database import SessionLocal
+        with SessionLocal() as db:
+            for epoch_id in epoch_ids:
+                self.chain.add_block(draw.unix_time(db.get(models.RaffleEpoch, epoch_id).end_time))
+        for _ in range(draw.DRAW_MIN_CONFIRMATIONS + 5):
+            self.chain.add_block()
+
+    async def read(self, client, path):
+        from benchmarks.bench_polling import poll
+        latencies, errors = [], []
+        before = self.queries.count
+        started = time.perf_counter()
+        deadline = started + self.args.duration
+        await asyncio.gather(*(
+            poll(client, [path], deadline, latencies, errors) for _ in range(self.args.concurrency)
+        ))
+        seconds = time.perf_counter() - started
+        self.record(f"read:{path}", latencies, len(errors), seconds, self.queries.count - before)
+
+    async def ingest(self, client, kind):
+        from app import ingest
+        from benchmarks import replay_webhooks
+        transactions = replay_webhooks.entry_transactions(
+            self.args.burst, os.environ["RAFFLE_WALLET_ADDRESS"], os.environ["EPOK_POLICY_ID"],
+            namespace=kind
+        )
+        if kind == "transaction":
+            for tx in transactions:
+                self.chain.add_transaction(tx["tx_hash"], tx["sender"], tx["outputs"])
+
+        before = self.queries.count
+        latencies, statuses, seconds = await replay_webhooks.replay(
+            client, replay_webhooks.deliveries(transactions, kind),
+            os.environ["BLOCKFROST_WEBHOOK_SECRET"], self.args.concurrency
+        )
+        # Accepted /webhook entries are written by the queue; count the flush too
+        drain_started = time.perf_counter()
+        await ingest.queue.stop()
+        ingest.queue.start()
+        drain = time.perf_counter() - drain_started
+        summary = replay_webhooks.summarize(latencies, statuses, seconds)
+        self.record(f"ingest:{kind}", latencies, summary["errors"], seconds + drain,
+                    self.queries.count - before, statuses=summary["statuses"], drain_s=round(drain, 3))
+
+    async def events(self, epoch_id):
+        from app.events import broadcaster
+        streams = [broadcaster.stream() for _ in range(self.args.subscribers)]
+        for stream in streams:
+            await stream.__anext__()  # the retry hint; the stream is subscribed from here on
+
+        latencies, errors = [], 0
+
+        async def consume(stream):
+            nonlocal errors
+            for _ in range(self.args.messages):
+                frame = await stream.__anext__()
+                if not frame.startswith("event: prize"):
+                    errors += 1
+                    continue
+                data = json.loads(frame.split("data: ", 1)[1])
+                latencies.append(time.perf_counter() - data["sent"])
+
+        before = self.queries.count
+        started = time.perf_counter()
+        consumers = [asyncio.ensure_future(consume(stream)) for stream in streams]
+        for _ in range(self.args.messages):
+            broadcaster.deliver("prize", {"epoch_id": epoch_id, "sent": time.perf_counter()})
+            await asyncio.sleep(0)
+        await asyncio.gather(*consumers)
+        seconds = time.perf_counter() - started
+        for stream in streams:
+            await stream.aclose()
+        self.record("events:fanout", latencies, errors, seconds, self.queries.count - before,
+                    subscribers=self.args.subscribers)
+
+    async def rate_limit(self):
+        """Time the rate limit middleware around a bare ASGI endpoint, as `calls` clients of one route.
+
+        Reports the endpoint alone, the added cost of an accepted request and
+        the cost of refusing one, in microseconds.
+        """
+        from app import rate_limit
+        calls = self.args.limited_calls
+
+        async def endpoint(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        statuses = []
+
+        async def collect(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+
+        scopes = [
+            {"type": "http", "method": "GET", "path": "/api/participants", "root_path": "", "query_string": b"",
+             "headers": [(b"host", b"bench")], "client": (f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", 1)}
+            for i in range(calls)
+        ]
+
+        async def timed(app):
+            latencies = []
+            for scope in scopes:
+                start = time.perf_counter()
+                await app(scope, None, collect)
+                latencies.append(time.perf_counter() - start)
+            return latencies
+
+        with tempfile.TemporaryDirectory() as directory:
+            accepting = rate_limit.RateLimiter(os.path.join(directory, "accept"), rate=1e9, burst=10 ** 9)
+            refusing = rate_limit.RateLimiter(os.path.join(directory, "refuse"), rate=1e-9, burst=0)
+            bare = await timed(endpoint)
+            started = time.perf_counter()
+            limited = await timed(rate_limit.RateLimitMiddleware(endpoint, self.app.router, accepting))
+            seconds = time.perf_counter() - started
+            refused = await timed(rate_limit.RateLimitMiddleware(endpoint, self.app.router, refusing))
+            accepting.close()
+            refusing.close()
+
+        def mean_us(latencies):
+            return round(sum(latencies) / len(latencies) * 1e6, 2)
+
+        errors = statuses[calls:2 * calls].count(429) + statuses[2 * calls:].count(200)
+        self.record("ratelimit:middleware", limited, errors, seconds, 0, bare_us=mean_us(bare),
+                    overhead_us=round(mean_us(limited) - mean_us(bare), 2),
+                    refused_us=mean_us(refused))
+
+    async def draw(self, client, epoch_ids):
+        latencies, errors = [], 0
+        before = self.queries.count
+        started = time.perf_counter()
+        for epoch_id in epoch_ids:
+            start = time.perf_counter()
+            response = await client.post("/draw-winner", params={"epoch_id": epoch_id})
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code >= 400
+        seconds = time.perf_counter() - started
+        self.record("draw", latencies, errors, seconds, self.queries.count - before,
+                    entries_per_epoch=self.args.entries)
+
+    async def run(self, epoch_ids):
+        undrawn, current = epoch_ids[-1 - self.args.draws:-1], epoch_ids[-1]
+        self.use_mock_upstreams()
+        self.mint_closing_blocks(undrawn)
+        limits = httpx.Limits(max_connections=self.args.concurrency)
+        # Unhandled errors come back as 500s and count against the scenario
+        transport = httpx.ASGITransport(app=self.app, raise_app_exceptions=False)
+        async with self.app.router.lifespan_context(self.app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                         limits=limits, timeout=120) as client:
+                for path in READ_PATHS:
+                    await self.read(client, path)
+                await self.ingest(client, "webhook")
+                await self.ingest(client, "transaction")
+                await self.events(current)
+                await self.rate_limit()
+                await self.draw(client, undrawn)
+        return self.results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=20000, help="Entries per seeded epoch")
+    parser.add_argument("--epochs", type=int, default=5, help="Seeded epochs, including the open one")
+    parser.add_argument("--wallets", type=int, default=5000)
+    parser.add_argument("--draws", type=int, default=2, help="Ended epochs left for the draw scenario")
+    parser.add_argument("--duration", type=float, default=5, help="Seconds per read scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--burst", type=int, default=2000, help="Deliveries per ingestion scenario")
+    parser.add_argument("--subscribers", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--limited-calls", type=int, default=20000, help="Requests per rate limiter timing")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    if args.draws >= args.epochs:
+        parser.error("--draws must leave room for the open epoch")
+
+    os.environ.update(SUITE_ENV)
+    for name, value in SUITE_DEFAULTS.items():
+        os.environ.setdefault(name, value)
+
+    from benchmarks import datagen
+    started = time.perf_counter()
+    epoch_ids = datagen.seed(args.entries, args.epochs, args.wallets, undrawn=args.draws)
+    seed_s = time.perf_counter() - started
+
+    from app.database import async_engine
+    suite = Suite(args)
+    results = asyncio.run(suite.run(epoch_ids))
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "database": async_engine.dialect.name,
+        "config": {name: value for name, value in vars(args).items() if name != "output"},
+        "seed_s": round(seed_s, 2),
+        "scenarios": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import json
+import sys
+
+from sqlalchemy import select
+
+from app.database import AsyncSessionLocal
+from app import stats, indexer, blockfrost_client, draw, history, models, snapshot
+
+
+async def reconcile_stats(args):
+    async with AsyncSessionLocal() as db:
+        await stats.reconcile(db, epoch_id=args.epoch)
+        await history.rebuild(db)
+        await db.commit()
+    print(f"Rebuilt aggregates for {'epoch ' + str(args.epoch) if args.epoch else 'all epochs'}")
+
+
+async def backfill(args):
+    counters = await indexer.indexer.run_locked(max_pages=args.max_pages)
+    if counters is None:
+        print("Another backfill is already running")
+        return
+    await blockfrost_client.close_client()
+    print(f"Scanned {counters['transactions']} transactions, inserted {counters['inserted']} entries")
+
+
+async def verify_draw(args):
+    async with AsyncSessionLocal() as db:
+        epoch = await db.get(models.RaffleEpoch, args.epoch)
+        if epoch is None:
+            sys.exit(f"No epoch {args.epoch}")
+        epoch_snapshot = None
+        if args.snapshot:
+            epoch_snapshot = snapshot.store.get(args.epoch)
+            if epoch_snapshot is None:
+                sys.exit(f"No snapshot of epoch {args.epoch} in {snapshot.store.directory}")
+        report = await draw.verify_draw(db, epoch, check_chain=args.check_chain, snapshot=epoch_snapshot)
+    await blockfrost_client.close_client()
+    print(json.dumps(report, indent=2))
+    if not report["ok"]:
+        sys.exit(1)
+
+
+async def export_snapshot(args):
+    async with AsyncSessionLocal() as db:
+        query = select(models.RaffleEpoch).where(models.RaffleEpoch.is_completed == True)
+        if args.epoch:
+            query = query.where(models.RaffleEpoch.id == args.epoch)
+        completed = (await db.execute(query.order_by(models.RaffleEpoch.id))).scalars().all()
+        if args.epoch and not completed:
+            sys.exit(f"Epoch {args.epoch} is not closed")
+        failed = False
+        for epoch in completed:
+            path = await snapshot.store.export(db, epoch)
+            try:
+                path = await snapshot.store.publish(path, epoch)
+            except snapshot.SnapshotError as e:
+                print(e)
+                failed = True
+                continue
+            print(f"Epoch {epoch.id}: {path}")
+    if failed:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Epok Raffle management commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    reconcile = commands.add_parser("reconcile-stats", help="Rebuild epoch/wallet aggregates from raw entries, then the history rollups")
+    reconcile.add_argument("--epoch", type=int, help="Only rebuild this epoch id")
+    reconcile.set_defaults(func=reconcile_stats)
+
+    backfill_parser = commands.add_parser("backfill", help="Index raffle entries from the chain since the last checkpoint")
+    backfill_parser.add_argument("--max-pages", type=int, help="Stop after this many address pages")
+    backfill_parser.set_defaults(func=backfill)
+
+    verify = commands.add_parser("verify-draw", help="Replay a recorded draw and print the winner's Merkle proof")
+    verify.add_argument("--epoch", type=int, required=True)
+    verify.add_argument("--check-chain", action="store_true", help="Also check the closing block against Blockfrost")
+    verify.add_argument("--snapshot", action="store_true", help="Replay from the epoch's snapshot instead of the database")
+    verify.set_defaults(func=verify_draw)
+
+    export = commands.add_parser("export-snapshot", help="(Re)build columnar snapshots of closed epochs")
+    export.add_argument("--epoch", type=int, help="Only this epoch id (default: every closed epoch)")
+    export.set_defaults(func=export_snapshot)
+
+    args = parser.parse_args()
+    asyncio.run(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Shared test setup.
+
+Tests that need a database run against TEST_DATABASE_URL, never
+DATABASE_URL: they drop and recreate every table. Without it they use a
+throwaway SQLite file, and the Postgres-only tests are skipped. The
+environment must be set before anything imports app.config, which reads it
+once, so it is set here, at collection.
+"""
+import os
+import tempfile
+
+import pytest
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL", "")
+POSTGRES = TEST_DATABASE_URL.startswith(("postgresql://", "postgres://"))
+
+_scratch = tempfile.mkdtemp(prefix="epok-tests-")
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL or f"sqlite:///{_scratch}/test.db"
+os.environ["SCHEDULER_ENABLED"] = "false"
+os.environ["SNAPSHOT_DIR"] = os.path.join(_scratch, "snapshots")
+os.environ["RATE_LIMIT_FILE"] = os.path.join(_scratch, "rate-limit")
+os.environ["BLOCKFROST_WEBHOOK_SECRET"] = "test-secret"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def schema():
+    """Empty tables in the test database"""
+    from benchmarks import datagen
+    datagen.reset()
+
+
+@pytest.fixture
+async def db(schema):
+    """An async session on an empty test database"""
+    from app.database import AsyncSessionLocal, async_engine
+    async with AsyncSessionLocal() as session:
+        yield session
+    # Pooled connections belong to this test's event loop
+    await async_engine.dispose()
@@ -0,0 +1,168 @@
+"""The weighted draw: ticket lookup, seeded replay and its Merkle proofs."""
+import hashlib
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+from app import draw
+from app.merkle import EMPTY_ROOT, MerkleBuilder, leaf_hash, node_hash, path_ranges, verify_inclusion
+
+
+def entries(count, max_tickets=5):
+    """(entry_id, transaction hash, wallet, tickets) rows in draw order"""
+    rows = [(i + 1, hashlib.sha256(str(i).encode()).hexdigest(), f"addr{i % 7}", 1 + i * 7919 % max_tickets)
+            for i in range(count)]
+    return sorted(rows, key=lambda row: row[1])
+
+
+def replay(rows, seed):
+    replay = draw.DrawReplay(len(rows), sum(row[3] for row in rows), seed)
+    for row in rows:
+        replay.add(*row)
+    return replay.result()
+
+
+def test_ticket_index_maps_offsets_to_entries():
+    index = draw.TicketIndex.from_rows([(10, 2), (11, 0), (12, 3), (13, -1), (14, 1)])
+    assert len(index) == 3
+    assert index.total == 6
+    assert [index.locate(offset) for offset in range(6)] == [10, 10, 12, 12, 12, 14]
+    with pytest.raises(IndexError):
+        index.locate(6)
+
+
+def test_ticket_index_picks_in_proportion_to_tickets():
+    index = draw.TicketIndex.from_rows([(1, 1), (2, 3)])
+    rng = random.Random(7)
+    picks = [index.pick(rng) for _ in range(4000)]
+    assert 0.7 < picks.count(2) / len(picks) < 0.8
+    assert draw.TicketIndex().pick() is None
+
+
+def test_winning_offset_is_deterministic_and_in_range():
+    seed = draw.derive_seed(3, "ab" * 32)
+    assert seed == draw.derive_seed(3, "ab" * 32)
+    assert seed != draw.derive_seed(4, "ab" * 32)
+    for total in (1, 2, 17, 10 ** 9):
+        offset = draw.winning_offset(seed, total)
+        assert 0 <= offset < total
+        assert offset == draw.winning_offset(seed, total)
+
+
+def test_merkle_builder_matches_the_recursive_definition():
+    def reference(leaves):
+        if len(leaves) == 1:
+            return leaves[0]
+        k = 1 << (len(leaves) - 1).bit_length() - 1
+        return node_hash(reference(leaves[:k]), reference(leaves[k:]))
+
+    assert MerkleBuilder().root() == EMPTY_ROOT
+    for size in (1, 2, 3, 5, 8, 13):
+        leaves = [hashlib.sha256(bytes([i])).digest() for i in range(size)]
+        builder = MerkleBuilder()
+        for leaf in leaves:
+            builder.add(leaf)
+        assert builder.root() == reference(leaves)
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 7, 16, 33])
+def test_replay_proves_the_winner_included(count):
+    rows = entries(count)
+    for n in range(20):
+        result = replay(rows, draw.derive_seed(n, "cd" * 32))
+        index, (first, end) = result.winner_index, result.winner_range
+        entry_id, tx_hash, wallet, tickets = rows[index]
+        assert (result.winner_entry_id, result.winner_transaction_hash, result.winner_address) == \
+            (entry_id, tx_hash, wallet)
+        assert first <= result.offset < end and end - first == tickets
+        assert len(result.proof) == len(path_ranges(index, count))
+        assert verify_inclusion(index, count, leaf_hash(tx_hash, first, tickets),
+                                [bytes.fromhex(sibling) for sibling in result.proof],
+                                bytes.fromhex(result.merkle_root))
+
+
+def test_tampered_proofs_fail():
+    rows = entries(9)
+    result = replay(rows, draw.derive_seed(1, "ef" * 32))
+    first, end = result.winner_range
+    leaf = leaf_hash(result.winner_transaction_hash, first, end - first)
+    proof = [bytes.fromhex(sibling) for sibling in result.proof]
+    root = bytes.fromhex(result.merkle_root)
+    assert verify_inclusion(result.winner_index, 9, leaf, proof, root)
+    # Another ticket range, a reordered path, or the wrong position
+    assert not verify_inclusion(result.winner_index, 9, leaf_hash(result.winner_transaction_hash, first, end - first + 1),
+                                proof, root)
+    assert not verify_inclusion(result.winner_index, 9, leaf, proof[::-1], root)
+    assert not verify_inclusion((result.winner_index + 1) % 9, 9, leaf, proof, root)
+
+
+def test_replay_refuses_changed_entries():
+    rows = entries(5)
+    replay = draw.DrawReplay(len(rows) + 1, sum(row[3] for row in rows), b"\x00" * 32)
+    for row in rows:
+        replay.add(*row)
+    with pytest.raises(draw.DrawNotReady):
+        replay.result()
+
+
+@pytest.mark.anyio
+async def test_replay_draw_streams_the_database_in_hash_order(db):
+    from benchmarks import datagen
+    epoch_ids = datagen.seed(50, 2, 7)
+    seed = draw.derive_seed(epoch_ids[0], "12" * 32)
+    result = await draw.replay_draw(db, epoch_ids[0], seed, batch_size=8)
+
+    rows = sorted(
+        ((i + 1, datagen.transaction_hash(i), i % 7 + 1, 1) for i in range(50)), key=lambda row: row[1]
+    )
+    expected = replay(rows, seed)
+    assert (result.merkle_root, result.winner_transaction_hash, result.proof) == \
+        (expected.merkle_root, expected.winner_transaction_hash, expected.proof)
+    assert result.winner_address == datagen.wallet_address(expected.winner_address - 1)
+
+
+class FakeChain:
+    """Blockfrost's block lookups over blocks minted at `times`, from height `first`"""
+
+    def __init__(self, times, first=0):
+        self.blocks = [{"hash": f"{first + i:064x}", "height": first + i, "time": t} for i, t in enumerate(times)]
+        self.first = first
+        self.calls = 0
+
+    async def block(self, hash_or_number):
+        self.calls += 1
+        if hash_or_number == "latest":
+            return self.blocks[-1]
+        index = hash_or_number - self.first
+        if not 0 <= index < len(self.blocks):
+            raise draw.BlockfrostError(404, "The requested component has not been found.")
+        return self.blocks[index]
+
+
+def at(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("first", [0, 10_000_000])
+async def test_closing_block_is_the_last_one_by_the_end(first):
+    rng = random.Random(first)
+    times, now = [], 1_700_000_000
+    for _ in range(50_000):
+        now += rng.choice((1, 5, 20, 20, 40, 90))
+        times.append(now)
+    for end in (times[0], times[0] + 1, times[123], times[-2], times[-1] - 1, times[25_000] + 3):
+        chain = FakeChain(times, first)
+        block = await draw.closing_block(chain, at(end))
+        assert block["time"] <= end < chain.blocks[block["height"] - first + 1]["time"]
+        assert chain.calls <= 40
+
+
+@pytest.mark.anyio
+async def test_closing_block_waits_for_the_chain():
+    chain = FakeChain([100, 200, 300], first=5)
+    with pytest.raises(draw.DrawNotReady):
+        await draw.closing_block(chain, at(300))
+    with pytest.raises(draw.DrawNotReady):
+        await draw.closing_block(chain, at(99))
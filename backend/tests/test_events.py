@@ -0,0 +1,59 @@
+"""Publishing raffle events through NOTIFY."""
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app import events
+from app.events import Broadcaster
+from conftest import POSTGRES
+
+
+class NotifyRecorder:
+    """Stands in for a session, keeping the payload of each pg_notify"""
+
+    def __init__(self):
+        self.payloads = []
+
+    async def execute(self, statement):
+        channel, payload = statement.compile().params.values()
+        self.payloads.append(payload)
+
+
+def notifying_broadcaster():
+    return Broadcaster(engine=SimpleNamespace(dialect=SimpleNamespace(name="postgresql")))
+
+
+def entry_rows(count, address_length=103):
+    return [{"epoch_id": 1, "wallet_address": "addr1" + "x" * (address_length - 5), "tickets": 10 ** 6,
+             "lovelace": 5 * 10 ** 12, "epok_units": 10 ** 12, "transaction_hash": f"{i:064x}"} for i in range(count)]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("address_length", [58, 103, 400])
+async def test_entries_are_packed_under_the_notify_limit(address_length):
+    db = NotifyRecorder()
+    await notifying_broadcaster().publish_entries(db, entry_rows(500, address_length))
+    assert all(len(payload) <= events.NOTIFY_MAX_BYTES for payload in db.payloads)
+    messages = [json.loads(payload) for payload in db.payloads]
+    assert {message["event"] for message in messages} == {"entries"}
+    published = [entry["transaction_hash"] for message in messages for entry in message["data"]]
+    assert published == [row["transaction_hash"] for row in entry_rows(500)]
+    # Packed full: each chunk ends where the next entry wouldn't have fit
+    for current, following in zip(messages, messages[1:]):
+        assert len(events.notify_payload("entries", current["data"] + following["data"][:1])) > \
+            events.NOTIFY_MAX_BYTES
+
+
+@pytest.mark.anyio
+async def test_oversized_events_become_a_resync():
+    db = NotifyRecorder()
+    await notifying_broadcaster().publish(db, "winner", {"proof": ["ab" * 32] * 200})
+    assert [json.loads(payload) for payload in db.payloads] == [{"event": "resync", "data": {}}]
+
+
+@pytest.mark.anyio
+@pytest.mark.skipif(not POSTGRES, reason="TEST_DATABASE_URL is not a Postgres URL")
+async def test_postgres_accepts_the_packed_payloads(db):
+    await events.broadcaster.publish_entries(db, entry_rows(300))
+    await db.commit()
@@ -0,0 +1,45 @@
+"""Keyset pages over an epoch's entries."""
+import pytest
+from sqlalchemy import insert
+
+from app import models, pagination
+from benchmarks import datagen
+
+
+async def walk(db, epoch_id, fields, limit, cursor=None):
+    pages = []
+    while True:
+        rows, cursor = await pagination.get_page(db, epoch_id, fields, cursor, limit)
+        pages.append(rows)
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.anyio
+async def test_pages_cover_the_epoch_once_in_insert_order(db):
+    first, second = datagen.seed(25, 2, 7)
+    pages = await walk(db, second, pagination.PARTICIPANT_FIELDS, 10)
+    assert [len(page) for page in pages] == [10, 10, 5]
+    rows = [row for page in pages for row in page]
+    assert [row["transaction_hash"] for row in rows] == [datagen.transaction_hash(i) for i in range(25, 50)]
+    assert rows[0] == {
+        "wallet_address": datagen.wallet_address(25 % 7),
+        "tickets": 1,
+        "ada_amount": 5.0,
+        "epok_amount": 1000,
+        "transaction_hash": datagen.transaction_hash(25),
+        "created_at": rows[0]["created_at"],
+    }
+    # A page exactly at the end has no next cursor
+    assert [len(page) for page in await walk(db, first, pagination.ENTRY_FIELDS, 5)] == [5] * 5
+    assert await pagination.get_page(db, 99, pagination.ENTRY_FIELDS) == ([], None)
+
+
+@pytest.mark.anyio
+async def test_entries_arriving_between_pages_come_after_the_cursor(db):
+    (epoch_id,) = datagen.seed(6, 1, 3)
+    rows, cursor = await pagination.get_page(db, epoch_id, ("transaction_hash",), limit=4)
+    await db.execute(insert(models.RaffleEntry), list(datagen.entry_rows([epoch_id], 2, 3, first=6)))
+    await db.commit()
+    rest = [row for page in await walk(db, epoch_id, ("transaction_hash",), 4, cursor) for row in page]
+    assert [row["transaction_hash"] for row in rows + rest] == [datagen.transaction_hash(i) for i in range(8)]
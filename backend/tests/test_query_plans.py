@@ -0,0 +1,37 @@
+"""Every hot query reads its table through the index meant for it.
+
+Seeds a dataset large enough that the planner prefers a sequential scan
+whenever the index is unusable, then checks the plans with
+benchmarks.check_query_plans. Postgres only, as that is what production
+plans with:
+
+    TEST_DATABASE_URL=postgresql://localhost/epok_test python -m pytest
+"""
+import json
+
+import pytest
+
+from app.database import engine
+from benchmarks import check_query_plans
+from conftest import POSTGRES
+
+pytestmark = pytest.mark.skipif(not POSTGRES, reason="TEST_DATABASE_URL is not a Postgres URL")
+
+ENTRIES = 100_000
+EPOCHS = 20
+WALLETS = 5000
+
+
+@pytest.fixture(scope="module")
+def epoch_id():
+    return check_query_plans.seed(ENTRIES, EPOCHS, WALLETS)
+
+
+@pytest.mark.parametrize("name", [query[0] for query in check_query_plans.hot_queries(0)])
+def test_hot_query_uses_index(epoch_id, name):
+    queries = {query[0]: query[1:] for query in check_query_plans.hot_queries(epoch_id)}
+    statement, table, expected = queries[name]
+    with engine.connect() as conn:
+        ok, scans, indexes, plan = check_query_plans.uses_index(conn, statement, table, expected)
+    assert ok, (f"{name}: expected {expected} on {table}, got indexes={sorted(indexes)} "
+                f"scans={sorted(scans)}\n{json.dumps(plan, indent=2, default=str)}")
@@ -0,0 +1,105 @@
+"""Shared token buckets and the checks the middleware makes before the app runs."""
+import httpx
+import pytest
+
+from app import rate_limit
+from app.rate_limit import RateLimiter, RateLimitMiddleware
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "time", clock)
+    return clock
+
+
+def test_bucket_allows_a_burst_then_refills(tmp_path, clock):
+    limiter = RateLimiter(str(tmp_path / "buckets"), rate=2, burst=3)
+    assert [limiter.take(b"a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.take(b"a") == pytest.approx(0.5)
+    # Other keys have their own bucket
+    assert limiter.take(b"b") == 0.0
+    clock.now += 0.5
+    assert limiter.take(b"a") == 0.0
+    assert limiter.take(b"a") > 0
+    clock.now += 60
+    assert [limiter.take(b"a") for _ in range(4)].count(0.0) == 3
+
+
+def test_processes_share_buckets_through_the_file(tmp_path, clock):
+    path = str(tmp_path / "buckets")
+    first, second = RateLimiter(path, rate=1, burst=2), RateLimiter(path, rate=1, burst=2)
+    assert first.take(b"client") == 0.0
+    assert second.take(b"client") == 0.0
+    assert first.take(b"client") > 0
+    assert second.take(b"client") > 0
+    first.close()
+    second.close()
+
+
+def test_full_set_evicts_the_least_recently_used_key(tmp_path, clock):
+    # One set of 4 ways: a fifth key replaces the stalest
+    limiter = RateLimiter(str(tmp_path / "buckets"), rate=0.001, burst=1, slots=4)
+    for key in (b"k0", b"k1", b"k2", b"k3"):
+        assert limiter.take(key) == 0.0
+        clock.now += 1
+    assert limiter.take(b"k1") > 0
+    clock.now += 1
+    assert limiter.take(b"k4") == 0.0
+    # k0 was evicted, so it starts with a full bucket again; k1 was not
+    assert limiter.take(b"k0") == 0.0
+    assert limiter.take(b"k1") > 0
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def client(app, peer="10.0.0.1"):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=(peer, 1234)), base_url="http://t")
+
+
+@pytest.mark.anyio
+async def test_middleware_refuses_clients_over_their_rate(tmp_path, clock):
+    app = RateLimitMiddleware(ok_app, limiter=RateLimiter(str(tmp_path / "buckets"), rate=0.5, burst=2))
+    async with client(app) as c:
+        statuses = [(await c.get("/api/leaderboard")).status_code for _ in range(3)]
+        refused = await c.get("/api/leaderboard")
+        scraped = [(await c.get("/metrics")).status_code for _ in range(3)]
+    async with client(app, peer="10.0.0.2") as other:
+        assert (await other.get("/api/leaderboard")).status_code == 200
+    assert statuses == [200, 200, 429]
+    assert refused.headers["retry-after"] == "2"
+    assert scraped == [200, 200, 200]
+
+
+@pytest.mark.anyio
+async def test_middleware_takes_the_client_from_our_proxies_entry(tmp_path, clock):
+    app = RateLimitMiddleware(ok_app, limiter=RateLimiter(str(tmp_path / "buckets"), rate=0.001, burst=1),
+                              proxy_hops=1)
+    async with client(app, peer="10.9.9.9") as router:
+        first = await router.get("/", headers={"x-forwarded-for": "203.0.113.7"})
+        other = await router.get("/", headers={"x-forwarded-for": "198.51.100.9"})
+        # Whatever the client puts before the router's entry doesn't change its bucket
+        forged = await router.get("/", headers={"x-forwarded-for": "1.2.3.4, 203.0.113.7"})
+    assert (first.status_code, other.status_code, forged.status_code) == (200, 200, 429)
+
+
+@pytest.mark.anyio
+async def test_middleware_refuses_large_bodies_and_wrong_webhook_secrets(tmp_path, clock):
+    app = RateLimitMiddleware(ok_app, limiter=RateLimiter(str(tmp_path / "buckets"), rate=1, burst=100),
+                              max_body_bytes=10)
+    async with client(app) as c:
+        assert (await c.post("/api/anything", content=b"x" * 11)).status_code == 413
+        assert (await c.post("/webhook", content=b"{}", headers={"webhook-secret": "wrong"})).status_code == 401
+        assert (await c.post("/webhook", content=b"{}")).status_code == 401
+        assert (await c.post("/webhook", content=b"{}", headers={"webhook-secret": "test-secret"})).status_code == 200
@@ -0,0 +1,85 @@
+"""Cached read responses: hits skip the endpoint, revalidations get 304."""
+import httpx
+import pytest
+
+from app.response_cache import ResponseCache, ResponseCacheMiddleware
+
+
+class Endpoint:
+    """An ASGI app answering with a body that changes on every call"""
+
+    def __init__(self, status=200):
+        self.calls = 0
+        self.status = status
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        await send({"type": "http.response.start", "status": self.status,
+                    "headers": [(b"content-type", b"application/json"), (b"x-private", b"1")]})
+        await send({"type": "http.response.body", "body": b'{"call": %d}' % self.calls})
+
+
+def client(app):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t")
+
+
+@pytest.mark.anyio
+async def test_hits_skip_the_endpoint_until_a_bump():
+    endpoint, cache = Endpoint(), ResponseCache()
+    async with client(ResponseCacheMiddleware(endpoint, cache)) as c:
+        first = await c.get("/api/leaderboard")
+        second = await c.get("/api/leaderboard")
+        assert endpoint.calls == 1
+        assert first.content == second.content == b'{"call": 1}'
+        assert first.headers["etag"] == second.headers["etag"]
+        assert "x-private" not in second.headers
+
+        # A different query string is a different response
+        await c.get("/api/leaderboard", params={"limit": 5})
+        assert endpoint.calls == 2
+
+        cache.on_event("winner", {})
+        third = await c.get("/api/leaderboard")
+    assert endpoint.calls == 3
+    assert third.content == b'{"call": 3}'
+    assert third.headers["etag"] != first.headers["etag"]
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.anyio
+async def test_revalidation_answers_304():
+    endpoint = Endpoint()
+    async with client(ResponseCacheMiddleware(endpoint, ResponseCache())) as c:
+        fresh = await c.get("/api/latest-winner")
+        etag, modified = fresh.headers["etag"], fresh.headers["last-modified"]
+        assert (await c.get("/api/latest-winner", headers={"if-none-match": etag})).status_code == 304
+        assert (await c.get("/api/latest-winner", headers={"if-none-match": f'W/{etag}, "x"'})).status_code == 304
+        assert (await c.get("/api/latest-winner", headers={"if-none-match": '"stale"'})).status_code == 200
+        assert (await c.get("/api/latest-winner", headers={"if-modified-since": modified})).status_code == 304
+        assert (await c.get("/api/latest-winner",
+                            headers={"if-modified-since": "Mon, 01 Jan 2001 00:00:00 GMT"})).status_code == 200
+    assert endpoint.calls == 1
+
+
+@pytest.mark.anyio
+async def test_errors_and_other_routes_are_not_cached():
+    failing, other = Endpoint(status=500), Endpoint()
+    async with client(ResponseCacheMiddleware(failing, ResponseCache())) as c:
+        assert (await c.get("/api/leaderboard")).status_code == 500
+        assert (await c.get("/api/leaderboard")).status_code == 500
+    async with client(ResponseCacheMiddleware(other, ResponseCache())) as c:
+        await c.get("/api/history")
+        await c.get("/api/history")
+        await c.get("/api/leaderboard", params={"format": "ndjson"})
+    assert (failing.calls, other.calls) == (2, 3)
+
+
+def test_cache_is_bounded_by_bytes():
+    from app.response_cache import CachedResponse
+    cache = ResponseCache(maxsize=10, max_bytes=100)
+    for i in range(5):
+        cache.put(("/api/leaderboard", str(i).encode(), None, 0, 0), CachedResponse(b"x" * 40, [], 0))
+    assert cache.stats()["size"] == 2
+    assert cache.stats()["bytes"] == 80
+    cache.put(("big",), CachedResponse(b"x" * 101, [], 0))
+    assert cache.get(("big",)) is None
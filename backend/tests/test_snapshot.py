@@ -0,0 +1,70 @@
+"""Epoch snapshots: export, publish, rebuild on a miss, and the archive routes."""
+import asyncio
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from app import draw, main, models, snapshot
+from app.database import AsyncSessionLocal
+from benchmarks import datagen
+
+SEED = bytes(range(32))
+
+
+@pytest.mark.anyio
+async def test_export_publish_and_replay(db, tmp_path):
+    closed, current = datagen.seed(40, 2, 6)
+    store = snapshot.SnapshotStore(str(tmp_path))
+    epoch = await db.get(models.RaffleEpoch, closed)
+    path = await store.export(db, epoch, batch_size=7)
+    assert store.get(closed) is None
+    assert await store.publish(path, epoch) == store.path(closed)
+    assert os.listdir(tmp_path) == [os.path.basename(store.path(closed))]
+
+    published = await store.load(closed)
+    assert published is store.get(closed)
+    assert published.stats()["entry_count"] == 40
+    assert published.stats()["total_ada"] == 40 * 5.0
+    from_db = await draw.replay_draw(db, closed, SEED)
+    from_snapshot = draw.replay_snapshot(published, SEED)
+    assert (from_snapshot.merkle_root, from_snapshot.winner_transaction_hash, from_snapshot.proof) == \
+        (from_db.merkle_root, from_db.winner_transaction_hash, from_db.proof)
+
+
+@pytest.mark.anyio
+async def test_concurrent_misses_share_one_rebuild(db, tmp_path, monkeypatch):
+    closed, current = datagen.seed(20, 2, 4)
+    store = snapshot.SnapshotStore(str(tmp_path))
+    exports = []
+    export = store.export
+
+    async def counted(db, epoch, **kwargs):
+        exports.append(epoch.id)
+        return await export(db, epoch, **kwargs)
+
+    async def request():
+        # Each request has its own session
+        async with AsyncSessionLocal() as session:
+            return await store.ensure(session, closed)
+
+    monkeypatch.setattr(store, "export", counted)
+    snapshots = await asyncio.gather(*(request() for _ in range(3)))
+    assert exports == [closed]
+    assert len({id(found) for found in snapshots}) == 1 and len(snapshots[0]) == 20
+    # The open epoch has no snapshot
+    assert await store.ensure(db, current) is None
+
+
+@pytest.mark.anyio
+async def test_archive_routes_say_when_snapshots_are_disabled(db, tmp_path, monkeypatch):
+    closed, current = datagen.seed(5, 2, 2)
+    monkeypatch.setattr(snapshot.store, "directory", str(tmp_path))
+    with pytest.raises(HTTPException) as missing:
+        await main.closed_epoch_snapshot(current, db)
+    assert missing.value.status_code == 404
+
+    monkeypatch.setattr(snapshot, "SNAPSHOT_ENABLED", False)
+    with pytest.raises(HTTPException) as disabled:
+        await main.closed_epoch_snapshot(closed, db)
+    assert disabled.value.status_code == 503
@@ -0,0 +1,25 @@
+"""Running totals kept alongside entry inserts."""
+import pytest
+
+from app import ingest, stats
+from benchmarks import datagen
+
+
+@pytest.mark.anyio
+async def test_totals_stay_exact_and_match_a_rebuild(db):
+    (epoch_id,) = datagen.seed(0, 1, 2)
+    # Ten 0.1 ADA entries, which don't sum to 1 in floating point
+    rows = [{"wallet_address": datagen.wallet_address(i % 2), "transaction_hash": f"{i + 1:064x}",
+             "lovelace": 100_000, "epok_units": 3, "tickets": 1, "epoch_id": epoch_id} for i in range(10)]
+    for row in rows:
+        await ingest.insert_entries(db, [row])
+    await db.commit()
+
+    totals = await stats.get_epoch_stats(db, epoch_id)
+    assert totals == {"total_lovelace": 1_000_000, "total_epok_units": 30, "total_tickets": 10, "entry_count": 10}
+    assert stats.stats_fields(totals) == {"total_ada": 1.0, "total_epok": 30, "total_tickets": 10, "entry_count": 10}
+    assert await stats.get_wallet_stats(db, epoch_id, datagen.wallet_address(0)) == \
+        {"total_lovelace": 500_000, "total_epok_units": 15, "total_tickets": 5, "entry_count": 5}
+
+    await stats.reconcile(db, epoch_id)
+    assert await stats.get_epoch_stats(db, epoch_id) == totals
@@ -0,0 +1,26 @@
+"""Entry rules against recorded transactions.
+
+fixtures/entry_transactions.json holds Blockfrost /txs/{hash}/utxos
+responses, each with the entry it should produce and optionally its own
+rule overrides.
+"""
+import dataclasses
+import json
+import os
+
+import pytest
+
+from app import validation
+
+with open(os.path.join(os.path.dirname(__file__), "fixtures", "entry_transactions.json")) as f:
+    FIXTURES = json.load(f)
+RULES = validation.EntryRules(**FIXTURES["rules"])
+
+
+@pytest.mark.parametrize("case", FIXTURES["transactions"], ids=lambda case: case["name"])
+def test_recorded_transaction(case):
+    rules = dataclasses.replace(RULES, **case.get("rules", {}))
+    result = dataclasses.asdict(validation.evaluate(case["tx"], rules))
+    assert {key: result[key] for key in case["expected"]} == case["expected"]
+    assert (result["reason"] is None) == (result["tickets"] > 0)
+
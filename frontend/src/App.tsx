@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useCallback, useEffect, useRef, useState } from 'react';
 import { ThemeProvider, createTheme } from '@mui/material/styles';
 import { 
   CssBaseline, 
@@ -11,9 +11,9 @@ import {
   Box
 } from '@mui/material';
 import RaffleInfo from './components/RaffleInfo';
-import ParticipantList from './components/ParticipantList';
-import axios from 'axios';
-import { API_URL } from './config';
+import ParticipantList, { Participant } from './components/ParticipantList';
+import { fetchPage } from './api';
+import { EntryEvent, subscribeToRaffleEvents } from './events';
 
 const theme = createTheme({
   palette: {
@@ -89,14 +89,13 @@ const theme = createTheme({
 });
 
 interface ParticipantsData {
-  participants: {
-    wallet_address: string;
-    entry_time: string;
-    ada_amount: number;
-    epok_amount: number;
-    tickets: number;
-  }[];
+  // The epoch listed (null when none is open)
+  epoch_id: number | null;
+  // The pages loaded so far, oldest entry first
+  participants: Participant[];
+  // Tickets in the whole epoch, not just the loaded pages
   total_entries: number;
+  next_cursor: number | null;
 }
 
 interface EpochData {
@@ -157,20 +156,58 @@ function calculateEpochInfo(): EpochData {
 function App() {
   const [epochData, setEpochData] = useState<EpochData>(calculateEpochInfo());
   const [participants, setParticipants] = useState<ParticipantsData>({ 
+    epoch_id: null,
     participants: [], 
-    total_entries: 0 
+    total_entries: 0,
+    next_cursor: null
   });
+  const [loadingMore, setLoadingMore] = useState(false);
+  // The epoch on screen, for the event handlers; events for any other epoch
+  // mean it has rolled over
+  const epochRef = useRef<number | null>(null);
 
-  useEffect(() => {
-    const fetchData = async () => {
-      try {
-        const participantsResponse = await axios.get(`${API_URL}/api/participants`);
-        setParticipants(participantsResponse.data);
-      } catch (error) {
-        console.error('Error fetching data:', error);
+  const fetchData = useCallback(async () => {
+    try {
+      const page = await fetchPage<Participant>('/api/participants', 'participants');
+      epochRef.current = page.body.epoch_id;
+      setParticipants({
+        epoch_id: page.body.epoch_id,
+        participants: page.items,
+        total_entries: page.body.total_entries,
+        next_cursor: page.nextCursor
+      });
+    } catch (error) {
+      console.error('Error fetching data:', error);
+    }
+  }, []);
+
+  // Further pages are fetched on demand, continuing from the last one loaded
+  const loadMore = async () => {
+    if (participants.next_cursor === null) {
+      return;
+    }
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage<Participant>('/api/participants', 'participants', participants.next_cursor);
+      if (page.body.epoch_id !== epochRef.current) {
+        // The cursor belongs to an epoch that has ended; start over on the new one
+        await fetchData();
+        return;
       }
-    };
+      setParticipants((current) => ({
+        ...current,
+        participants: [...current.participants, ...page.items],
+        total_entries: page.body.total_entries,
+        next_cursor: page.nextCursor
+      }));
+    } catch (error) {
+      console.error('Error loading participants:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
+  useEffect(() => {
     fetchData();
     
     // Update epoch data every second
@@ -178,14 +215,61 @@ function App() {
       setEpochData(calculateEpochInfo());
     }, 1000);
 
-    // Fetch other data every 30 seconds
-    const dataInterval = setInterval(fetchData, 30000);
+    const appendEntries = (entries: EntryEvent[]) => setParticipants((current) => {
+      // New entries come after every page; while pages are left to load they
+      // arrive with the last one instead
+      if (current.next_cursor !== null) {
+        return current;
+      }
+      const listed = new Set(current.participants.map((participant) => participant.transaction_hash));
+      return {
+        ...current,
+        participants: [
+          ...current.participants,
+          ...entries
+            .filter((entry) => !listed.has(entry.transaction_hash))
+            .map((entry) => ({
+              wallet_address: entry.wallet_address,
+              created_at: entry.created_at,
+              ada_amount: entry.ada_amount,
+              epok_amount: entry.epok_amount,
+              tickets: entry.tickets,
+              transaction_hash: entry.transaction_hash
+            }))
+        ]
+      };
+    });
+
+    // Live updates are pushed by the server instead of polling
+    const unsubscribe = subscribeToRaffleEvents({
+      entries: (entries) => {
+        const shown = entries.filter((entry) => entry.epoch_id === epochRef.current);
+        if (shown.length < entries.length) {
+          fetchData();
+        } else {
+          appendEntries(shown);
+        }
+      },
+      prize: (prize) => {
+        if (prize.epoch_id !== epochRef.current) {
+          fetchData();
+          return;
+        }
+        setParticipants((current) => ({
+          ...current,
+          total_entries: prize.total_tickets
+        }));
+      },
+      // A draw closes the epoch; load the next one's participants
+      winner: fetchData,
+      resync: fetchData
+    });
     
     return () => {
       clearInterval(epochInterval);
-      clearInterval(dataInterval);
+      unsubscribe();
     };
-  }, []);
+  }, [fetchData]);
 
   return (
     <ThemeProvider theme={theme}>
@@ -214,7 +298,13 @@ function App() {
                 <Typography variant="h6" gutterBottom>
                   Participants
                 </Typography>
-                <ParticipantList participants={participants.participants} />
+                <ParticipantList
+                  participants={participants.participants}
+                  totalEntries={participants.total_entries}
+                  hasMore={participants.next_cursor !== null}
+                  loadingMore={loadingMore}
+                  onLoadMore={loadMore}
+                />
               </Paper>
             </Grid>
           </Grid>
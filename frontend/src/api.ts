@@ -0,0 +1,51 @@
+import axios from 'axios';
+import { API_URL } from './config';
+
+// Largest page the listing endpoints serve (pagination.MAX_PAGE_SIZE on the backend)
+export const MAX_PAGE_SIZE = 1000;
+
+export interface Page<T> {
+  items: T[];
+  // Pass back as `cursor` for the next page; null on the last page
+  nextCursor: number | null;
+  // The whole response body, for fields other than the listing (e.g. total_entries)
+  body: any;
+}
+
+// One page of a keyset-paginated listing such as /api/participants
+export async function fetchPage<T>(
+  path: string,
+  key: string,
+  cursor: number | null = null,
+  limit?: number
+): Promise<Page<T>> {
+  const params: Record<string, number> = {};
+  if (cursor !== null) {
+    params.cursor = cursor;
+  }
+  if (limit !== undefined) {
+    params.limit = limit;
+  }
+  const response = await axios.get(`${API_URL}${path}`, { params });
+  return {
+    items: response.data[key] || [],
+    nextCursor: response.data.next_cursor ?? null,
+    body: response.data
+  };
+}
+
+// Every row of a listing, following next_cursor to the last page. Listings
+// are of the current epoch, so if it rolls over on the way, start again.
+export async function fetchAllPages<T>(path: string, key: string, limit: number = MAX_PAGE_SIZE): Promise<Page<T>> {
+  let page = await fetchPage<T>(path, key, null, limit);
+  const epochId = page.body.epoch_id;
+  const items = [...page.items];
+  while (page.nextCursor !== null) {
+    page = await fetchPage<T>(path, key, page.nextCursor, limit);
+    if (page.body.epoch_id !== epochId) {
+      return fetchAllPages<T>(path, key, limit);
+    }
+    items.push(...page.items);
+  }
+  return { ...page, items };
+}
@@ -10,26 +10,39 @@ import {
   Box,
   Chip,
   Paper,
+  Button,
   useTheme,
   useMediaQuery
 } from '@mui/material';
 
-interface Participant {
+// One row of /api/participants
+export interface Participant {
   wallet_address: string;
-  entry_time: string;
+  created_at: string;
   ada_amount: number;
   epok_amount: number;
   tickets: number;
+  transaction_hash: string;
 }
 
 interface ParticipantListProps {
   participants: Participant[];
+  // Tickets in the whole epoch; `participants` may be only its first pages
+  totalEntries: number;
+  hasMore: boolean;
+  loadingMore: boolean;
+  onLoadMore: () => void;
 }
 
-const ParticipantList: React.FC<ParticipantListProps> = ({ participants }) => {
+const ParticipantList: React.FC<ParticipantListProps> = ({
+  participants,
+  totalEntries,
+  hasMore,
+  loadingMore,
+  onLoadMore
+}) => {
   const theme = useTheme();
   const isMobile = useMediaQuery(theme.breakpoints.down('sm'));
-  const totalTickets = participants?.reduce((sum, p) => sum + p.tickets, 0) || 0;
   
   const formatAddress = (address: string) => 
     `${address.slice(0, 8)}...${address.slice(-8)}`;
@@ -65,7 +78,7 @@ const ParticipantList: React.FC<ParticipantListProps> = ({ participants }) => {
           Total Entries:
         </Typography>
         <Chip 
-          label={totalTickets}
+          label={totalEntries}
           color="primary"
           sx={{ 
             fontSize: '1.1rem',
@@ -92,9 +105,9 @@ const ParticipantList: React.FC<ParticipantListProps> = ({ participants }) => {
             </TableRow>
           </TableHead>
           <TableBody>
-            {participants.map((participant, index) => (
+            {participants.map((participant) => (
               <TableRow 
-                key={index}
+                key={participant.transaction_hash}
                 sx={{ 
                   '&:last-child td, &:last-child th': { border: 0 },
                   '&:hover': {
@@ -114,7 +127,7 @@ const ParticipantList: React.FC<ParticipantListProps> = ({ participants }) => {
                 </TableCell>
                 {!isMobile && (
                   <TableCell sx={{ color: 'text.secondary' }}>
-                    {formatDate(participant.entry_time)}
+                    {formatDate(participant.created_at)}
                   </TableCell>
                 )}
                 <TableCell align="right">{participant.ada_amount.toLocaleString()}</TableCell>
@@ -135,6 +148,14 @@ const ParticipantList: React.FC<ParticipantListProps> = ({ participants }) => {
           </TableBody>
         </Table>
       </TableContainer>
+
+      {hasMore && (
+        <Box sx={{ mt: 2, textAlign: 'center' }}>
+          <Button variant="outlined" onClick={onLoadMore} disabled={loadingMore}>
+            {loadingMore ? 'Loading...' : 'Load more'}
+          </Button>
+        </Box>
+      )}
     </Box>
   );
 };
@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { 
   Paper, 
   Typography, 
@@ -11,7 +11,8 @@ import {
   CircularProgress,
   Box
 } from '@mui/material';
-import { API_URL } from '../config';
+import { fetchAllPages } from '../api';
+import { subscribeToRaffleEvents } from '../events';
 
 interface RaffleEntry {
   wallet_address: string;
@@ -20,6 +21,7 @@ interface RaffleEntry {
 }
 
 interface RaffleData {
+  epoch_id: number | null;
   entries: RaffleEntry[];
   count: number;
 }
@@ -28,16 +30,16 @@ export const RaffleStatus: React.FC = () => {
   const [raffleData, setRaffleData] = useState<RaffleData | null>(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  // The epoch listed, for the event handlers
+  const epochRef = useRef<number | null>(null);
 
   useEffect(() => {
     const fetchRaffleData = async () => {
       try {
-        const response = await fetch(`${API_URL}/api/entries`);
-        if (!response.ok) {
-          throw new Error('Failed to fetch raffle data');
-        }
-        const data = await response.json();
-        setRaffleData(data);
+        // The listing is paged; follow it to the end so the table and count are complete
+        const { items, body } = await fetchAllPages<RaffleEntry>('/api/entries', 'entries');
+        epochRef.current = body.epoch_id;
+        setRaffleData({ epoch_id: body.epoch_id, entries: items, count: items.length });
       } catch (err) {
         setError(err instanceof Error ? err.message : 'An error occurred');
       } finally {
@@ -46,9 +48,26 @@ export const RaffleStatus: React.FC = () => {
     };
 
     fetchRaffleData();
-    // Refresh every 30 seconds
-    const interval = setInterval(fetchRaffleData, 30000);
-    return () => clearInterval(interval);
+    // Apply pushed updates instead of refetching on a timer
+    return subscribeToRaffleEvents({
+      entries: (entries) => {
+        if (entries.some((entry) => entry.epoch_id !== epochRef.current)) {
+          // The epoch on screen has ended
+          fetchRaffleData();
+          return;
+        }
+        setRaffleData((current) => {
+          if (!current) {
+            return current;
+          }
+          const listed = new Set(current.entries.map((entry) => entry.transaction_hash));
+          const added = entries.filter((entry) => !listed.has(entry.transaction_hash));
+          return { ...current, entries: [...current.entries, ...added], count: current.count + added.length };
+        });
+      },
+      winner: fetchRaffleData,
+      resync: fetchRaffleData
+    });
   }, []);
 
   if (loading) {
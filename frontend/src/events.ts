@@ -0,0 +1,84 @@
+import { API_URL } from './config';
+
+export interface EntryEvent {
+  epoch_id: number;
+  wallet_address: string;
+  tickets: number;
+  ada_amount: number;
+  epok_amount: number;
+  transaction_hash: string;
+  created_at: string;
+}
+
+export interface PrizeEvent {
+  epoch_id: number;
+  total_ada: number;
+  total_epok: number;
+  total_tickets: number;
+  entry_count: number;
+}
+
+export interface WinnerEvent {
+  epoch_id: number;
+  winner_address: string;
+  total_entries: number;
+  end_time: string;
+}
+
+export interface RaffleEventHandlers {
+  entries?: (entries: EntryEvent[]) => void;
+  prize?: (prize: PrizeEvent) => void;
+  winner?: (winner: WinnerEvent) => void;
+  // Called whenever updates may have been missed (reconnects, slow client);
+  // the handler should refetch its full state
+  resync: () => void;
+}
+
+// One stream per page, shared by every subscriber
+const subscribers = new Set<RaffleEventHandlers>();
+let source: EventSource | null = null;
+
+function openSource(): EventSource {
+  const opened = new EventSource(`${API_URL}/api/events`);
+  let connectedBefore = false;
+
+  opened.onopen = () => {
+    // EventSource reconnects on its own; anything sent meanwhile was lost
+    if (connectedBefore) {
+      subscribers.forEach((handlers) => handlers.resync());
+    }
+    connectedBefore = true;
+  };
+
+  const dispatch = <T>(name: string, pick: (handlers: RaffleEventHandlers) => ((data: T) => void) | undefined) => {
+    opened.addEventListener(name, (event) => {
+      const data: T = JSON.parse((event as MessageEvent).data);
+      subscribers.forEach((handlers) => pick(handlers)?.(data));
+    });
+  };
+  dispatch<EntryEvent[]>('entries', (handlers) => handlers.entries);
+  dispatch<PrizeEvent>('prize', (handlers) => handlers.prize);
+  dispatch<WinnerEvent>('winner', (handlers) => handlers.winner);
+  opened.addEventListener('resync', () => subscribers.forEach((handlers) => handlers.resync()));
+  return opened;
+}
+
+// Subscribe to /api/events; returns a function that unsubscribes (closing
+// the stream once nobody listens)
+export function subscribeToRaffleEvents(handlers: RaffleEventHandlers): () => void {
+  if (typeof EventSource === 'undefined') {
+    return () => {};
+  }
+  subscribers.add(handlers);
+  if (source === null) {
+    source = openSource();
+  }
+
+  return () => {
+    subscribers.delete(handlers);
+    if (subscribers.size === 0 && source !== null) {
+      source.close();
+      source = null;
+    }
+  };
+}